@@ -0,0 +1,302 @@
+import asyncio
+import os
+import threading
+from typing import List, Dict, Any, Optional
+from urllib.parse import quote
+
+import anyio
+import httpx
+from google.auth.transport.requests import Request as AuthRequest
+from gspread.exceptions import APIError
+from gspread.utils import absolute_range_name
+
+from API.backend_api.sheets_service import (
+    SheetsService,
+    SheetTable,
+    ConnectionError,
+    SPREADSHEET_NAME,
+)
+from API.backend_api.http_pool import RequestCounter, async_limits, async_pool_stats, rewrite_google_url
+from API.backend_api.quota import is_idempotent
+
+# --- CONFIGURACIÓN DEL CLIENTE HTTP ASÍNCRONO ---
+# Con SHEETS_API_ENDPOINT (ver http_pool.py) ambas URLs apuntan al emulador local
+SHEETS_API_URL = rewrite_google_url("https://sheets.googleapis.com/v4/spreadsheets")
+DRIVE_FILES_URL = rewrite_google_url("https://www.googleapis.com/drive/v3/files")
+# Segundos máximos por solicitud a la API
+SHEETS_HTTP_TIMEOUT = float(os.environ.get("SHEETS_HTTP_TIMEOUT", "30"))
+
+
+class AsyncSheetsService(SheetsService):
+    """
+    Variante asíncrona de SheetsService para los endpoints async def. Las lecturas y escrituras
+    van con httpx.AsyncClient directo a la API REST de Sheets v4, de modo que muchas consultas
+    concurrentes se solapan en un mismo event loop en lugar de esperar un hilo libre.
+    Comparte con la versión síncrona la caché (SheetTable), el asignador de IDs, el índice del
+    semáforo y el diario de movimientos; los métodos síncronos (gspread) siguen disponibles.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self._async_counter = RequestCounter()
+        # El cliente y el candado del token pertenecen a un event loop (ver _async_client)
+        self._aclient: Optional[httpx.AsyncClient] = None
+        self._aclient_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._token_lock: Optional[asyncio.Lock] = None
+
+    # --- CLIENTE HTTP Y AUTENTICACIÓN ---
+
+    def _async_client(self) -> httpx.AsyncClient:
+        """
+        Cliente HTTP del event loop actual. Se recrea si el loop cambió (p. ej. TestClient abre
+        un loop por solicitud); las conexiones del loop anterior ya no son utilizables.
+        """
+        loop = asyncio.get_running_loop()
+        if self._aclient is None or self._aclient_loop is not loop:
+            self._aclient = httpx.AsyncClient(timeout=SHEETS_HTTP_TIMEOUT, limits=async_limits())
+            self._aclient_loop = loop
+            self._token_lock = asyncio.Lock()
+        return self._aclient
+
+    async def _auth_headers(self) -> Dict[str, str]:
+        """
+        Cabecera Authorization con el token OAuth vigente (se refresca solo al vencer).
+        El token es el mismo que usa el cliente síncrono (gspread).
+        """
+        credentials = self._service_credentials()
+        if not credentials.valid:
+            async with self._token_lock:
+                if not credentials.valid:
+                    # google-auth refresca con requests (bloqueante): se ejecuta en un hilo
+                    await anyio.to_thread.run_sync(credentials.refresh, AuthRequest())
+        return {"Authorization": f"Bearer {credentials.token}"}
+
+    async def _request(self, method: str, url: str, **kwargs) -> Dict[str, Any]:
+        """
+        Ejecuta una solicitud autenticada a través del planificador de cuota (reintentos 429/5xx
+        compartidos con el cliente síncrono). Lanza APIError (gspread) si la API responde con error.
+        """
+        client = self._async_client()
+
+        async def send():
+            response = await client.request(method, url, headers=await self._auth_headers(), **kwargs)
+            if response.status_code == 401:
+                # Token revocado antes de su vencimiento: se fuerza un refresco y se reintenta una vez
+                self._service_credentials().token = None
+                response = await client.request(method, url, headers=await self._auth_headers(), **kwargs)
+            return response
+
+        with self._async_counter.track():
+            response = await self._scheduler.asend(send, is_idempotent(method, url), transport_errors=(httpx.TransportError,))
+        if response.is_error:
+            raise APIError(response)
+        return response.json() if response.content else {}
+
+    # --- GESTIÓN DE LA CONEXIÓN ---
+
+    async def aensure_connection(self) -> str:
+        """
+        Resuelve el ID de la hoja de cálculo (búsqueda por nombre en Drive, una sola vez por proceso)
+        y retorna ese ID. Lanza ConnectionError si no es posible. La misma búsqueda trae el
+        modifiedTime con el que se valida la instantánea local (ver _restore_snapshot).
+        """
+        if self._spreadsheet_id:
+            return self._spreadsheet_id
+        try:
+            data = await self._request("GET", DRIVE_FILES_URL, params={
+                "q": f"name = '{SPREADSHEET_NAME}' and mimeType = 'application/vnd.google-apps.spreadsheet'",
+                "fields": "files(id,modifiedTime)",
+                "supportsAllDrives": "true",
+                "includeItemsFromAllDrives": "true",
+            })
+        except ConnectionError:
+            raise
+        except Exception as e:
+            print(f"[ERROR INESPERADO al inicializar AsyncSheetsService]: {e}")
+            raise ConnectionError(f"No se pudo conectar a la hoja de cálculo: '{SPREADSHEET_NAME}'. Causa: {e}")
+
+        files = data.get("files", [])
+        if not files:
+            raise ConnectionError(f"ERROR: Hoja de cálculo '{SPREADSHEET_NAME}' no encontrada.")
+        self._spreadsheet_id = files[0]["id"]
+        print(f"[INFO] Conexión exitosa a Google Sheets (async): '{SPREADSHEET_NAME}'")
+        if self._snapshot and not self._snapshot_checked:
+            try:
+                # Lectura y descompresión del archivo: fuera del event loop
+                await anyio.to_thread.run_sync(self._restore_snapshot, self._spreadsheet_id, files[0].get("modifiedTime"))
+            except Exception as e:
+                print(f"[WARN] No se pudo usar la instantánea local: {e}")
+        if self._flusher:
+            self._flusher.start()
+        return self._spreadsheet_id
+
+    async def aclose(self):
+        """Cierra el cliente HTTP si pertenece al event loop actual."""
+        client = self._aclient
+        if client is not None and self._aclient_loop is asyncio.get_running_loop():
+            await client.aclose()
+        self._aclient = None
+        self._aclient_loop = None
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del motor, incluido el uso del pool del cliente asíncrono."""
+        stats = super().stats()
+        pool = async_pool_stats(self._aclient) if self._aclient is not None else {}
+        stats["pool_http_async"] = {**pool, **self._async_counter.stats()}
+        return stats
+
+    def _values_url(self, spreadsheet_id: str, suffix: str) -> str:
+        return f"{SHEETS_API_URL}/{spreadsheet_id}/values{suffix}"
+
+    # --- LECTURA (misma caché y sincronización de cola que SheetsService.get_tables) ---
+
+    async def _abatch_get(self, ranges: List[str], sheet_titles: List[str]) -> List[Dict[str, Any]]:
+        """Versión asíncrona de _batch_get (values:batchGet)."""
+        spreadsheet_id = await self.aensure_connection()
+        url = self._values_url(spreadsheet_id, ":batchGet")
+        params = [("ranges", r) for r in ranges]
+        try:
+            try:
+                response = await self._request("GET", url, params=params)
+            except httpx.TransportError as e:
+                print(f"[WARN] Fallo de conexión en lectura por lotes, reintentando: {e}")
+                self._aclient = None
+                response = await self._request("GET", url, params=params)
+        except APIError:
+            for title in sheet_titles:
+                self.invalidate_sheet_cache(title)
+            raise
+        return response.get('valueRanges', [])
+
+    async def aget_tables(self, sheet_titles: List[str]) -> Dict[str, SheetTable]:
+        """
+        Versión asíncrona de get_tables: una sola lectura por lotes para las hojas no vigentes.
+        Las corrutinas que piden una hoja que ya se está leyendo esperan esa misma lectura, la haya
+        iniciado otra corrutina o un hilo con get_tables (ambos comparten _read_flights).
+        """
+        tables, full, tail = self._plan_reads(sheet_titles)
+        if not full and not tail:
+            return tables
+
+        lead, follow = self._read_flights.claim(full + [t.title for t in tail], blocking=False)
+        results: Dict[str, SheetTable] = {}
+        error: Optional[BaseException] = None
+        try:
+            if lead:
+                results = await self._aread_tables([t for t in full if t in lead], [t for t in tail if t.title in lead])
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._read_flights.finish(lead, results, error)
+
+        tables.update(results)
+        for title, flight in follow.items():
+            tables[title] = await self._read_flights.await_(flight)
+        return tables
+
+    async def _aread_tables(self, full: List[str], tail: List[SheetTable]) -> Dict[str, SheetTable]:
+        """Versión asíncrona de _read_tables."""
+        tables: Dict[str, SheetTable] = {}
+        value_ranges = await self._abatch_get(self._read_ranges(full, tail), full + [t.title for t in tail])
+        reload = self._apply_reads(tables, full, tail, value_ranges)
+
+        if reload:
+            print(f"[INFO] Cambios en filas anteriores de {reload}. Recarga completa.")
+            value_ranges = await self._abatch_get([absolute_range_name(title) for title in reload], reload)
+            for title, value_range in zip(reload, value_ranges):
+                tables[title] = self._store_table(title, value_range.get('values', []))
+        self._maybe_save_snapshot()
+        return tables
+
+    # --- ESCRITURA ---
+
+    async def _append_values(self, sheet_title: str, rows: List[list]) -> Dict[str, Any]:
+        """Añade filas al final de una hoja (values:append, USER_ENTERED). Retorna la respuesta de la API."""
+        spreadsheet_id = await self.aensure_connection()
+        self._mark_sheet_written()
+        url = self._values_url(spreadsheet_id, f"/{quote(absolute_range_name(sheet_title), safe='')}:append")
+        return await self._request(
+            "POST", url,
+            params={"valueInputOption": "USER_ENTERED"},
+            json={"values": rows},
+        )
+
+    async def areserve_movement_ids(self, count: int) -> List[str]:
+        """Versión asíncrona de reserve_movement_ids."""
+        if not (self._journal and self._id_allocator.is_seeded):
+            await self.aget_tables([self.MOVEMENTS_SHEET_NAME])
+        if not self._id_allocator.is_seeded:
+            self._id_allocator.observe([])
+        return self._id_allocator.reserve(count)
+
+    async def aappend_movement(self, data_row: list):
+        """Versión asíncrona de append_movement."""
+        return await self.aappend_movements([data_row])
+
+    async def aappend_movements(self, data_rows: List[list]):
+        """Versión asíncrona de append_movements: un único values:append (todo o nada)."""
+        if not data_rows:
+            return None
+        if self._journal:
+            # Anexado con fsync al diario local: se ejecuta en un hilo para no bloquear el loop
+            return await anyio.to_thread.run_sync(self._journal_movements, data_rows)
+
+        try:
+            result = await self._append_values(self.MOVEMENTS_SHEET_NAME, data_rows)
+            self._apply_movements(data_rows)
+            return result
+        except Exception as e:
+            print(f"[ERROR SHEETS APPEND] Fallo al añadir {len(data_rows)} filas a MOVIMIENTOS: {e}")
+            self.invalidate_cache(self.MOVEMENTS_SHEET_NAME)
+            raise e
+
+    async def abulk_upsert_semaforo(self, results: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Versión asíncrona de bulk_upsert_semaforo: un values:batchUpdate para las filas existentes
+        y un values:append para las casas nuevas.
+        """
+        semaforo = None
+        if self._semaforo_rows is None:
+            # El índice ID_CASA -> fila se construye desde la copia (sin leer la Columna A aparte)
+            semaforo = (await self.aget_tables([self.SEMAFORO_SHEET_NAME]))[self.SEMAFORO_SHEET_NAME]
+        updates, appends = self._plan_semaforo_upsert(results, self._semaforo_index(semaforo))
+
+        try:
+            if updates:
+                spreadsheet_id = await self.aensure_connection()
+                self._mark_sheet_written()
+                await self._request("POST", self._values_url(spreadsheet_id, ":batchUpdate"), json={
+                    "valueInputOption": "USER_ENTERED",
+                    "data": [
+                        {"range": absolute_range_name(self.SEMAFORO_SHEET_NAME, f"A{r}:F{r}"), "values": [row]}
+                        for r, row in updates
+                    ],
+                })
+            first_new_row = None
+            if appends:
+                response = await self._append_values(self.SEMAFORO_SHEET_NAME, appends)
+                first_new_row = self._appended_first_row(response)
+        except Exception as e:
+            print(f"[ERROR SHEETS] Fallo en la escritura masiva de ALERTAS_SEMAFORO: {e}")
+            self.invalidate_cache(self.SEMAFORO_SHEET_NAME)
+            raise
+
+        return self._apply_semaforo_upsert(updates, appends, first_new_row)
+
+
+# ----------------------------------------------------------------------
+# --- INSTANCIA COMPARTIDA (POOL DE PROCESO) ---
+# ----------------------------------------------------------------------
+
+_shared_async_service: Optional[AsyncSheetsService] = None
+_shared_async_service_lock = threading.Lock()
+
+def get_shared_async_sheets_service() -> AsyncSheetsService:
+    """Retorna la instancia única de AsyncSheetsService del proceso, creándola en el primer uso."""
+    global _shared_async_service
+    if _shared_async_service is None:
+        with _shared_async_service_lock:
+            if _shared_async_service is None:
+                _shared_async_service = AsyncSheetsService()
+    return _shared_async_service
@@ -0,0 +1,162 @@
+import hashlib
+import os
+import threading
+import time
+from typing import List, Dict, Any, Optional, Tuple
+
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+
+# --- CONFIGURACIÓN DE LA CACHÉ DE CONFIGURACION ---
+# Segundos que la configuración se usa sin volver a consultar la hoja (0 = consultar siempre)
+CONFIG_CACHE_TTL = float(os.environ.get("CONFIG_CACHE_TTL", "300"))
+# Segundos que, tras un error de lectura o validación, se usa la versión de respaldo sin volver a
+# consultar la hoja (acotado por CONFIG_CACHE_TTL); evita releer una hoja inválida en cada solicitud
+CONFIG_RETRY_INTERVAL = float(os.environ.get("CONFIG_RETRY_INTERVAL", "30"))
+
+CONFIG_SHEET_NAME = 'CONFIGURACION'
+
+
+class CondominioConfig(BaseModel):
+    """
+    Configuración del condominio (hoja CONFIGURACION), tipada y validada. Las claves conocidas
+    tienen tipo y rango; las demás se conservan tal como las decodifica el esquema de la hoja.
+    version: huella de los pares CLAVE/VALOR; origen: 'hoja' o 'respaldo' (valores por defecto).
+    """
+    model_config = ConfigDict(extra="allow", frozen=True)
+
+    # Valores por defecto (respaldo si CONFIGURACION no se puede leer ni hay una versión válida previa)
+    VALOR_ALICUOTA: float = Field(50.00, gt=0)
+    DIA_VENCIMIENTO: int = Field(5, ge=1, le=31)
+    PUNTOS_POR_PAGO_A_TIEMPO: int = Field(10, ge=0)
+    PORCENTAJE_DESCUENTO: float = Field(0.00, ge=0, le=100)
+
+    version: str = "respaldo"
+    origen: str = "respaldo"
+
+    def as_map(self) -> Dict[str, Any]:
+        """Pares clave-valor (sin los metadatos version/origen)."""
+        return {k: v for k, v in self.model_dump().items() if k not in ("version", "origen")}
+
+
+DEFAULT_CONFIG = CondominioConfig()
+
+
+def _config_pairs(table) -> List[Tuple[str, Any]]:
+    """Pares (CLAVE, VALOR) de la hoja, con la clave normalizada en mayúsculas."""
+    pairs = []
+    for record in table.records():
+        clave = str(record.get('CLAVE', '')).strip().upper()
+        if clave:
+            pairs.append((clave, record.get('VALOR', '')))
+    return pairs
+
+
+def config_version(pairs: List[Tuple[str, Any]]) -> str:
+    """Huella corta de la configuración (no depende del orden de las filas)."""
+    digest = hashlib.sha256(repr(sorted(pairs, key=lambda p: p[0])).encode("utf-8"))
+    return digest.hexdigest()[:12]
+
+
+class ConfigCache:
+    """
+    Caché en proceso de la configuración. Mientras no vence el TTL, fresh() la entrega sin E/S.
+    Al vencer, la hoja se vuelve a leer y solo se valida de nuevo si cambió su huella.
+    Si la lectura o la validación fallan se sigue usando la última versión válida (o los
+    valores por defecto si nunca se cargó) durante retry_interval segundos antes de reintentar,
+    y el error queda registrado en stats().
+    """
+
+    def __init__(self, ttl: float = CONFIG_CACHE_TTL, retry_interval: float = CONFIG_RETRY_INTERVAL):
+        self.ttl = ttl
+        self.retry_interval = retry_interval
+        self._lock = threading.Lock()
+        self._config: Optional[CondominioConfig] = None
+        self._checked_at = 0.0
+        # Momento del último error (None si la última consulta fue válida)
+        self._failed_at: Optional[float] = None
+        self.checks = 0
+        self.reloads = 0
+        self.errors = 0
+        self.last_error: Optional[str] = None
+
+    def fresh(self) -> Optional[CondominioConfig]:
+        """Configuración vigente si no venció el TTL; None si hay que consultar la hoja."""
+        if self.ttl <= 0:
+            return None
+        config = self._config
+        now = time.monotonic()
+        failed_at = self._failed_at
+        if failed_at is not None:
+            if now - failed_at < min(self.ttl, self.retry_interval):
+                return config or DEFAULT_CONFIG
+            return None
+        if config is not None and now - self._checked_at < self.ttl:
+            return config
+        return None
+
+    def update(self, table) -> CondominioConfig:
+        """Aplica la hoja CONFIGURACION recién leída; retorna la configuración vigente."""
+        pairs = _config_pairs(table)
+        version = config_version(pairs)
+        with self._lock:
+            self.checks += 1
+            current = self._config
+            if current is not None and current.version == version:
+                self._checked_at = time.monotonic()
+                self._failed_at = None
+                return current
+        try:
+            config = CondominioConfig.model_validate({**dict(pairs), "version": version, "origen": "hoja"})
+        except ValidationError as e:
+            return self.fail(f"Configuración inválida (versión {version}): {e}")
+        with self._lock:
+            self._config = config
+            self._checked_at = time.monotonic()
+            self._failed_at = None
+            self.reloads += 1
+            self.last_error = None
+        print(f"[INFO] Configuración cargada (versión {version}).")
+        return config
+
+    def fail(self, error: Any) -> CondominioConfig:
+        """Error al leer o validar: se mantiene la última versión válida o se usan los valores por defecto."""
+        with self._lock:
+            self.errors += 1
+            self.last_error = str(error)
+            self._failed_at = time.monotonic()
+            current = self._config
+        if current is None:
+            print(f"[ERROR CONFIG] No se pudo cargar CONFIGURACION, se usan los valores por defecto: {error}")
+            return DEFAULT_CONFIG
+        print(f"[WARN] No se pudo actualizar CONFIGURACION, se mantiene la versión {current.version}: {error}")
+        return current
+
+    def stats(self) -> Dict[str, Any]:
+        config = self._config
+        return {
+            "version": config.version if config else None,
+            "ttl": self.ttl,
+            "antiguedad_s": round(time.monotonic() - self._checked_at, 1) if config else None,
+            "verificaciones": self.checks,
+            "recargas": self.reloads,
+            "errores": self.errors,
+            "ultimo_error": self.last_error,
+        }
+
+
+# ----------------------------------------------------------------------
+# --- INSTANCIA COMPARTIDA (PROCESO) ---
+# ----------------------------------------------------------------------
+
+_shared_cache: Optional[ConfigCache] = None
+_shared_cache_lock = threading.Lock()
+
+
+def get_shared_config_cache() -> ConfigCache:
+    """Retorna la caché de configuración compartida por todo el proceso."""
+    global _shared_cache
+    if _shared_cache is None:
+        with _shared_cache_lock:
+            if _shared_cache is None:
+                _shared_cache = ConfigCache()
+    return _shared_cache
@@ -0,0 +1,122 @@
+import os
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from google.auth.transport.requests import AuthorizedSession
+
+from API.backend_api.quota import RequestScheduler, is_idempotent
+
+# --- CONFIGURACIÓN DEL POOL HTTP HACIA LAS APIS DE GOOGLE ---
+# Conexiones persistentes por host (sheets.googleapis.com, www.googleapis.com, oauth2...)
+SHEETS_HTTP_POOL_SIZE = int(os.environ.get("SHEETS_HTTP_POOL_SIZE", "10"))
+# Segundos que una conexión inactiva se conserva abierta (cliente asíncrono)
+SHEETS_HTTP_KEEPALIVE = float(os.environ.get("SHEETS_HTTP_KEEPALIVE", "60"))
+# URL base alternativa para las APIs de Sheets y Drive (p. ej. el emulador local, ver sheets_emulator.py).
+# Vacía: se usan los servidores de Google.
+SHEETS_API_ENDPOINT = os.environ.get("SHEETS_API_ENDPOINT", "").rstrip("/")
+
+GOOGLE_API_HOSTS = ("https://sheets.googleapis.com", "https://www.googleapis.com")
+
+
+def rewrite_google_url(url: str) -> str:
+    """Redirige una URL de las APIs de Google a SHEETS_API_ENDPOINT (si está configurado)."""
+    if SHEETS_API_ENDPOINT:
+        for host in GOOGLE_API_HOSTS:
+            if url.startswith(host):
+                return SHEETS_API_ENDPOINT + url[len(host):]
+    return url
+
+
+class RequestCounter:
+    """Contadores de solicitudes HTTP: total, en curso y pico de concurrencia."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.total = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    @contextmanager
+    def track(self):
+        with self._lock:
+            self.total += 1
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def stats(self) -> Dict[str, int]:
+        return {"solicitudes": self.total, "en_curso": self.in_flight, "pico_en_curso": self.peak}
+
+
+class PooledAdapter(HTTPAdapter):
+    """
+    HTTPAdapter con un pool de SHEETS_HTTP_POOL_SIZE conexiones keep-alive por host y contadores
+    de uso. Sin bloqueo: si el pool se agota se abre una conexión extra que no se conserva.
+    Con un RequestScheduler, cada solicitud pasa por la cuota y los reintentos (ver quota.py).
+    """
+
+    def __init__(self, pool_size: int = SHEETS_HTTP_POOL_SIZE, scheduler: Optional[RequestScheduler] = None):
+        self.counter = RequestCounter()
+        self.scheduler = scheduler
+        super().__init__(pool_connections=4, pool_maxsize=pool_size, pool_block=False)
+
+    def send(self, request, **kwargs):
+        request.url = rewrite_google_url(request.url)
+        with self.counter.track():
+            if self.scheduler is None:
+                return super().send(request, **kwargs)
+            return self.scheduler.send(
+                lambda: super(PooledAdapter, self).send(request, **kwargs),
+                is_idempotent(request.method, request.url),
+                transport_errors=(requests.exceptions.ConnectionError, requests.exceptions.Timeout),
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        """Uso del pool por host: conexiones abiertas en total, solicitudes atendidas e inactivas disponibles."""
+        hosts: List[Dict[str, Any]] = []
+        for key in self.poolmanager.pools.keys():
+            pool = self.poolmanager.pools.get(key)
+            if pool is None:
+                continue
+            hosts.append({
+                "host": pool.host,
+                "conexiones_creadas": pool.num_connections,
+                "solicitudes": pool.num_requests,
+                "inactivas": pool.pool.qsize() if pool.pool is not None else 0,
+            })
+        return {"tamano_pool": self._pool_maxsize, **self.counter.stats(), "hosts": hosts}
+
+
+def build_authorized_session(credentials, scheduler: Optional[RequestScheduler] = None) -> AuthorizedSession:
+    """Sesión autorizada (token OAuth renovado automáticamente) sobre un PooledAdapter compartido."""
+    session = AuthorizedSession(credentials)
+    session.mount("https://", PooledAdapter(scheduler=scheduler))
+    return session
+
+
+def async_limits() -> httpx.Limits:
+    """Límites del pool del cliente asíncrono (mismo tamaño que el síncrono)."""
+    return httpx.Limits(
+        max_connections=SHEETS_HTTP_POOL_SIZE,
+        max_keepalive_connections=SHEETS_HTTP_POOL_SIZE,
+        keepalive_expiry=SHEETS_HTTP_KEEPALIVE,
+    )
+
+
+def async_pool_stats(client: httpx.AsyncClient) -> Dict[str, Any]:
+    """Conexiones abiertas e inactivas del pool de un cliente httpx (0 si aún no se creó)."""
+    pool = getattr(getattr(client, "_transport", None), "_pool", None)
+    connections = list(getattr(pool, "connections", None) or [])
+    return {
+        "tamano_pool": SHEETS_HTTP_POOL_SIZE,
+        "conexiones_abiertas": len(connections),
+        "inactivas": sum(1 for c in connections if c.is_idle()),
+    }
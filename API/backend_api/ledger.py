@@ -0,0 +1,249 @@
+import threading
+import weakref
+from datetime import date
+from typing import List, Dict, Any, Optional, Iterable, Sequence
+
+try:
+    import numpy as np
+except ImportError: # Sin NumPy se usa el cálculo en Python puro (mismo resultado, más lento)
+    np = None
+
+from API.backend_api.movement_store import Movement
+
+# --- UMBRALES DEL SEMÁFORO ---
+# Días de atraso de la alícuota pendiente más antigua
+DIAS_ROJO = 30
+DIAS_AMARILLO = 15
+
+
+def estado_por_atraso(dias_atraso: int) -> str:
+    """Color del semáforo según los días de atraso."""
+    if dias_atraso >= DIAS_ROJO:
+        return 'ROJO'
+    if dias_atraso >= DIAS_AMARILLO:
+        return 'AMARILLO'
+    return 'VERDE'
+
+
+def _resultado(casa_id: int, saldo: float, cuotas: int, dias: int) -> Dict[str, Any]:
+    """Fila consolidada de una casa (mismo formato que espera bulk_upsert_semaforo)."""
+    return {
+        'ID_CASA': casa_id,
+        'DIAS_ATRASO': dias,
+        'SALDO': round(saldo, 2),
+        'ESTADO_SEMAFORO': estado_por_atraso(dias),
+        'CUOTAS_PENDIENTES': cuotas,
+    }
+
+
+# ----------------------------------------------------------------------
+# --- PROYECCIÓN MATERIALIZADA POR CASA ---
+# ----------------------------------------------------------------------
+
+class CasaLedger:
+    """
+    Resumen de cuenta de una casa, actualizado movimiento a movimiento (en orden de hoja):
+    saldo, cantidad de movimientos, último pago, alícuotas con monto positivo y la más antigua
+    de ellas por FECHA_VENCIMIENTO (una fecha vacía o inválida cuenta como la más antigua).
+    """
+    __slots__ = ("saldo", "movimientos", "ultimo_pago", "cuotas_pendientes", "cargo_mas_antiguo")
+
+    def __init__(self):
+        self.saldo = 0.0
+        self.movimientos = 0
+        self.ultimo_pago: Optional[Movement] = None
+        self.cuotas_pendientes = 0
+        self.cargo_mas_antiguo: Optional[Movement] = None
+
+    def add(self, m: Movement):
+        """Aplica un movimiento añadido al final de la hoja (O(1))."""
+        self.saldo += m.monto
+        self.movimientos += 1
+        if m.tipo_movimiento == 'PAGO':
+            self.ultimo_pago = m
+        elif m.tipo_movimiento == 'ALICUOTA' and m.monto > 0:
+            self.cuotas_pendientes += 1
+            actual = self.cargo_mas_antiguo
+            if actual is None or (actual.fecha_vencimiento is not None and (
+                    m.fecha_vencimiento is None or m.fecha_vencimiento < actual.fecha_vencimiento)):
+                self.cargo_mas_antiguo = m
+
+    def dias_atraso(self, hoy: date) -> int:
+        """Días desde el vencimiento del cargo más antiguo (0 si no hay saldo o fecha)."""
+        cargo = self.cargo_mas_antiguo
+        if self.saldo <= 0 or cargo is None or cargo.fecha_vencimiento is None:
+            return 0
+        return (hoy - cargo.fecha_vencimiento.date()).days
+
+    def semaforo(self, casa_id: int, hoy: date) -> Dict[str, Any]:
+        """Fila del semáforo de la casa (mismas reglas que consolidar_semaforo)."""
+        cuotas = self.cuotas_pendientes if self.saldo > 0 else 0
+        return _resultado(casa_id, self.saldo, cuotas, self.dias_atraso(hoy))
+
+
+_EMPTY_LEDGER = CasaLedger()
+
+
+class LedgerProjection:
+    """
+    Proyección de MOVIMIENTOS por ID_CASA (CasaLedger por casa). Se construye en una pasada y
+    luego cada movimiento añadido la actualiza en O(1) (ver SheetTable.ledger); así el saldo y
+    el semáforo de una casa se leen sin recorrer sus movimientos.
+    """
+    __slots__ = ("casas", "movimientos")
+
+    def __init__(self, movements: Iterable[Movement] = ()):
+        self.casas: Dict[Optional[int], CasaLedger] = {}
+        self.movimientos = 0
+        for m in movements:
+            self.apply(m)
+
+    def apply(self, m: Movement):
+        ledger = self.casas.get(m.id_casa)
+        if ledger is None:
+            ledger = self.casas[m.id_casa] = CasaLedger()
+        ledger.add(m)
+        self.movimientos += 1
+
+    def get(self, casa_id: int) -> CasaLedger:
+        """Resumen de la casa (uno vacío, compartido y de solo lectura, si no tiene movimientos)."""
+        return self.casas.get(casa_id, _EMPTY_LEDGER)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"casas": len(self.casas), "movimientos": self.movimientos}
+
+
+# ----------------------------------------------------------------------
+# --- CONSOLIDACIÓN EN PYTHON PURO (RESPALDO SIN NUMPY) ---
+# ----------------------------------------------------------------------
+
+def _consolidar_python(movements: Sequence[Movement], casa_ids: List[int], hoy: date) -> List[Dict[str, Any]]:
+    """Una sola pasada sobre los movimientos, agrupando por casa (ver CasaLedger)."""
+    projection = LedgerProjection(movements)
+    return [projection.get(casa_id).semaforo(casa_id, hoy) for casa_id in casa_ids]
+
+
+# ----------------------------------------------------------------------
+# --- CONSOLIDACIÓN VECTORIZADA (NUMPY) ---
+# ----------------------------------------------------------------------
+
+class LedgerColumns:
+    """
+    Columnas de MOVIMIENTOS como arreglos NumPy: ID_CASA (int64, -1 si no es numérico), MONTO
+    (float64), es alícuota (bool) y FECHA_VENCIMIENTO (datetime64[D], NaT si está vacía).
+    Se construyen una vez por hoja cargada y se extienden con las filas añadidas después.
+    """
+    __slots__ = ("casa", "monto", "alicuota", "vencimiento", "rows", "revision")
+
+    def __init__(self, revision: int):
+        self.casa = np.empty(0, dtype=np.int64)
+        self.monto = np.empty(0, dtype=np.float64)
+        self.alicuota = np.empty(0, dtype=bool)
+        self.vencimiento = np.empty(0, dtype='datetime64[D]')
+        self.rows = 0
+        self.revision = revision
+
+    def extend(self, movements: Sequence[Movement]):
+        """Agrega al final las columnas de los movimientos dados."""
+        n = len(movements)
+        if not n:
+            return
+        days: Dict[Any, int] = {}
+        nat = np.iinfo(np.int64).min
+        epoch = date(1970, 1, 1).toordinal()
+
+        def day(fecha) -> int:
+            # Las fechas se comparten entre movimientos (ver MovementDecoder): una conversión por valor
+            result = days.get(fecha)
+            if result is None:
+                result = days[fecha] = nat if fecha is None else fecha.toordinal() - epoch
+            return result
+
+        casa = np.fromiter((-1 if m.id_casa is None else m.id_casa for m in movements), dtype=np.int64, count=n)
+        monto = np.fromiter((m.monto for m in movements), dtype=np.float64, count=n)
+        alicuota = np.fromiter((m.tipo_movimiento == 'ALICUOTA' for m in movements), dtype=bool, count=n)
+        vencimiento = np.fromiter((day(m.fecha_vencimiento) for m in movements), dtype=np.int64, count=n)
+
+        self.casa = np.concatenate((self.casa, casa))
+        self.monto = np.concatenate((self.monto, monto))
+        self.alicuota = np.concatenate((self.alicuota, alicuota))
+        self.vencimiento = np.concatenate((self.vencimiento, vencimiento.view('datetime64[D]')))
+        self.rows += n
+
+
+_columns_cache: "weakref.WeakKeyDictionary[Any, LedgerColumns]" = weakref.WeakKeyDictionary()
+_columns_lock = threading.Lock()
+
+
+def ledger_columns(table) -> LedgerColumns:
+    """
+    Columnas NumPy de la hoja MOVIMIENTOS cargada (SheetTable). Se reutilizan entre llamadas
+    mientras la hoja no cambie; si solo se añadieron filas, se convierten únicamente las nuevas.
+    """
+    movements = table.records()
+    with _columns_lock:
+        columns = _columns_cache.get(table)
+        if columns is None or columns.revision != table.revision or columns.rows > len(movements):
+            columns = _columns_cache[table] = LedgerColumns(table.revision)
+        if columns.rows < len(movements):
+            columns.extend(movements[columns.rows:])
+        return columns
+
+
+def _consolidar_numpy(columns: LedgerColumns, casa_ids: List[int], hoy: date) -> List[Dict[str, Any]]:
+    """Sumas, conteos y mínimos por casa con reducciones agrupadas (bincount / minimum.reduceat)."""
+    k = len(casa_ids)
+    ids = np.asarray(casa_ids, dtype=np.int64)
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+
+    # Grupo (posición en casa_ids) de cada movimiento; se descartan las casas no listadas
+    pos = np.minimum(np.searchsorted(sorted_ids, columns.casa), k - 1)
+    valid = sorted_ids[pos] == columns.casa
+    group = order[pos]
+
+    # Saldo: bincount suma en el orden de la hoja, igual que la suma fila a fila
+    saldo = np.bincount(group[valid], weights=columns.monto[valid], minlength=k)
+
+    # Alícuotas con monto positivo: conteo y vencimiento más antiguo por casa
+    pendiente = valid & columns.alicuota & (columns.monto > 0)
+    grupos_pend = group[pendiente]
+    cuotas = np.bincount(grupos_pend, minlength=k)
+
+    vencimiento = np.full(k, np.datetime64('NaT'), dtype='datetime64[D]')
+    if grupos_pend.size:
+        idx = np.argsort(grupos_pend, kind='stable')
+        grupos_ord = grupos_pend[idx]
+        starts = np.flatnonzero(np.r_[True, grupos_ord[1:] != grupos_ord[:-1]])
+        # minimum propaga NaT: una fecha vacía cuenta como la más antigua (sin días de atraso)
+        vencimiento[grupos_ord[starts]] = np.minimum.reduceat(columns.vencimiento[pendiente][idx], starts)
+
+    con_saldo = saldo > 0
+    atrasada = con_saldo & (cuotas > 0) & ~np.isnat(vencimiento)
+    dias = np.zeros(k, dtype=np.int64)
+    dias[atrasada] = (np.datetime64(hoy, 'D') - vencimiento[atrasada]).astype(np.int64)
+    cuotas = np.where(con_saldo, cuotas, 0)
+
+    return [
+        _resultado(casa_id, s, c, d)
+        for casa_id, s, c, d in zip(casa_ids, saldo.tolist(), cuotas.tolist(), dias.tolist())
+    ]
+
+
+# ----------------------------------------------------------------------
+# --- PUNTO DE ENTRADA ---
+# ----------------------------------------------------------------------
+
+def consolidar_semaforo(movimientos, casa_ids: List[int], hoy: Optional[date] = None) -> List[Dict[str, Any]]:
+    """
+    Consolida la hoja MOVIMIENTOS (SheetTable con registros Movement) para las casas dadas.
+    Por casa: saldo (suma de MONTO), alícuotas con monto positivo, días de atraso de la más
+    antigua (solo si el saldo es positivo) y color del semáforo. Retorna una fila por casa,
+    en el orden de casa_ids, lista para bulk_upsert_semaforo.
+    """
+    hoy = hoy or date.today()
+    if not casa_ids:
+        return []
+    if np is None:
+        return _consolidar_python(movimientos.records(), casa_ids, hoy)
+    return _consolidar_numpy(ledger_columns(movimientos), casa_ids, hoy)
@@ -1,15 +1,23 @@
+import time
 import traceback
 import pytz 
+import anyio
+from contextlib import asynccontextmanager
 from datetime import datetime, date, timedelta
-from typing import List, Dict, Any, Optional, Generator
+from typing import List, Dict, Any, Optional, AsyncGenerator, Iterable, Iterator
 
-from fastapi import FastAPI, HTTPException, Depends, status, APIRouter
+from fastapi import FastAPI, HTTPException, Depends, status, APIRouter, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 
 # --- Importaciones Consolidadas ---
 # NOTA: Asegúrate de que Schemas esté en backend_api/schemas.py
 from API.backend_api import schemas 
-# NOTA: Asegúrate de que SheetsService sea una CLASE importable desde sheets_service.py
-from API.backend_api.sheets_service import SheetsService 
+# NOTA: El motor de almacenamiento (Google Sheets o SQLite) se elige con STORAGE_BACKEND (ver storage.py)
+from API.backend_api.storage import StorageBackend, SheetTable, get_storage_backend 
+from API.backend_api.config_cache import get_shared_config_cache
+from API.backend_api.movement_store import Movement
+from API.backend_api.ledger import consolidar_semaforo
 from API.backend_api.security import (
     verify_password, 
     create_access_token, 
@@ -21,8 +29,14 @@ from API.backend_api.security import (
 # ----------------- CONFIGURACIÓN DE ZONA HORARIA Y UTILIDADES -----------------
 # ----------------------------------------------------------------------
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Al apagar la aplicación, libera el cliente HTTP asíncrono del almacenamiento."""
+    yield
+    await get_storage_backend().aclose()
+
 # Inicialización de la aplicación FastAPI
-app = FastAPI(title="Backend Condominio FastAPI")
+app = FastAPI(title="Backend Condominio FastAPI", lifespan=lifespan)
 
 # Definir la zona horaria: Guayaquil = GTM-5 (UTC-5)
 LOCAL_TIMEZONE = pytz.timezone('America/Guayaquil') 
@@ -37,25 +51,77 @@ def get_local_datetime() -> datetime:
     # 2. Convertir esa hora UTC a la zona horaria local deseada
     return utc_now.astimezone(LOCAL_TIMEZONE)
 
+def movimiento_response(m: Movement) -> schemas.Movimiento:
+    """Movimiento tipado (montos y fechas ya convertidos al cargar la hoja) -> esquema de respuesta."""
+    return schemas.Movimiento(
+        ID_MOVIMIENTO=m.id_movimiento or 'N/A',
+        TIPO_MOVIMIENTO=m.tipo_movimiento or 'N/A',
+        MONTO=m.monto,
+        FECHA_REGISTRO=m.fecha_registro,
+        FECHA_VENCIMIENTO=m.fecha_vencimiento,
+        MES_PERIODO=m.mes_periodo,
+        CONCEPTO=m.concepto,
+        TIPO_PAGO=m.tipo_pago
+    )
+
+# --- RESPUESTAS EN STREAMING (NDJSON) ---
+# Con "Accept: application/x-ndjson" los listados se envían línea a línea: la primera línea es
+# la respuesta sin su lista (estado, saldo, mensaje...) y luego un registro JSON por línea.
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Bytes aproximados por bloque enviado (agrupa líneas para no enviar un bloque por registro)
+NDJSON_CHUNK_BYTES = 64 * 1024
+
+def wants_ndjson(request: Request) -> bool:
+    """Indica si el cliente pidió la respuesta en streaming (NDJSON) en la cabecera Accept."""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+def _ndjson_chunks(header: BaseModel, exclude: str, items: Iterable[BaseModel]) -> Iterator[bytes]:
+    """Serializa la cabecera y luego los registros de a uno, en bloques de ~NDJSON_CHUNK_BYTES."""
+    # La cabecera sale sola, así el primer byte no espera a ningún registro
+    yield header.model_dump_json(by_alias=True, exclude={exclude}).encode("utf-8") + b"\n"
+    chunk = bytearray()
+    try:
+        for item in items:
+            chunk += item.model_dump_json(by_alias=True).encode("utf-8") + b"\n"
+            if len(chunk) >= NDJSON_CHUNK_BYTES:
+                yield bytes(chunk)
+                chunk.clear()
+    except Exception as e:
+        # El código 200 ya se envió: el error se informa como última línea
+        print(f"[ERROR STREAMING] Respuesta NDJSON interrumpida: {e}")
+        traceback.print_exc()
+        chunk += b'{"status":"error","detail":"Respuesta interrumpida por un error interno."}\n'
+    if chunk:
+        yield bytes(chunk)
+
+def ndjson_response(header: BaseModel, exclude: str, items: Iterable[BaseModel]) -> StreamingResponse:
+    """
+    Respuesta NDJSON: la cabecera (el modelo de respuesta sin el campo de la lista `exclude`) y luego
+    cada registro de `items`, que se consume de a uno (generador) mientras se envía.
+    """
+    return StreamingResponse(_ndjson_chunks(header, exclude, items), media_type=NDJSON_MEDIA_TYPE)
+
 # ----------------------------------------------------------------------
 # ----------------- INFRAESTRUCTURA DE INYECCIÓN DE DEPENDENCIA (DI) -----------------
 # ----------------------------------------------------------------------
 
-def get_sheets_service() -> Generator[SheetsService, None, None]:
+async def get_sheets_service() -> AsyncGenerator[StorageBackend, None]:
     """
-    Inyector de dependencia para SheetsService. 
-    Maneja la inicialización y el manejo de errores de conexión.
+    Inyector de dependencia para el almacenamiento (AsyncSheetsService por defecto, SQLiteService si
+    STORAGE_BACKEND=sqlite). Entrega la instancia compartida del proceso (conexión y token
+    reutilizados entre solicitudes) y maneja los errores de conexión.
+    Los endpoints son async def y esperan los métodos a* del almacenamiento (ver storage.py).
     """
     try:
-        # Crea una nueva instancia por solicitud
-        sheets_service = SheetsService()
-        yield sheets_service
+        sheets_service = get_storage_backend()
+        await sheets_service.aensure_connection()
     except Exception as e:
-        print(f"[ERROR DI] No se pudo inicializar SheetsService: {e}")
+        print(f"[ERROR DI] No se pudo inicializar el almacenamiento: {e}")
         raise HTTPException(
             status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
             detail="Error de conexión con la base de datos (Google Sheets). Intente más tarde."
         )
+    yield sheets_service
 
 # ----------------------------------------------------------------------
 # ----------------- DEPENDENCIAS DE SEGURIDAD -----------------
@@ -81,15 +147,15 @@ def require_admin_or_tesoreria(payload: schemas.TokenData = Depends(get_current_
 # ----------------------------------------------------------------------
 
 @app.post("/login", response_model=schemas.TokenResponse, tags=["Autenticación"])
-def login_for_access_token(
+async def login_for_access_token(
     request: schemas.LoginRequest,
-    sheets: SheetsService = Depends(get_sheets_service)
+    sheets: StorageBackend = Depends(get_sheets_service)
 ):
     """
     Autentica al usuario usando DNI y Contraseña. Retorna un token JWT.
     """
     try:
-        users_data: List[Dict[str, Any]] = sheets.get_all_records('USUARIOS')
+        users_data: List[Dict[str, Any]] = (await sheets.aget_table('USUARIOS')).records()
     except Exception as e:
         print("[ERROR] al cargar datos de usuarios:", e)
         traceback.print_exc()
@@ -97,7 +163,8 @@ def login_for_access_token(
 
     user_record = next((user for user in users_data if str(user['DNI']) == request.dni), None)
 
-    if not user_record or not verify_password(request.password, user_record['PASSWORD_HASH']):
+    # bcrypt es costoso en CPU: se verifica en un hilo para no bloquear el event loop
+    if not user_record or not await anyio.to_thread.run_sync(verify_password, request.password, user_record['PASSWORD_HASH']):
         raise HTTPException(status_code=401, detail="DNI o contraseña incorrectos.")
 
     access_token = create_access_token(
@@ -118,84 +185,57 @@ def login_for_access_token(
 
 @app.get("/condomino/estado_cuenta", response_model=schemas.EstadoCuentaResponse, tags=["Condómino"],
              dependencies=[Depends(require_condomino)])
-def get_condomino_estado_cuenta(
+async def get_condomino_estado_cuenta(
+    request: Request,
     payload: schemas.TokenData = Depends(get_current_user_payload),
-    sheets: SheetsService = Depends(get_sheets_service)
+    sheets: StorageBackend = Depends(get_sheets_service)
 ):
     """
     Consulta el historial de movimientos, el saldo pendiente, el estado del semáforo y las cuotas pendientes.
+    Con "Accept: application/x-ndjson" los movimientos se envían en streaming (uno por línea).
     """
     try:
         casa_id = int(payload.ID_CASA) 
-        user_info = sheets.get_user_by_id_casa(casa_id) 
-        nombre_condomino = user_info['NOMBRE'] if user_info and 'NOMBRE' in user_info else "Condómino Desconocido"
     except (ValueError, TypeError) as e:
         print(f"[ERROR] ID de Casa inválido en el token: {e}")
         raise HTTPException(status_code=400, detail="ID de Casa inválido en el token.")
-    except Exception as e:
-        print(f"[ERROR] No se pudo obtener info de usuario para Casa ID {casa_id}: {e}")
-        nombre_condomino = "Condómino Desconocido"
 
     try:
-        movimientos_data = sheets.get_records_by_casa_id('MOVIMIENTOS', casa_id)
-        semaforo_data = sheets.get_semaforo_by_casa(id_casa=casa_id)
-        
-        # ... (lógica interna del endpoint)
-        movimientos_list = []
-        saldo_pendiente = 0.0
-        
-        # Lógica de mapeo y cálculo...
-        for m in movimientos_data:
-            # Lógica de cálculo y mapeo
-            monto_val = float(m.get('MONTO', 0.0) or 0.0)
-            saldo_pendiente += monto_val
-            
-            fecha_vencimiento: Optional[datetime] = None
-            if m.get('FECHA_VENCIMIENTO'):
-                try:
-                    fecha_vencimiento = datetime.strptime(m['FECHA_VENCIMIENTO'], '%Y-%m-%d')
-                    fecha_vencimiento = LOCAL_TIMEZONE.localize(fecha_vencimiento.replace(tzinfo=None))
-                except ValueError:
-                    pass
-            
-            fecha_registro: Optional[datetime] = None
-            if m.get('FECHA_REGISTRO') and m['FECHA_REGISTRO'].split():
-                try:
-                    fecha_registro = datetime.strptime(m['FECHA_REGISTRO'], '%Y-%m-%d %H:%M')
-                    fecha_registro = LOCAL_TIMEZONE.localize(fecha_registro.replace(tzinfo=None))
-                except ValueError:
-                    try:
-                        fecha_registro = datetime.strptime(m['FECHA_REGISTRO'].split()[0], '%Y-%m-%d')
-                        fecha_registro = LOCAL_TIMEZONE.localize(fecha_registro.replace(tzinfo=None))
-                    except ValueError:
-                        pass
-                        
-            movimientos_list.append(schemas.Movimiento(
-                ID_MOVIMIENTO=m.get('ID_MOVIMIENTO', 'N/A'),
-                TIPO_MOVIMIENTO=m.get('TIPO_MOVIMIENTO', 'N/A'),
-                MONTO=monto_val,
-                FECHA_REGISTRO=fecha_registro,
-                FECHA_VENCIMIENTO=fecha_vencimiento,
-                MES_PERIODO=m.get('MES_PERIODO', None),
-                CONCEPTO=m.get('CONCEPTO', None),
-                TIPO_PAGO=m.get('TIPO_PAGO', None)
-            ))
+        # Lectura por lotes: USUARIOS, ALERTAS_SEMAFORO y MOVIMIENTOS en una sola llamada
+        tables = await sheets.aget_tables(['USUARIOS', 'ALERTAS_SEMAFORO', 'MOVIMIENTOS'])
+        
+        user_info = sheets.get_user_by_id_casa(casa_id, usuarios=tables['USUARIOS']) 
+        nombre_condomino = user_info['NOMBRE'] if user_info and 'NOMBRE' in user_info else "Condómino Desconocido"
+        
+        semaforo_data = sheets.get_semaforo_by_casa(id_casa=casa_id, semaforo=tables['ALERTAS_SEMAFORO'])
+        # Saldo y resumen de la casa desde la proyección por casa (O(1), sin sumar los movimientos)
+        cuenta = sheets.get_casa_ledger(casa_id, movimientos=tables['MOVIMIENTOS'])
+        
+        # Registros tipados (monto y fechas ya convertidos al cargar la hoja), de a uno por el índice ID_CASA
+        movimientos_iter = (movimiento_response(m) for m in tables['MOVIMIENTOS'].iter_records_for('ID_CASA', casa_id))
 
-        # Lógica del semáforo:
-        estado_semaforo = semaforo_data.get('ESTADO_SEMAFORO', 'VERDE') if semaforo_data else 'VERDE'
-        dias_atraso = int(semaforo_data.get('DIAS_ATRASO', 0) or 0) if semaforo_data else 0
-        cuotas_pendientes = int(semaforo_data.get('CUOTAS_PENDIENTES', 0) or 0) if semaforo_data else 0
+        # Lógica del semáforo: el último consolidado; si la casa aún no tiene fila, el de la proyección
+        if not semaforo_data:
+            semaforo_data = cuenta.semaforo(casa_id, date.today())
+        estado_semaforo = semaforo_data.get('ESTADO_SEMAFORO', 'VERDE')
+        dias_atraso = int(semaforo_data.get('DIAS_ATRASO', 0) or 0)
+        cuotas_pendientes = int(semaforo_data.get('CUOTAS_PENDIENTES', 0) or 0)
         
-        # F. Retornar la respuesta final
-        return schemas.EstadoCuentaResponse(
+        # F. Retornar la respuesta final (completa o en streaming)
+        respuesta = schemas.EstadoCuentaResponse(
             id_casa=casa_id, 
             nombre_condomino=nombre_condomino,
-            movimientos=movimientos_list,
-            saldo_pendiente=round(saldo_pendiente, 2),
+            movimientos=[],
+            saldo_pendiente=round(cuenta.saldo, 2),
             estado_semaforo=estado_semaforo,
             dias_atraso=dias_atraso,
-            cuotas_pendientes=cuotas_pendientes
+            cuotas_pendientes=cuotas_pendientes,
+            ultimo_pago=movimiento_response(cuenta.ultimo_pago) if cuenta.ultimo_pago else None
         )
+        if wants_ndjson(request):
+            return ndjson_response(respuesta, "movimientos", movimientos_iter)
+        respuesta.movimientos = list(movimientos_iter)
+        return respuesta
         
     except Exception as e:
         print(f"[ERROR FATAL] Error procesando estado de cuenta para Casa ID {casa_id}: {e}")
@@ -208,16 +248,16 @@ def get_condomino_estado_cuenta(
 
 @app.post("/admin/pagos", tags=["Admin"], 
              dependencies=[Depends(require_admin)])
-def register_pago(
+async def register_pago(
     pago_data: schemas.PagoCreation, 
     payload: schemas.TokenData = Depends(get_current_user_payload),
-    sheets: SheetsService = Depends(get_sheets_service)
+    sheets: StorageBackend = Depends(get_sheets_service)
 ):
     """
     Registra un PAGO. El monto es NEGATIVO (disminuye la deuda de la casa, aumenta el efectivo de Tesorería).
     """
     try:
-        next_id = sheets.generate_next_movement_id()
+        next_id = await sheets.agenerate_next_movement_id()
         fecha_registro = get_local_datetime().strftime('%Y-%m-%d %H:%M')
         mes_periodo = get_local_datetime().strftime('%Y-%m') 
         monto_negativo = -abs(pago_data.MONTO) 
@@ -235,7 +275,7 @@ def register_pago(
             fecha_registro 
         ]
         
-        sheets.append_movement(new_row)
+        await sheets.aappend_movement(new_row)
         
         return {"status": "success", "message": f"Pago registrado correctamente. ID: {next_id}", "ID_MOVIMIENTO": next_id}
         
@@ -246,16 +286,16 @@ def register_pago(
 
 @app.post("/admin/multas", tags=["Admin"], 
              dependencies=[Depends(require_admin)])
-def register_multa(
+async def register_multa(
     multa_data: schemas.MultaCreation, 
     payload: schemas.TokenData = Depends(get_current_user_payload),
-    sheets: SheetsService = Depends(get_sheets_service)
+    sheets: StorageBackend = Depends(get_sheets_service)
 ):
     """
     Registra una MULTA. El monto es POSITIVO (aumenta la deuda de la casa).
     """
     try:
-        next_id = sheets.generate_next_movement_id()
+        next_id = await sheets.agenerate_next_movement_id()
         fecha_registro = get_local_datetime().strftime('%Y-%m-%d %H:%M')
         mes_periodo = get_local_datetime().strftime('%Y-%m')
         monto_positivo = abs(multa_data.MONTO) 
@@ -273,7 +313,7 @@ def register_multa(
             fecha_registro
         ]
         
-        sheets.append_movement(new_row)
+        await sheets.aappend_movement(new_row)
         
         return {"status": "success", "message": f"Multa registrada correctamente. ID: {next_id}", "ID_MOVIMIENTO": next_id}
         
@@ -284,22 +324,22 @@ def register_multa(
 
 @app.post("/admin/alicuotas", tags=["Admin"], 
              dependencies=[Depends(require_admin)])
-def register_alicuotas_masivas(
+async def register_alicuotas_masivas(
     alicuota_data: schemas.AlicuotaCreation, 
     payload: schemas.TokenData = Depends(get_current_user_payload),
-    sheets: SheetsService = Depends(get_sheets_service)
+    sheets: StorageBackend = Depends(get_sheets_service)
 ):
     """
     Registra masivamente la alícuota mensual (Orden de Pago) para todas las casas activas.
     Utiliza la hoja CONFIGURACION para obtener el MONTO y el DÍA DE VENCIMIENTO.
     """
     try:
-        # A. OBTENER CONFIGURACIÓN DEL SISTEMA
-        config_map = sheets.get_config_map()
+        # A. OBTENER CONFIGURACIÓN DEL SISTEMA (validada y en caché, ver config_cache.py)
+        config = await sheets.aget_config()
         
-        # OBTENER VALORES DINÁMICOS DESDE LA CONFIGURACIÓN (usando valores por defecto seguros)
-        monto_alicuota = float(config_map.get("VALOR_ALICUOTA", 50.00) or 50.00)
-        dia_vencimiento = int(config_map.get("DIA_VENCIMIENTO", 5) or 5)
+        # OBTENER VALORES DINÁMICOS DESDE LA CONFIGURACIÓN
+        monto_alicuota = config.VALOR_ALICUOTA
+        dia_vencimiento = config.DIA_VENCIMIENTO
         
         # B. CÁLCULO DE LA FECHA DE VENCIMIENTO (USANDO EL DÍA CONFIGURABLE)
         try:
@@ -310,19 +350,20 @@ def register_alicuotas_masivas(
             raise HTTPException(status_code=400, detail="Formato de MES_PERIODO inválido. Use AAAA-MM.")
             
         # C. Leer todas las casas
-        casa_ids = sheets.get_all_casa_ids()
+        casa_ids = sheets.get_all_casa_ids(usuarios=await sheets.aget_table('USUARIOS'))
         
         if not casa_ids:
             return {"status": "warning", "message": "No se encontraron casas activas para registrar alícuotas."}
 
-        # D. Generar y escribir movimientos para cada casa
+        # D. Generar los movimientos de todas las casas en memoria
         fecha_registro = get_local_datetime().strftime('%Y-%m-%d %H:%M')
+        # Un bloque contiguo de IDs para todas las casas (sin releer la hoja por cada una)
+        movement_ids = await sheets.areserve_movement_ids(len(casa_ids))
         
-        for casa_id in casa_ids:
-            next_id = sheets.generate_next_movement_id() 
-            
+        new_rows = []
+        for casa_id, next_id in zip(casa_ids, movement_ids):
             # ORDEN DE COLUMNAS: ID, ID_CASA, MES_PERIODO, TIPO_MOV, CONCEPTO, MONTO, FECHA_VENCIMIENTO, TIPO_PAGO, FECHA_REGISTRO
-            new_row = [
+            new_rows.append([
                 next_id, 
                 casa_id, 
                 alicuota_data.MES_PERIODO, 
@@ -332,16 +373,32 @@ def register_alicuotas_masivas(
                 fecha_vencimiento, # FECHA DE VENCIMIENTO DINÁMICA
                 "", # TIPO_PAGO (Vacío)
                 fecha_registro 
-            ]
-            
-            sheets.append_movement(new_row)
+            ])
+        
+        # E. Escribir todas las filas con UNA SOLA llamada (todo o nada)
+        try:
+            await sheets.aappend_movements(new_rows)
+        except Exception as e:
+            print(f"[ERROR ESCRITURA ALICUOTAS] Escritura masiva fallida: {e}")
+            traceback.print_exc()
+            raise HTTPException(
+                status_code=500, 
+                detail=f"Error al registrar alícuotas masivas. No se registró ninguna de las {len(new_rows)} órdenes de pago."
+            )
             
         return {
             "status": "success", 
             "message": f"Órdenes de Pago (Alícuotas) registradas para {len(casa_ids)} casas.",
-            "periodo": alicuota_data.MES_PERIODO
+            "periodo": alicuota_data.MES_PERIODO,
+            "total_registros": len(new_rows),
+            "ID_MOVIMIENTO_DESDE": movement_ids[0],
+            "ID_MOVIMIENTO_HASTA": movement_ids[-1],
+            "version_configuracion": config.version,
+            "origen_configuracion": config.origen
         }
         
+    except HTTPException as e:
+        raise e
     except Exception as e:
         print(f"[ERROR ESCRITURA ALICUOTAS]: {e}")
         traceback.print_exc()
@@ -354,93 +411,50 @@ def register_alicuotas_masivas(
 @app.post("/admin/actualizar_semaforo", tags=["Admin"], 
              dependencies=[Depends(require_admin)],
              response_model=schemas.SemaforoUpdateResponse)
-def actualizar_semaforo(
+async def actualizar_semaforo(
     payload: schemas.TokenData = Depends(get_current_user_payload),
-    sheets: SheetsService = Depends(get_sheets_service)
+    sheets: StorageBackend = Depends(get_sheets_service)
 ):
     """
     Consolida todos los movimientos, calcula el saldo, determina la mora y actualiza la hoja ALERTAS_SEMAFORO.
     """
     try:
-        # 1. Obtener datos para consolidación (MÁXIMO DE LECTURAS)
-        casa_ids = [id for id in sheets.get_all_casa_ids() if id != 0] 
-        movimientos_data = sheets.get_all_records('MOVIMIENTOS')
-        user_map = sheets.get_all_users_map() # Optimizador: Lee todos los usuarios de golpe
+        # 1. Obtener datos para consolidación (UNA SOLA LECTURA POR LOTES)
+        # ALERTAS_SEMAFORO se incluye para dejarla en caché antes de las escrituras
+        tables = await sheets.aget_tables(['USUARIOS', 'MOVIMIENTOS', 'ALERTAS_SEMAFORO'])
+        casa_ids = [id for id in sheets.get_all_casa_ids(usuarios=tables['USUARIOS']) if id != 0] 
+        movimientos = tables['MOVIMIENTOS']
+        user_map = sheets.get_all_users_map(usuarios=tables['USUARIOS'])
         
         if not casa_ids:
             return schemas.SemaforoUpdateResponse(status="warning", message="No hay casas registradas (excluyendo Tesorería).", results=[])
         
+        # 2. Saldo, alícuotas pendientes, días de atraso y color por casa (vectorizado, ver ledger.py)
+        semaforo_updates = await anyio.to_thread.run_sync(consolidar_semaforo, movimientos, casa_ids, date.today())
+
+        # 3. Resultado JSON con el contacto de cada casa (user_map usa ID_CASA como texto)
         results = []
-        hoy = date.today()
-        
-        for casa_id in casa_ids:
-            # Lógica de cálculo (omitida por brevedad)
-            saldo = 0.0
-            dias_atraso = 0
-            cuotas_pendientes = 0
-            estado_semaforo = 'VERDE'
-            
-            # 1. Filtrar movimientos y calcular saldo
-            casa_movs = [m for m in movimientos_data if str(m.get('ID_CASA', '')) == str(casa_id)]
-            for m in casa_movs:
-                saldo += float(m.get('MONTO', 0.0) or 0.0)
-
-            # 2. Determinar el estado del semáforo
-            if saldo > 0:
-                # Buscar el movimiento más antiguo no pagado (el cargo con fecha de vencimiento)
-                alicuotas_pendientes = sorted([
-                    m for m in casa_movs 
-                    if m.get('TIPO_MOVIMIENTO') == 'ALICUOTA' and m.get('MONTO') > 0
-                ], key=lambda x: x.get('FECHA_VENCIMIENTO', '9999-12-31'))
-                
-                if alicuotas_pendientes:
-                    cuotas_pendientes = len(alicuotas_pendientes)
-                    try:
-                        fecha_vencimiento_antigua = datetime.strptime(alicuotas_pendientes[0]['FECHA_VENCIMIENTO'], '%Y-%m-%d').date()
-                        dias_atraso = (hoy - fecha_vencimiento_antigua).days
-                        
-                        if dias_atraso >= 30:
-                            estado_semaforo = 'ROJO'
-                        elif dias_atraso >= 15:
-                            estado_semaforo = 'AMARILLO'
-                        else:
-                            estado_semaforo = 'VERDE'
-                    except Exception:
-                        dias_atraso = 0
-                        estado_semaforo = 'VERDE'
-                else:
-                    estado_semaforo = 'VERDE'
-                    
-            # 3. Mapeo del contacto
-            user_info = user_map.get(casa_id, {})
-            nombre = user_info.get('NOMBRE', f'N/A (Casa {casa_id})')
-            email = user_info.get('EMAIL', 'N/A')
-            celular = str(user_info.get('CELULAR', 'N/A'))
-            
-            # d. Actualizar la hoja ALERTAS_SEMAFORO (1 SOLA ESCRITURA POR CASA)
-            sheets.update_or_append_semaforo(
-                casa_id, 
-                dias_atraso, 
-                round(saldo, 2), 
-                estado_semaforo,
-                cuotas_pendientes 
-            )
-            
-            # e. Preparar el resultado JSON para la respuesta
+        for fila in semaforo_updates:
+            casa_id = fila['ID_CASA']
+            user_info = user_map.get(str(casa_id), {})
             results.append(schemas.SemaforoResult(
-                ID_CASA=casa_id,
-                nombre_condomino=nombre,
-                email=email,
-                celular=celular,
-                SALDO=round(saldo, 2),
-                ESTADO_SEMAFORO=estado_semaforo,
-                DIAS_ATRASO=dias_atraso,
-                CUOTAS_PENDIENTES=cuotas_pendientes
+                ID_CASA=str(casa_id),
+                nombre_condomino=user_info.get('NOMBRE', f'N/A (Casa {casa_id})'),
+                email=user_info.get('EMAIL', 'N/A'),
+                celular=str(user_info.get('CELULAR', 'N/A')),
+                SALDO=fila['SALDO'],
+                ESTADO_SEMAFORO=fila['ESTADO_SEMAFORO'],
+                DIAS_ATRASO=fila['DIAS_ATRASO'],
+                CUOTAS_PENDIENTES=fila['CUOTAS_PENDIENTES']
             ))
             
+        # 4. Escribir todas las casas de una vez (1 batch_update + 1 append_rows si hay casas nuevas)
+        escritura = await sheets.abulk_upsert_semaforo(semaforo_updates)
+        total_escrituras = int(escritura['actualizadas'] > 0) + int(escritura['nuevas'] > 0)
+            
         return schemas.SemaforoUpdateResponse(
             status="success", 
-            message=f"Semáforo actualizado para {len(casa_ids)} casas. Total de escrituras: {len(casa_ids)}.",
+            message=f"Semáforo actualizado para {len(casa_ids)} casas. Total de escrituras: {total_escrituras}.",
             results=results
         )
         
@@ -453,20 +467,58 @@ def actualizar_semaforo(
 # ----------------- 5. ENDPOINT DE CONSULTA (ADMIN) -----------------
 # ----------------------------------------------------------------------
 
+def semaforo_results(semaforo_data: Iterable[Dict[str, Any]], usuarios: SheetTable) -> Iterator[schemas.SemaforoResult]:
+    """
+    Filas de ALERTAS_SEMAFORO (sin Tesorería) con el contacto de cada casa, de a una. El contacto se
+    busca por el índice ID_CASA de USUARIOS (sin armar el mapa de todos los usuarios por solicitud).
+    """
+    for record in semaforo_data:
+        try:
+            id_casa = str(record.get('ID_CASA', ''))
+            if id_casa == '0':
+                continue 
+                
+            dias_atraso = int(record.get('DIAS_ATRASO', 0) or 0)
+            saldo = float(record.get('SALDO_PENDIENTE', 0.0) or 0.0)
+            cuotas_pendientes = int(record.get('CUOTAS_PENDIENTES', 0) or 0)
+
+            # Si hay varias filas para la casa vale la última (como en get_all_users_map)
+            usuarios_casa = usuarios.records_for('ID_CASA', id_casa) if id_casa else []
+            user_info = usuarios_casa[-1] if usuarios_casa else {}
+            nombre = user_info.get('NOMBRE', f'N/A (Casa {id_casa})')
+            email = user_info.get('EMAIL', 'N/A')
+            celular = str(user_info.get('CELULAR', 'N/A'))
+            
+            yield schemas.SemaforoResult(
+                ID_CASA=id_casa,
+                nombre_condomino=nombre,
+                email=email,
+                celular=celular,
+                SALDO=round(saldo, 2),
+                ESTADO_SEMAFORO=record.get('ESTADO_SEMAFORO', 'NO_INFO'),
+                DIAS_ATRASO=dias_atraso,
+                CUOTAS_PENDIENTES=cuotas_pendientes
+            )
+        except (ValueError, TypeError, KeyError) as e:
+            print(f"[ERROR MAPPING] Error mapeando registro de semáforo: {record}. Causa: {e}")
+            continue
+
 @app.get("/admin/semaforo", tags=["Admin"], 
              dependencies=[Depends(require_admin)],
              response_model=schemas.SemaforoListResponse)
-def get_semaforo_list(
+async def get_semaforo_list(
+    request: Request,
     payload: schemas.TokenData = Depends(get_current_user_payload),
-    sheets: SheetsService = Depends(get_sheets_service)
+    sheets: StorageBackend = Depends(get_sheets_service)
 ):
     """
     Panel de Control: Obtiene y lista el estado consolidado de la hoja ALERTAS_SEMAFORO, 
     incluyendo nombre, email y celular del condómino para fines de reporte y contacto.
+    Con "Accept: application/x-ndjson" las casas se envían en streaming (una por línea).
     """
     try:
-        user_map = sheets.get_all_users_map()
-        semaforo_data = sheets.get_all_records('ALERTAS_SEMAFORO')
+        tables = await sheets.aget_tables(['USUARIOS', 'ALERTAS_SEMAFORO'])
+        semaforo_data = tables['ALERTAS_SEMAFORO'].records()
         
         if not semaforo_data:
             return schemas.SemaforoListResponse(
@@ -475,36 +527,16 @@ def get_semaforo_list(
                 results=[]
             )
             
-        results = []
-        for record in semaforo_data:
-            try:
-                id_casa = str(record.get('ID_CASA', ''))
-                if id_casa == '0':
-                    continue 
-                    
-                dias_atraso = int(record.get('DIAS_ATRASO', 0) or 0)
-                saldo = float(record.get('SALDO_PENDIENTE', 0.0) or 0.0)
-                cuotas_pendientes = int(record.get('CUOTAS_PENDIENTES', 0) or 0)
-
-                user_info = user_map.get(id_casa, {})
-                nombre = user_info.get('NOMBRE', f'N/A (Casa {id_casa})')
-                email = user_info.get('EMAIL', 'N/A')
-                celular = str(user_info.get('CELULAR', 'N/A'))
-                
-                results.append(schemas.SemaforoResult(
-                    ID_CASA=id_casa,
-                    nombre_condomino=nombre,
-                    email=email,
-                    celular=celular,
-                    SALDO=round(saldo, 2),
-                    ESTADO_SEMAFORO=record.get('ESTADO_SEMAFORO', 'NO_INFO'),
-                    DIAS_ATRASO=dias_atraso,
-                    CUOTAS_PENDIENTES=cuotas_pendientes
-                ))
-            except (ValueError, TypeError, KeyError) as e:
-                print(f"[ERROR MAPPING] Error mapeando registro de semáforo: {record}. Causa: {e}")
-                continue
-                
+        results_iter = semaforo_results(semaforo_data, tables['USUARIOS'])
+        if wants_ndjson(request):
+            header = schemas.SemaforoListResponse(
+                status="success", 
+                message="Panel de control en streaming: una casa por línea con información de contacto.",
+                results=[]
+            )
+            return ndjson_response(header, "results", results_iter)
+
+        results = list(results_iter)
         return schemas.SemaforoListResponse(
             status="success", 
             message=f"Panel de control actualizado para {len(results)} casas con información de contacto completa.",
@@ -523,74 +555,44 @@ def get_semaforo_list(
 @app.get("/admin/estado-cuenta/{id_casa}", tags=["Admin"], 
              dependencies=[Depends(require_admin)],
              response_model=schemas.EstadoCuentaResponse)
-def get_estado_cuenta(
+async def get_estado_cuenta(
     id_casa: int, 
+    request: Request,
     payload: schemas.TokenData = Depends(get_current_user_payload),
-    sheets: SheetsService = Depends(get_sheets_service)
+    sheets: StorageBackend = Depends(get_sheets_service)
 ):
     """
     Obtiene el estado completo de una casa (o Tesorería), incluyendo:
     1. Información del condómino (Contacto).
     2. Estado actual del semáforo.
     3. Lista de todos sus movimientos (cargos y abonos).
+    Con "Accept: application/x-ndjson" los movimientos se envían en streaming (uno por línea).
     """
     try:
-        user_info = sheets.get_user_by_id_casa(id_casa)
+        # Lectura por lotes: USUARIOS, ALERTAS_SEMAFORO y MOVIMIENTOS en una sola llamada
+        tables = await sheets.aget_tables(['USUARIOS', 'ALERTAS_SEMAFORO', 'MOVIMIENTOS'])
+        
+        user_info = sheets.get_user_by_id_casa(id_casa, usuarios=tables['USUARIOS'])
         if not user_info:
             raise HTTPException(status_code=404, detail=f"Casa {id_casa} no encontrada en la base de datos de usuarios.")
         
-        semaforo_info = sheets.get_semaforo_by_casa(id_casa) if id_casa != 0 else {}
+        # Saldo y resumen de la casa desde la proyección por casa (O(1), sin sumar los movimientos)
+        cuenta = sheets.get_casa_ledger(id_casa, movimientos=tables['MOVIMIENTOS'])
+        semaforo_info = sheets.get_semaforo_by_casa(id_casa, semaforo=tables['ALERTAS_SEMAFORO']) if id_casa != 0 else {}
         
         if not semaforo_info and id_casa != 0:
+            # Casa aún sin consolidar en ALERTAS_SEMAFORO: se usa el resumen de la proyección
+            resumen = cuenta.semaforo(id_casa, date.today())
             semaforo_info = {
                 "ID_CASA": str(id_casa),
-                "DIAS_ATRASO": 0,
-                "SALDO_PENDIENTE": 0.0,
-                "ESTADO_SEMAFORO": "VERDE",
-                "CUOTAS_PENDIENTES": 0,
+                "DIAS_ATRASO": resumen['DIAS_ATRASO'],
+                "ESTADO_SEMAFORO": resumen['ESTADO_SEMAFORO'],
+                "CUOTAS_PENDIENTES": resumen['CUOTAS_PENDIENTES'],
                 "FECHA_ACTUALIZACION": get_local_datetime().strftime('%Y-%m-%d %H:%M')
             }
         
-        movimientos_data = sheets.get_records_by_casa_id('MOVIMIENTOS', id_casa)
-        
-        # Mapear los movimientos al esquema
-        movimientos_list = []
-        saldo_calculado = 0.0 
-        for m in movimientos_data:
-            # Lógica de cálculo y mapeo
-            monto_val = float(m.get('MONTO', 0.0) or 0.0) 
-            saldo_calculado += monto_val
-            
-            fecha_vencimiento: Optional[datetime] = None
-            if m.get('FECHA_VENCIMIENTO'):
-                try:
-                    fecha_vencimiento = datetime.strptime(m['FECHA_VENCIMIENTO'], '%Y-%m-%d') 
-                    fecha_vencimiento = LOCAL_TIMEZONE.localize(fecha_vencimiento.replace(tzinfo=None))
-                except ValueError:
-                    pass
-            
-            fecha_registro: Optional[datetime] = None
-            if m.get('FECHA_REGISTRO') and m['FECHA_REGISTRO'].split():
-                try:
-                    fecha_registro = datetime.strptime(m['FECHA_REGISTRO'], '%Y-%m-%d %H:%M')
-                    fecha_registro = LOCAL_TIMEZONE.localize(fecha_registro.replace(tzinfo=None))
-                except ValueError:
-                    try:
-                        fecha_registro = datetime.strptime(m['FECHA_REGISTRO'].split()[0], '%Y-%m-%d')
-                        fecha_registro = LOCAL_TIMEZONE.localize(fecha_registro.replace(tzinfo=None))
-                    except ValueError:
-                        pass
-            
-            movimientos_list.append(schemas.Movimiento(
-                ID_MOVIMIENTO=m.get('ID_MOVIMIENTO', 'N/A'),
-                TIPO_MOVIMIENTO=m.get('TIPO_MOVIMIENTO', 'N/A'),
-                MONTO=monto_val,
-                FECHA_REGISTRO=fecha_registro,
-                FECHA_VENCIMIENTO=fecha_vencimiento,
-                MES_PERIODO=m.get('MES_PERIODO', None),
-                CONCEPTO=m.get('CONCEPTO', None),
-                TIPO_PAGO=m.get('TIPO_PAGO', None)
-            ))
+        # Mapear los movimientos al esquema (registros tipados: monto y fechas ya convertidos), de a uno
+        movimientos_iter = (movimiento_response(m) for m in tables['MOVIMIENTOS'].iter_records_for('ID_CASA', id_casa))
             
         celular_str = str(user_info.get('CELULAR', 'N/A'))
         
@@ -601,10 +603,12 @@ def get_estado_cuenta(
             celular=celular_str,
         )
         
+        # El saldo sale siempre de la proyección (al día con cada registro); de ALERTAS_SEMAFORO
+        # solo se toman el estado, los días de atraso y las cuotas de la última consolidación
         if id_casa != 0:
             semaforo_result = schemas.SemaforoResult(
                 ID_CASA=str(id_casa),
-                SALDO=round(semaforo_info.get('SALDO_PENDIENTE', 0.0) or 0.0, 2),
+                SALDO=round(cuenta.saldo, 2),
                 ESTADO_SEMAFORO=semaforo_info.get('ESTADO_SEMAFORO', 'VERDE'),
                 DIAS_ATRASO=int(semaforo_info.get('DIAS_ATRASO', 0) or 0),
                 CUOTAS_PENDIENTES=int(semaforo_info.get('CUOTAS_PENDIENTES', 0) or 0),
@@ -612,11 +616,10 @@ def get_estado_cuenta(
                 email=condomino_data.email,
                 celular=condomino_data.celular
             )
-            saldo_final = semaforo_result.SALDO
         else:
             semaforo_result = schemas.SemaforoResult(
                 ID_CASA="0",
-                SALDO=round(saldo_calculado, 2),
+                SALDO=round(cuenta.saldo, 2),
                 ESTADO_SEMAFORO="N/A",
                 DIAS_ATRASO=0,
                 CUOTAS_PENDIENTES=0,
@@ -624,16 +627,20 @@ def get_estado_cuenta(
                 email=condomino_data.email,
                 celular=condomino_data.celular
             )
-            saldo_final = saldo_calculado # Usar el saldo calculado para Tesorería
         
-        # 5. Respuesta final
-        return schemas.EstadoCuentaResponse(
+        # 5. Respuesta final (completa o en streaming)
+        respuesta = schemas.EstadoCuentaResponse(
             status="success",
             condomino=condomino_data,
             semaforo_actual=semaforo_result,
-            movimientos=movimientos_list,
-            saldo_pendiente=round(saldo_final, 2)
+            movimientos=[],
+            saldo_pendiente=round(cuenta.saldo, 2),
+            ultimo_pago=movimiento_response(cuenta.ultimo_pago) if cuenta.ultimo_pago else None
         )
+        if wants_ndjson(request):
+            return ndjson_response(respuesta, "movimientos", movimientos_iter)
+        respuesta.movimientos = list(movimientos_iter)
+        return respuesta
 
     except HTTPException as e:
         raise e
@@ -647,13 +654,13 @@ def get_estado_cuenta(
 # ----------------------------------------------------------------------
 @app.post("/admin/tesoreria/transaccion", tags=["Admin", "Tesorería"], 
     dependencies=[Depends(require_admin_or_tesoreria)])
-def register_tesoreria_transaccion(
+async def register_tesoreria_transaccion(
     data: schemas.TesoreriaCreation, 
     payload: schemas.TokenData = Depends(get_current_user_payload),
-    sheets: SheetsService = Depends(get_sheets_service)
+    sheets: StorageBackend = Depends(get_sheets_service)
 ):
     try:
-        next_id = sheets.generate_next_movement_id()
+        next_id = await sheets.agenerate_next_movement_id()
         fecha_registro = get_local_datetime().strftime('%Y-%m-%d %H:%M') 
         mes_periodo = get_local_datetime().strftime('%Y-%m') 
         
@@ -676,10 +683,69 @@ def register_tesoreria_transaccion(
             data.TIPO_MOVIMIENTO_FINANCIERO.upper() # Columna 10: TIPO_MOVIMIENTO_FINANCIERO
         ]
 
-        sheets.append_movement(new_row)
+        await sheets.aappend_movement(new_row)
         return {"status": "success", "message": f"Transacción registrada correctamente. ID: {next_id}", "ID_MOVIMIENTO": next_id}
     except Exception as e:
         print(f"[ERROR TESORERIA TRANSACCION]: {e}")
         traceback.print_exc()
         raise HTTPException(status_code=500, detail="Error al registrar la transacción de tesorería.")
+
+# ----------------------------------------------------------------------
+# ----------------- 8. DIAGNÓSTICO DEL ALMACENAMIENTO (ADMIN) -----------------
+# ----------------------------------------------------------------------
+@app.get("/admin/almacenamiento/stats", tags=["Admin"], 
+             dependencies=[Depends(require_admin)])
+async def get_storage_stats(
+    payload: schemas.TokenData = Depends(get_current_user_payload),
+    sheets: StorageBackend = Depends(get_sheets_service)
+):
+    """
+    Métricas del motor de almacenamiento: hojas en caché, uso del pool de conexiones HTTP
+    (solicitudes, conexiones creadas/reutilizadas) y estado del diario de movimientos.
+    """
+    return {"status": "success", "stats": sheets.stats()}
+
+@app.post("/admin/configuracion/recargar", tags=["Admin"], 
+             dependencies=[Depends(require_admin)])
+async def reload_configuracion(
+    payload: schemas.TokenData = Depends(get_current_user_payload),
+    sheets: StorageBackend = Depends(get_sheets_service)
+):
+    """
+    Fuerza la relectura de la hoja CONFIGURACION (sin esperar al TTL de la caché) y retorna
+    la versión vigente. Si la hoja no se puede leer o no es válida, se mantiene la versión anterior.
+    """
+    config = await sheets.aget_config(force=True)
+    error = get_shared_config_cache().last_error
+    return {
+        "status": "success" if config.origen == "hoja" and error is None else "warning",
+        "version": config.version,
+        "origen": config.origen,
+        "configuracion": config.as_map(),
+        "ultimo_error": error,
+    }
+
+@app.post("/admin/saldos/reconstruir", tags=["Admin"], 
+             dependencies=[Depends(require_admin)])
+async def rebuild_saldos(
+    payload: schemas.TokenData = Depends(get_current_user_payload),
+    sheets: StorageBackend = Depends(get_sheets_service)
+):
+    """
+    Reconstruye desde todas las filas de MOVIMIENTOS la proyección por casa (saldo, último pago,
+    cargo más antiguo y cuotas pendientes) que los registros mantienen de forma incremental.
+    """
+    try:
+        movimientos = (await sheets.aget_tables(['MOVIMIENTOS']))['MOVIMIENTOS']
+        inicio = time.perf_counter()
+        proyeccion = await anyio.to_thread.run_sync(movimientos.rebuild_ledger)
+        return {
+            "status": "success",
+            "duracion_ms": round((time.perf_counter() - inicio) * 1000, 1),
+            **proyeccion.stats(),
+        }
+    except Exception as e:
+        print(f"[ERROR PROYECCION SALDOS]: {e}")
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail="Error al reconstruir los saldos por casa.")
 # ----------------- FIN DE ENDPOINTS -----------------
\ No newline at end of file
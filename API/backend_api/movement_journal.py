@@ -0,0 +1,151 @@
+import json
+import os
+import threading
+import atexit
+from typing import List, Dict, Any, Optional, Callable
+
+# --- CONFIGURACIÓN DEL DIARIO DE MOVIMIENTOS (WRITE-BEHIND) ---
+# Ruta del diario local. Si está vacía, las escrituras van directo a Google Sheets.
+# NOTA: Requiere un proceso de larga duración y disco persistente (no usar en funciones serverless).
+MOVEMENTS_JOURNAL_PATH = os.environ.get("MOVEMENTS_JOURNAL_PATH", "")
+# Segundos entre vaciados del diario hacia MOVIMIENTOS
+MOVEMENTS_JOURNAL_FLUSH_INTERVAL = float(os.environ.get("MOVEMENTS_JOURNAL_FLUSH_INTERVAL", "2"))
+# Máximo de filas por escritura (append_rows)
+MOVEMENTS_JOURNAL_BATCH_SIZE = int(os.environ.get("MOVEMENTS_JOURNAL_BATCH_SIZE", "500"))
+
+
+class MovementJournal:
+    """
+    Diario local de solo-anexado (JSON Lines) con los movimientos aceptados y aún no escritos
+    en la hoja MOVIMIENTOS. Cada anexado se confirma con fsync antes de responder al cliente;
+    al vaciarse un lote, el diario se reescribe de forma atómica con lo que queda pendiente.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._pending: List[List[Any]] = []
+        self._load()
+
+    def _load(self):
+        """Recupera las entradas pendientes de una ejecución anterior."""
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    self._pending.append(json.loads(line)['row'])
+                except (ValueError, KeyError):
+                    # Línea truncada por una caída durante la escritura: se descarta
+                    print(f"[WARN] Entrada inválida en el diario '{self.path}': {line[:80]}")
+        if self._pending:
+            print(f"[INFO] {len(self._pending)} movimientos pendientes recuperados del diario.")
+
+    def append(self, rows: List[List[Any]]):
+        """Anexa filas al diario y las hace durables (flush + fsync)."""
+        lines = "".join(json.dumps({"row": row}, ensure_ascii=False) + "\n" for row in rows)
+        with self._lock:
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(lines)
+                f.flush()
+                os.fsync(f.fileno())
+            self._pending.extend(rows)
+
+    def pending(self) -> List[List[Any]]:
+        """Copia de las filas pendientes, en orden de llegada."""
+        with self._lock:
+            return list(self._pending)
+
+    def mark_flushed(self, count: int):
+        """Quita las primeras `count` filas pendientes y reescribe el diario de forma atómica."""
+        with self._lock:
+            self._pending = self._pending[count:]
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                for row in self._pending:
+                    f.write(json.dumps({"row": row}, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+
+class JournalFlusher:
+    """
+    Hilo en segundo plano que vacía el diario hacia MOVIMIENTOS en lotes.
+    `flush_batch` recibe las filas del lote y retorna al terminar (o lanza excepción para reintentar).
+    """
+
+    def __init__(self, journal: MovementJournal, flush_batch: Callable[[List[List[Any]]], None],
+                 interval: float = MOVEMENTS_JOURNAL_FLUSH_INTERVAL, batch_size: int = MOVEMENTS_JOURNAL_BATCH_SIZE):
+        self.journal = journal
+        self.flush_batch = flush_batch
+        self.interval = interval
+        self.batch_size = batch_size
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._flush_lock = threading.Lock()
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """Inicia el hilo (idempotente) y registra un vaciado final al terminar el proceso."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name="movement-journal-flusher", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def notify(self):
+        """Despierta al hilo para vaciar sin esperar al siguiente intervalo."""
+        self._wakeup.set()
+
+    def stop(self):
+        """Detiene el hilo y hace un último intento de vaciado."""
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=10)
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"[ERROR DIARIO] Quedan movimientos pendientes en '{self.journal.path}': {e}")
+
+    def flush(self) -> int:
+        """Vacía el diario de forma síncrona. Retorna cuántas filas se escribieron."""
+        written = 0
+        with self._flush_lock:
+            while True:
+                batch = self.journal.pending()[:self.batch_size]
+                if not batch:
+                    break
+                self.flush_batch(batch)
+                self.journal.mark_flushed(len(batch))
+                written += len(batch)
+        return written
+
+    def _run(self):
+        backoff = self.interval
+        while not self._stop.is_set():
+            self._wakeup.wait(backoff)
+            self._wakeup.clear()
+            if self._stop.is_set():
+                break
+            try:
+                self.flush()
+                self.last_error = None
+                backoff = self.interval
+            except Exception as e:
+                # Se conserva el diario y se reintenta con espera creciente (máximo 60 s)
+                self.last_error = str(e)
+                print(f"[ERROR DIARIO] Fallo al vaciar movimientos pendientes: {e}")
+                backoff = min(max(backoff, 1.0) * 2, 60.0)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "pendientes": len(self.journal.pending()),
+            "ultimo_error": self.last_error,
+            "activo": self._thread is not None and self._thread.is_alive(),
+        }
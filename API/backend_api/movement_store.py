@@ -0,0 +1,182 @@
+from datetime import datetime
+from typing import List, Dict, Any, Optional, Sequence
+
+import pytz
+
+from API.backend_api.sheet_schema import integer, decimal
+
+# Zona horaria de las fechas de la hoja (Guayaquil, Ecuador)
+LOCAL_TIMEZONE = pytz.timezone('America/Guayaquil')
+
+# Atributo de Movement -> columna de MOVIMIENTOS
+MOVEMENT_FIELDS = {
+    'id_movimiento': 'ID_MOVIMIENTO',
+    'id_casa': 'ID_CASA',
+    'mes_periodo': 'MES_PERIODO',
+    'tipo_movimiento': 'TIPO_MOVIMIENTO',
+    'concepto': 'CONCEPTO',
+    'monto': 'MONTO',
+    'fecha_vencimiento': 'FECHA_VENCIMIENTO',
+    'tipo_pago': 'TIPO_PAGO',
+    'fecha_registro': 'FECHA_REGISTRO',
+    'tipo_movimiento_financiero': 'TIPO_MOVIMIENTO_FINANCIERO',
+}
+
+# Columnas de texto con pocos valores distintos: se comparte una sola cadena por valor
+CATEGORICAL_FIELDS = ('id_casa', 'mes_periodo', 'tipo_movimiento', 'tipo_pago')
+
+# Máximo de valores distintos que guarda cada caché de un decodificador (las demás celdas se
+# convierten sin guardarse); acota la memoria aunque una columna resulte tener valores únicos
+DECODER_CACHE_LIMIT = 4096
+
+
+_MISSING = object()
+
+
+class Movement:
+    """
+    Movimiento tipado (una fila de MOVIMIENTOS), sin diccionario por instancia (__slots__).
+    id_casa es int (None si la celda no es numérica), monto es float (0.0 si está vacío o no es
+    numérico) y las fechas son datetime con zona horaria local (None si están vacías o no son válidas).
+    mes_periodo, tipo_movimiento y tipo_pago son la misma cadena compartida por valor
+    (CATEGORICAL_FIELDS); concepto e id_movimiento se guardan tal como vienen en la fila.
+    """
+    __slots__ = tuple(MOVEMENT_FIELDS)
+
+    def __init__(self, id_movimiento: str, id_casa: Optional[int], mes_periodo: str, tipo_movimiento: str,
+                 concepto: str, monto: float, fecha_vencimiento: Optional[datetime], tipo_pago: str,
+                 fecha_registro: Optional[datetime], tipo_movimiento_financiero: str):
+        self.id_movimiento = id_movimiento
+        self.id_casa = id_casa
+        self.mes_periodo = mes_periodo
+        self.tipo_movimiento = tipo_movimiento
+        self.concepto = concepto
+        self.monto = monto
+        self.fecha_vencimiento = fecha_vencimiento
+        self.tipo_pago = tipo_pago
+        self.fecha_registro = fecha_registro
+        self.tipo_movimiento_financiero = tipo_movimiento_financiero
+
+    def as_record(self) -> Dict[str, Any]:
+        """Diccionario con los nombres de columna de la hoja y los valores tipados."""
+        return {column: getattr(self, attr) for attr, column in MOVEMENT_FIELDS.items()}
+
+    def __repr__(self) -> str:
+        return f"Movement({self.id_movimiento!r}, casa={self.id_casa!r}, {self.tipo_movimiento!r}, {self.monto!r})"
+
+
+def _parse_date(value: str) -> Optional[datetime]:
+    """'AAAA-MM-DD' -> datetime local a medianoche."""
+    try:
+        return LOCAL_TIMEZONE.localize(datetime.strptime(value, '%Y-%m-%d'))
+    except ValueError:
+        return None
+
+
+def _parse_timestamp(value: str) -> Optional[datetime]:
+    """'AAAA-MM-DD HH:MM' (o solo la fecha) -> datetime local."""
+    if not value.split():
+        return None
+    try:
+        return LOCAL_TIMEZONE.localize(datetime.strptime(value, '%Y-%m-%d %H:%M'))
+    except ValueError:
+        return _parse_date(value.split()[0])
+
+
+class MovementDecoder:
+    """
+    Decodificador de filas de MOVIMIENTOS a Movement para una cabecera concreta (mismo uso que
+    sheet_schema.RowDecoder). Se crea uno por carga de la hoja (ver record_decoder), así sus cachés
+    se liberan junto con la copia. Las celdas categóricas (CATEGORICAL_FIELDS) de la fila cruda se
+    reemplazan por una cadena compartida por valor, y ID_CASA, MONTO y las fechas se convierten una
+    vez por valor distinto; cada caché guarda como máximo DECODER_CACHE_LIMIT valores, así las
+    columnas casi únicas por fila (MONTO, FECHA_REGISTRO) no crecen sin límite.
+    """
+
+    def __init__(self, header: Sequence[str]):
+        self.header = tuple(header)
+        positions = {name: i for i, name in enumerate(self.header)}
+        self._positions = {attr: positions.get(column) for attr, column in MOVEMENT_FIELDS.items()}
+        self._categorical = [self._positions[attr] for attr in CATEGORICAL_FIELDS if self._positions[attr] is not None]
+        self._strings: Dict[str, str] = {}
+        self._casas: Dict[str, Optional[int]] = {}
+        self._amounts: Dict[str, float] = {}
+        self._dates: Dict[str, Optional[datetime]] = {}
+        self._timestamps: Dict[str, Optional[datetime]] = {}
+
+    @staticmethod
+    def _casa(value: str) -> Optional[int]:
+        try:
+            return integer(value)
+        except (ValueError, OverflowError):
+            return None
+
+    @staticmethod
+    def _amount(value: str) -> Optional[float]:
+        """MONTO como float (0.0 si está vacío); None si la celda no es numérica."""
+        try:
+            return decimal(value) if value else 0.0
+        except ValueError:
+            return None
+
+    @staticmethod
+    def _lookup(cache: Dict[str, Any], value: str, convert) -> Any:
+        result = cache.get(value, _MISSING)
+        if result is _MISSING:
+            result = convert(value)
+            if len(cache) < DECODER_CACHE_LIMIT:
+                cache[value] = result
+        return result
+
+    def _timestamp(self, value: str) -> Optional[datetime]:
+        """
+        Igual que _parse_timestamp, pero la fecha (pocos valores distintos) sale de la caché y solo
+        se le aplican la hora y los minutos. Guayaquil no tiene horario de verano: la diferencia
+        horaria de la medianoche vale para todo el día.
+        """
+        parts = value.split()
+        if not parts:
+            return None
+        day = self._lookup(self._dates, parts[0], _parse_date)
+        if len(parts) == 1 or day is None:
+            return day
+        if len(parts) != 2 or value[0].isspace() or value[-1].isspace():
+            return _parse_timestamp(value)
+        hour, sep, minute = parts[1].partition(':')
+        if sep and hour.isdigit() and minute.isdigit() and len(hour) <= 2 and len(minute) <= 2 \
+                and int(hour) < 24 and int(minute) < 60:
+            return day.replace(hour=int(hour), minute=int(minute))
+        return _parse_timestamp(value)
+
+    def __call__(self, row: List[str]) -> Movement:
+        strings = self._strings
+        for i in self._categorical:
+            value = row[i]
+            shared = strings.get(value)
+            if shared is None:
+                if len(strings) >= DECODER_CACHE_LIMIT:
+                    continue
+                shared = strings[value] = value
+            row[i] = shared
+
+        p = self._positions
+        monto = self._lookup(self._amounts, row[p['monto']] if p['monto'] is not None else "", self._amount)
+        if monto is None:
+            print(f"[WARN] MOVIMIENTOS: MONTO no numérico {row[p['monto']]!r} en el movimiento "
+                  f"{row[p['id_movimiento']] if p['id_movimiento'] is not None else '?'}; se cuenta como 0.0")
+            monto = 0.0
+        return Movement(
+            row[p['id_movimiento']] if p['id_movimiento'] is not None else "",
+            self._lookup(self._casas, row[p['id_casa']] if p['id_casa'] is not None else "", self._casa),
+            row[p['mes_periodo']] if p['mes_periodo'] is not None else "",
+            row[p['tipo_movimiento']] if p['tipo_movimiento'] is not None else "",
+            row[p['concepto']] if p['concepto'] is not None else "",
+            monto,
+            self._lookup(self._dates, row[p['fecha_vencimiento']] if p['fecha_vencimiento'] is not None else "", _parse_date),
+            row[p['tipo_pago']] if p['tipo_pago'] is not None else "",
+            self._lookup(self._timestamps, row[p['fecha_registro']] if p['fecha_registro'] is not None else "", self._timestamp),
+            row[p['tipo_movimiento_financiero']] if p['tipo_movimiento_financiero'] is not None else "",
+        )
+
+    def decode_all(self, rows: Sequence[List[str]]) -> List[Movement]:
+        return [self(row) for row in rows]
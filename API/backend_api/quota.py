@@ -0,0 +1,161 @@
+import asyncio
+import os
+import threading
+import time
+from typing import Dict, Any, Callable, Awaitable, Tuple, Type
+from urllib.parse import urlsplit
+
+from tenacity import (
+    Retrying,
+    AsyncRetrying,
+    retry_if_exception_type,
+    retry_if_result,
+    stop_after_attempt,
+    wait_random_exponential,
+)
+
+# --- CONFIGURACIÓN DE CUOTA Y REINTENTOS (API DE GOOGLE SHEETS) ---
+# Solicitudes por minuto permitidas a este proceso (cuota por defecto de Sheets: 60/min por usuario).
+# 0 desactiva la limitación local.
+SHEETS_QUOTA_PER_MINUTE = float(os.environ.get("SHEETS_QUOTA_PER_MINUTE", "60"))
+# Solicitudes que pueden salir seguidas antes de empezar a espaciarlas
+SHEETS_QUOTA_BURST = int(os.environ.get("SHEETS_QUOTA_BURST", "10"))
+# Reintentos ante 429 / 5xx (con espera exponencial aleatoria)
+SHEETS_MAX_RETRIES = int(os.environ.get("SHEETS_MAX_RETRIES", "5"))
+# Espera máxima (segundos) entre reintentos
+SHEETS_BACKOFF_MAX = float(os.environ.get("SHEETS_BACKOFF_MAX", "32"))
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+# Métodos POST de la API que solo leen o escriben valores en rangos fijos
+IDEMPOTENT_POST_SUFFIXES = ("/values:batchUpdate", "/values:batchGet")
+
+
+def is_idempotent(method: str, url: str) -> bool:
+    """
+    Indica si repetir la solicitud no puede duplicar datos. Las lecturas y las escrituras de valores
+    sobre rangos fijos (PUT, values:batchUpdate) lo son; values:append no (un 5xx puede haber escrito
+    filas), ni spreadsheets:batchUpdate (puede añadir hojas, filas o celdas).
+    """
+    return method.upper() in ("GET", "PUT") or urlsplit(url).path.endswith(IDEMPOTENT_POST_SUFFIXES)
+
+
+class TokenBucket:
+    """
+    Cubeta de fichas: se recarga a `rate_per_minute` y admite ráfagas de hasta `capacity`.
+    reserve() toma una ficha y retorna cuántos segundos esperar antes de usarla (las
+    solicitudes que exceden la cuota quedan en cola en orden de llegada).
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(capacity, 1)
+        self._tokens = float(self.capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+
+class RequestScheduler:
+    """
+    Planificador central de las llamadas a la API: cada intento consume una ficha de la cuota y
+    las respuestas 429 (y 5xx en solicitudes idempotentes) se reintentan con espera exponencial
+    aleatoria (tenacity), respetando Retry-After. Lleva el tiempo total de espera por cuota y backoff.
+    """
+
+    def __init__(self, quota_per_minute: float = SHEETS_QUOTA_PER_MINUTE, burst: int = SHEETS_QUOTA_BURST,
+                 max_retries: int = SHEETS_MAX_RETRIES, backoff_max: float = SHEETS_BACKOFF_MAX):
+        self.bucket = TokenBucket(quota_per_minute, burst)
+        self.max_retries = max_retries
+        self._jitter = wait_random_exponential(multiplier=0.5, max=backoff_max)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+        self.exhausted = 0
+        self.throttled_seconds = 0.0
+        self.backoff_seconds = 0.0
+
+    # --- POLÍTICA DE REINTENTO ---
+
+    def _should_retry(self, response, idempotent: bool) -> bool:
+        status = response.status_code
+        return status == 429 or (idempotent and status in RETRYABLE_STATUS)
+
+    def _wait(self, retry_state) -> float:
+        """Espera exponencial con jitter; si la API envía Retry-After, se espera al menos eso."""
+        wait = self._jitter(retry_state)
+        outcome = retry_state.outcome
+        if outcome is not None and not outcome.failed:
+            retry_after = outcome.result().headers.get("Retry-After", "")
+            if retry_after.isdigit():
+                wait = max(wait, float(retry_after))
+        with self._lock:
+            self.retries += 1
+            self.backoff_seconds += wait
+        return wait
+
+    def _on_exhausted(self, retry_state):
+        """Agotados los reintentos se entrega la última respuesta (o se relanza la última excepción)."""
+        with self._lock:
+            self.exhausted += 1
+        return retry_state.outcome.result()
+
+    def _retrying_kwargs(self, idempotent: bool, transport_errors: Tuple[Type[BaseException], ...]) -> Dict[str, Any]:
+        retry = retry_if_result(lambda response: self._should_retry(response, idempotent))
+        if idempotent and transport_errors:
+            retry = retry | retry_if_exception_type(transport_errors)
+        return {
+            "retry": retry,
+            "wait": self._wait,
+            "stop": stop_after_attempt(self.max_retries + 1),
+            "retry_error_callback": self._on_exhausted,
+        }
+
+    def _throttle_delay(self) -> float:
+        delay = self.bucket.reserve()
+        with self._lock:
+            self.calls += 1
+            self.throttled_seconds += delay
+        return delay
+
+    # --- EJECUCIÓN ---
+
+    def send(self, do_request: Callable[[], Any], idempotent: bool,
+             transport_errors: Tuple[Type[BaseException], ...] = ()):
+        """Ejecuta una solicitud síncrona (retorna la respuesta HTTP) bajo la cuota y los reintentos."""
+        def attempt():
+            delay = self._throttle_delay()
+            if delay:
+                time.sleep(delay)
+            return do_request()
+        return Retrying(**self._retrying_kwargs(idempotent, transport_errors))(attempt)
+
+    async def asend(self, do_request: Callable[[], Awaitable[Any]], idempotent: bool,
+                    transport_errors: Tuple[Type[BaseException], ...] = ()):
+        """Versión asíncrona de send (espera con asyncio.sleep, sin bloquear el event loop)."""
+        async def attempt():
+            delay = self._throttle_delay()
+            if delay:
+                await asyncio.sleep(delay)
+            return await do_request()
+        return await AsyncRetrying(**self._retrying_kwargs(idempotent, transport_errors))(attempt)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cuota_por_minuto": self.bucket.rate * 60,
+            "llamadas": self.calls,
+            "reintentos": self.retries,
+            "reintentos_agotados": self.exhausted,
+            "segundos_en_espera_cuota": round(self.throttled_seconds, 3),
+            "segundos_en_backoff": round(self.backoff_seconds, 3),
+        }
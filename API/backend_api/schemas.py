@@ -129,6 +129,9 @@ class EstadoCuentaResponse(BaseModel):
 	estado_semaforo: Optional[str] = Field(None)
 	dias_atraso: Optional[int] = Field(None)
 	cuotas_pendientes: Optional[int] = Field(None)
+
+	# Último PAGO de la casa (desde la proyección por casa, ver ledger.py)
+	ultimo_pago: Optional[Movimiento] = Field(None)
 # --------------------------------------------------------
 # --- 3. Modelos de Creación (Input para el Admin) ---
 # --------------------------------------------------------
@@ -0,0 +1,124 @@
+import re
+from functools import lru_cache
+from typing import List, Dict, Any, Callable, Optional, Sequence, Tuple
+
+# ----------------------------------------------------------------------
+# --- ESQUEMA DE LAS HOJAS ---
+# ----------------------------------------------------------------------
+
+# Columnas de cada hoja, en el mismo orden que en Google Sheets.
+SHEET_COLUMNS: Dict[str, List[str]] = {
+    'USUARIOS': ['DNI', 'ID_CASA', 'NOMBRE', 'EMAIL', 'CELULAR', 'ROL', 'PASSWORD_HASH', 'ESTADO'],
+    'MOVIMIENTOS': [
+        'ID_MOVIMIENTO', 'ID_CASA', 'MES_PERIODO', 'TIPO_MOVIMIENTO', 'CONCEPTO', 'MONTO',
+        'FECHA_VENCIMIENTO', 'TIPO_PAGO', 'FECHA_REGISTRO', 'TIPO_MOVIMIENTO_FINANCIERO'
+    ],
+    'ALERTAS_SEMAFORO': ['ID_CASA', 'SALDO_PENDIENTE', 'DIAS_ATRASO', 'ESTADO_SEMAFORO', 'CUOTAS_PENDIENTES', 'FECHA_ACTUALIZACION'],
+    'CONFIGURACION': ['CLAVE', 'VALOR'],
+}
+
+
+# --- CONVERSORES DE CELDA ---
+# Reciben el texto de la celda y lanzan ValueError si no se puede convertir
+# (en ese caso el registro conserva el texto original).
+
+def integer(value: str) -> int:
+    """Entero ('5', ' 5 ' y '5.0' -> 5)."""
+    return int(float(value))
+
+
+# Número con separador de miles: grupos de 3 dígitos separados siempre por el mismo signo y,
+# opcionalmente, la parte decimal tras el otro signo ('1,234.50', '1.234,50', '1.234.567')
+_GROUPED_NUMBER = re.compile(r'\s*[+-]?\d{1,3}([.,])\d{3}(?:\1\d{3})*(?:(?!\1)[.,]\d*)?\s*')
+
+
+def decimal(value: str) -> float:
+    """
+    Número decimal; acepta coma como separador ('12,50' -> 12.5) y separador de miles cuando no es
+    ambiguo ('1,234.50' y '1.234,50' -> 1234.5). Un único separador sin parte decimal ('1,234') se
+    sigue leyendo como decimal.
+    """
+    try:
+        return float(value.replace(',', '.'))
+    except ValueError:
+        match = _GROUPED_NUMBER.fullmatch(value)
+        if match is None:
+            raise
+        return float(value.replace(match.group(1), '').replace(',', '.'))
+
+
+def config_value(value: str) -> Any:
+    """Valor de CONFIGURACION: float si tiene separador decimal, int si son dígitos, si no texto."""
+    value = value.strip()
+    if '.' in value or ',' in value:
+        return decimal(value)
+    if value.isdigit():
+        return int(value)
+    return value
+
+
+# Tipo de cada columna por hoja. Las columnas que no figuran (o las de hojas sin esquema) se
+# conservan como texto: DNI y CELULAR no se numerizan (se perderían los ceros a la izquierda).
+SHEET_SCHEMAS: Dict[str, Dict[str, Callable[[str], Any]]] = {
+    'USUARIOS': {'ID_CASA': integer},
+    'MOVIMIENTOS': {'ID_CASA': integer, 'MONTO': decimal},
+    'ALERTAS_SEMAFORO': {
+        'ID_CASA': integer,
+        'SALDO_PENDIENTE': decimal,
+        'SALDO': decimal,
+        'DIAS_ATRASO': integer,
+        'CUOTAS_PENDIENTES': integer,
+    },
+    'CONFIGURACION': {'VALOR': config_value},
+}
+
+
+# ----------------------------------------------------------------------
+# --- DECODIFICADOR DE FILAS ---
+# ----------------------------------------------------------------------
+
+class RowDecoder:
+    """
+    Decodificador compilado para una cabecera concreta: guarda solo las columnas con tipo
+    (posición -> conversor), de modo que cada fila se convierte sin revisar el nombre de cada celda.
+    """
+    __slots__ = ("header", "_typed")
+
+    def __init__(self, header: Sequence[str], schema: Dict[str, Callable[[str], Any]]):
+        self.header: Tuple[str, ...] = tuple(header)
+        self._typed = [(i, schema[name]) for i, name in enumerate(self.header) if name in schema]
+
+    def values(self, row: Sequence[str]) -> List[Any]:
+        """Valores convertidos de una fila, en el orden de la cabecera."""
+        values = list(row)
+        for i, convert in self._typed:
+            try:
+                values[i] = convert(values[i])
+            except (ValueError, TypeError, OverflowError):
+                pass
+        return values
+
+    def __call__(self, row: Sequence[str]) -> Dict[str, Any]:
+        """Registro (diccionario por cabecera) de una fila."""
+        return dict(zip(self.header, self.values(row)))
+
+    def decode_all(self, rows: Sequence[Sequence[str]]) -> List[Dict[str, Any]]:
+        """Registros de todas las filas."""
+        header = self.header
+        values = self.values
+        return [dict(zip(header, values(row))) for row in rows]
+
+
+@lru_cache(maxsize=64)
+def _compile(title: str, header: Tuple[str, ...]) -> RowDecoder:
+    return RowDecoder(header, SHEET_SCHEMAS.get(title, {}))
+
+
+def compile_decoder(title: str, header: Sequence[str]) -> RowDecoder:
+    """Decodificador de la hoja `title` para la cabecera dada (uno por cabecera, reutilizado)."""
+    return _compile(title, tuple(header))
+
+
+def typed_or(value: Any, default: Any) -> Any:
+    """El valor decodificado si tiene el tipo esperado (el de `default`); si no, `default`."""
+    return value if isinstance(value, type(default)) else default
@@ -0,0 +1,380 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from datetime import datetime, timezone
+from typing import List, Dict, Any, Optional, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from gspread.utils import rowcol_to_a1
+
+from API.backend_api.storage import _to_cell
+
+# ----------------------------------------------------------------------
+# --- EMULADOR LOCAL DE GOOGLE SHEETS v4 / DRIVE v3 ---
+# ----------------------------------------------------------------------
+# Servidor en memoria con el subconjunto de endpoints que usan gspread y AsyncSheetsService:
+# búsqueda por nombre en Drive, metadatos del libro, values get/batchGet, append, update y
+# batchUpdate. Permite ejecutar y medir el backend sin credenciales ni red:
+#
+#   python -m API.backend_api.sheets_emulator --port 8765 [--data libro.json]
+#   SHEETS_API_ENDPOINT=http://127.0.0.1:8765 uvicorn API.index:app
+#
+# El archivo --data es un JSON {"title": "...", "sheets": {"HOJA": [[cabecera], [fila], ...]}}.
+
+# Latencia artificial por solicitud (milisegundos)
+SHEETS_EMULATOR_LATENCY_MS = float(os.environ.get("SHEETS_EMULATOR_LATENCY_MS", "0"))
+# Solicitudes por minuto antes de responder 429 (0 = sin límite), como la cuota real
+SHEETS_EMULATOR_QUOTA_PER_MINUTE = int(os.environ.get("SHEETS_EMULATOR_QUOTA_PER_MINUTE", "0"))
+# Probabilidad (0-1) de responder un 429/503 aleatorio
+SHEETS_EMULATOR_ERROR_RATE = float(os.environ.get("SHEETS_EMULATOR_ERROR_RATE", "0"))
+
+_RANGE_RE = re.compile(r"^(?:'((?:[^']|'')+)'|([^!]+))(?:!(.+))?$")
+_CELLS_RE = re.compile(r"^([A-Z]*)(\d*)(?::([A-Z]*)(\d*))?$")
+
+
+def _col_number(letters: str) -> int:
+    number = 0
+    for ch in letters:
+        number = number * 26 + ord(ch) - 64
+    return number
+
+
+def _api_error(code: int, message: str, status: str) -> JSONResponse:
+    return JSONResponse(status_code=code, content={"error": {"code": code, "message": message, "status": status}})
+
+
+class EmulatedSpreadsheet:
+    """Libro en memoria: hojas como listas de filas de texto (lo que la API devuelve con FORMATTED_VALUE)."""
+
+    def __init__(self, title: str, sheets: Dict[str, List[List[Any]]], spreadsheet_id: Optional[str] = None):
+        self.id = spreadsheet_id or uuid.uuid4().hex
+        self.title = title
+        self.sheets: Dict[str, List[List[str]]] = {}
+        self.sheet_ids: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.created_time = self.modified_time = datetime.now(timezone.utc)
+        for name, rows in sheets.items():
+            self.add_sheet(name, rows)
+
+    def add_sheet(self, name: str, rows: List[List[Any]]):
+        self.sheets[name] = [[_to_cell(v) for v in row] for row in rows]
+        self.sheet_ids[name] = len(self.sheet_ids)
+
+    def touch(self):
+        self.modified_time = datetime.now(timezone.utc)
+
+    # --- RANGOS A1 ---
+
+    def parse_range(self, a1: str) -> Tuple[str, int, int, Optional[int], Optional[int]]:
+        """'HOJA'!A2:F -> (hoja, fila_ini, col_ini, fila_fin|None, col_fin|None), base 1 e inclusivo."""
+        match = _RANGE_RE.match(a1)
+        if not match:
+            raise KeyError(a1)
+        title = (match.group(1) or "").replace("''", "'") or match.group(2)
+        if title not in self.sheets:
+            raise KeyError(title)
+        cells = match.group(3)
+        if not cells:
+            return title, 1, 1, None, None
+        parts = _CELLS_RE.match(cells)
+        if not parts:
+            raise KeyError(a1)
+        c1, r1, c2, r2 = parts.groups()
+        if c2 is None and r2 is None:
+            # Celda única (A2) o fila/columna completa sin ':' no aplican aquí
+            c2, r2 = c1, r1
+        return (
+            title,
+            int(r1) if r1 else 1,
+            _col_number(c1) if c1 else 1,
+            int(r2) if r2 else None,
+            _col_number(c2) if c2 else None,
+        )
+
+    def read(self, a1: str, major_dimension: str = "ROWS") -> Dict[str, Any]:
+        """Valores de un rango, sin celdas ni filas vacías finales (como la API)."""
+        title, r1, c1, r2, c2 = self.parse_range(a1)
+        with self._lock:
+            rows = self.sheets[title][r1 - 1: r2]
+            values = [list(row[c1 - 1: c2]) for row in rows]
+        for row in values:
+            while row and row[-1] == "":
+                row.pop()
+        while values and not values[-1]:
+            values.pop()
+        if major_dimension == "COLUMNS" and values:
+            width = max(len(row) for row in values)
+            values = [[row[i] if i < len(row) else "" for row in values] for i in range(width)]
+            for col in values:
+                while col and col[-1] == "":
+                    col.pop()
+        result: Dict[str, Any] = {"range": a1, "majorDimension": major_dimension}
+        if values:
+            result["values"] = values
+        return result
+
+    def write(self, a1: str, values: List[List[Any]]) -> Dict[str, Any]:
+        """Escribe valores desde la esquina superior izquierda del rango (update / batchUpdate)."""
+        title, r1, c1, _, _ = self.parse_range(a1)
+        with self._lock:
+            sheet = self.sheets[title]
+            for i, row in enumerate(values):
+                target = r1 - 1 + i
+                while len(sheet) <= target:
+                    sheet.append([])
+                cells = sheet[target]
+                end = c1 - 1 + len(row)
+                if len(cells) < end:
+                    cells.extend([""] * (end - len(cells)))
+                for j, value in enumerate(row):
+                    cells[c1 - 1 + j] = _to_cell(value)
+            self.touch()
+        width = max((len(row) for row in values), default=0)
+        last = rowcol_to_a1(r1 + max(len(values), 1) - 1, c1 + max(width, 1) - 1)
+        return {
+            "spreadsheetId": self.id,
+            "updatedRange": f"'{title}'!{rowcol_to_a1(r1, c1)}:{last}",
+            "updatedRows": len(values),
+            "updatedColumns": width,
+            "updatedCells": sum(len(row) for row in values),
+        }
+
+    def append(self, a1: str, values: List[List[Any]]) -> Dict[str, Any]:
+        """Añade filas después de la última fila con datos de la hoja (values:append)."""
+        title = self.parse_range(a1)[0]
+        with self._lock:
+            sheet = self.sheets[title]
+            last = len(sheet)
+            while last and not any(cell != "" for cell in sheet[last - 1]):
+                last -= 1
+            del sheet[last:]
+        updates = self.write(f"'{title}'!A{last + 1}", values)
+        return {"spreadsheetId": self.id, "tableRange": f"'{title}'!A1:{rowcol_to_a1(max(last, 1), 26)}", "updates": updates}
+
+    def metadata(self) -> Dict[str, Any]:
+        with self._lock:
+            sheets = [{
+                "properties": {
+                    "sheetId": self.sheet_ids[name],
+                    "title": name,
+                    "index": i,
+                    "sheetType": "GRID",
+                    "gridProperties": {
+                        "rowCount": max(1000, len(rows)),
+                        "columnCount": max([26] + [len(row) for row in rows]),
+                    },
+                }
+            } for i, (name, rows) in enumerate(self.sheets.items())]
+        return {
+            "spreadsheetId": self.id,
+            "properties": {"title": self.title, "locale": "es_EC", "timeZone": "America/Guayaquil"},
+            "sheets": sheets,
+            "spreadsheetUrl": f"https://docs.google.com/spreadsheets/d/{self.id}/edit",
+        }
+
+    def drive_file(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "name": self.title,
+            "mimeType": "application/vnd.google-apps.spreadsheet",
+            "createdTime": self.created_time.isoformat().replace("+00:00", "Z"),
+            "modifiedTime": self.modified_time.isoformat().replace("+00:00", "Z"),
+        }
+
+
+def default_workbook() -> EmulatedSpreadsheet:
+    """Libro 'gestion_condominio' con las cabeceras de cada hoja y la configuración por defecto."""
+    from API.backend_api.sheet_schema import SHEET_COLUMNS
+    from API.backend_api.sheets_service import SPREADSHEET_NAME
+
+    sheets = {name: [columns] for name, columns in SHEET_COLUMNS.items()}
+    sheets['CONFIGURACION'] += [["VALOR_ALICUOTA", "50.00"], ["DIA_VENCIMIENTO", "5"]]
+    return EmulatedSpreadsheet(SPREADSHEET_NAME, sheets)
+
+
+def load_workbook(path: str) -> EmulatedSpreadsheet:
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+    return EmulatedSpreadsheet(data["title"], data["sheets"], data.get("id"))
+
+
+def create_app(workbooks: Optional[List[EmulatedSpreadsheet]] = None,
+               latency_ms: float = SHEETS_EMULATOR_LATENCY_MS,
+               quota_per_minute: int = SHEETS_EMULATOR_QUOTA_PER_MINUTE,
+               error_rate: float = SHEETS_EMULATOR_ERROR_RATE) -> FastAPI:
+    """
+    Crea la aplicación del emulador. `app.state.calls` cuenta las solicitudes por operación
+    (para medir cuántas llamadas hace el backend) y `app.state.workbooks` expone los datos.
+    """
+    app = FastAPI(title="Emulador Google Sheets v4")
+    books = {book.id: book for book in (workbooks or [default_workbook()])}
+    app.state.workbooks = books
+    app.state.calls = Counter()
+    app.state.latency_ms = latency_ms
+    app.state.quota_per_minute = quota_per_minute
+    app.state.error_rate = error_rate
+    window: deque = deque()
+
+    @app.middleware("http")
+    async def simulate_conditions(request: Request, call_next):
+        if request.url.path.startswith("/_emulator"):
+            return await call_next(request)
+        if app.state.latency_ms:
+            await asyncio.sleep(app.state.latency_ms / 1000.0)
+        now = time.monotonic()
+        if app.state.quota_per_minute:
+            while window and now - window[0] > 60:
+                window.popleft()
+            if len(window) >= app.state.quota_per_minute:
+                app.state.calls["429_cuota"] += 1
+                return _api_error(429, "Quota exceeded for quota metric 'Read requests' (emulador).", "RESOURCE_EXHAUSTED")
+            window.append(now)
+        if app.state.error_rate and random.random() < app.state.error_rate:
+            code = random.choice([429, 503])
+            app.state.calls[f"{code}_aleatorio"] += 1
+            return _api_error(code, "Error simulado por el emulador.", "UNAVAILABLE" if code == 503 else "RESOURCE_EXHAUSTED")
+        return await call_next(request)
+
+    def book_or_404(spreadsheet_id: str):
+        book = books.get(spreadsheet_id)
+        if book is None:
+            return None, _api_error(404, "Requested entity was not found.", "NOT_FOUND")
+        return book, None
+
+    def range_error(a1: str) -> JSONResponse:
+        return _api_error(400, f"Unable to parse range: {a1}", "INVALID_ARGUMENT")
+
+    # --- DRIVE v3 ---
+
+    @app.get("/drive/v3/files")
+    async def drive_list(q: str = ""):
+        app.state.calls["drive.files.list"] += 1
+        match = re.search(r"name\s*=\s*'((?:[^'\\]|\\.)*)'", q)
+        files = [b.drive_file() for b in books.values() if not match or b.title == match.group(1)]
+        return {"kind": "drive#fileList", "files": files}
+
+    @app.get("/drive/v3/files/{file_id}")
+    async def drive_get(file_id: str):
+        app.state.calls["drive.files.get"] += 1
+        book, error = book_or_404(file_id)
+        return error or book.drive_file()
+
+    # --- SHEETS v4 ---
+
+    @app.get("/v4/spreadsheets/{spreadsheet_id}")
+    async def get_metadata(spreadsheet_id: str):
+        app.state.calls["spreadsheets.get"] += 1
+        book, error = book_or_404(spreadsheet_id)
+        return error or book.metadata()
+
+    @app.get("/v4/spreadsheets/{spreadsheet_id}/values:batchGet")
+    async def values_batch_get(spreadsheet_id: str, request: Request):
+        app.state.calls["values.batchGet"] += 1
+        book, error = book_or_404(spreadsheet_id)
+        if error:
+            return error
+        major = request.query_params.get("majorDimension", "ROWS")
+        ranges = request.query_params.getlist("ranges")
+        try:
+            return {"spreadsheetId": book.id, "valueRanges": [book.read(r, major) for r in ranges]}
+        except KeyError as e:
+            return range_error(str(e))
+
+    @app.post("/v4/spreadsheets/{spreadsheet_id}/values:batchUpdate")
+    async def values_batch_update(spreadsheet_id: str, request: Request):
+        app.state.calls["values.batchUpdate"] += 1
+        book, error = book_or_404(spreadsheet_id)
+        if error:
+            return error
+        body = await request.json()
+        try:
+            responses = [book.write(item["range"], item.get("values", [])) for item in body.get("data", [])]
+        except KeyError as e:
+            return range_error(str(e))
+        return {
+            "spreadsheetId": book.id,
+            "totalUpdatedRows": sum(r["updatedRows"] for r in responses),
+            "totalUpdatedCells": sum(r["updatedCells"] for r in responses),
+            "responses": responses,
+        }
+
+    @app.get("/v4/spreadsheets/{spreadsheet_id}/values/{a1:path}")
+    async def values_get(spreadsheet_id: str, a1: str, majorDimension: str = "ROWS"):
+        app.state.calls["values.get"] += 1
+        book, error = book_or_404(spreadsheet_id)
+        if error:
+            return error
+        try:
+            return book.read(a1, majorDimension)
+        except KeyError as e:
+            return range_error(str(e))
+
+    @app.put("/v4/spreadsheets/{spreadsheet_id}/values/{a1:path}")
+    async def values_update(spreadsheet_id: str, a1: str, request: Request):
+        app.state.calls["values.update"] += 1
+        book, error = book_or_404(spreadsheet_id)
+        if error:
+            return error
+        body = await request.json()
+        try:
+            return book.write(a1, body.get("values", []))
+        except KeyError as e:
+            return range_error(str(e))
+
+    @app.post("/v4/spreadsheets/{spreadsheet_id}/values/{a1_append:path}")
+    async def values_append(spreadsheet_id: str, a1_append: str, request: Request):
+        if not a1_append.endswith(":append"):
+            return _api_error(404, "Method not found.", "NOT_FOUND")
+        app.state.calls["values.append"] += 1
+        book, error = book_or_404(spreadsheet_id)
+        if error:
+            return error
+        body = await request.json()
+        try:
+            return book.append(a1_append[:-len(":append")], body.get("values", []))
+        except KeyError as e:
+            return range_error(str(e))
+
+    # --- CONTROL DEL EMULADOR ---
+
+    @app.get("/_emulator/stats")
+    async def emulator_stats():
+        return {"llamadas": dict(app.state.calls), "total": sum(app.state.calls.values())}
+
+    @app.post("/_emulator/reset_stats")
+    async def emulator_reset_stats():
+        app.state.calls.clear()
+        return {"status": "success"}
+
+    return app
+
+
+def main():
+    """Levanta el emulador con uvicorn."""
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Emulador local de Google Sheets v4 / Drive v3")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--data", help="JSON con el libro inicial (por defecto, hojas vacías con cabeceras)")
+    parser.add_argument("--latency-ms", type=float, default=SHEETS_EMULATOR_LATENCY_MS)
+    parser.add_argument("--quota-per-minute", type=int, default=SHEETS_EMULATOR_QUOTA_PER_MINUTE)
+    parser.add_argument("--error-rate", type=float, default=SHEETS_EMULATOR_ERROR_RATE)
+    args = parser.parse_args()
+
+    book = load_workbook(args.data) if args.data else default_workbook()
+    app = create_app([book], args.latency_ms, args.quota_per_minute, args.error_rate)
+    print(f"[INFO] Emulador de Google Sheets en http://{args.host}:{args.port} (libro '{book.title}', id {book.id})")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
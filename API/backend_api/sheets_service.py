@@ -2,12 +2,27 @@ import gspread
 import json
 import os
 import base64
+import threading
+import time
+import re
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 import pytz 
+import requests
 
 # Importar las excepciones de gspread para un manejo de errores más claro
-from gspread.exceptions import WorksheetNotFound, SpreadsheetNotFound 
+from gspread.exceptions import WorksheetNotFound, SpreadsheetNotFound, APIError 
+from gspread.auth import DEFAULT_SCOPES
+from gspread.utils import absolute_range_name, rowcol_to_a1
+from google.oauth2.service_account import Credentials
+from google.oauth2.credentials import Credentials as TokenCredentials
+
+from API.backend_api.storage import StorageBackend, SheetTable, MovementIdAllocator, _index_key
+from API.backend_api.movement_journal import MovementJournal, JournalFlusher, MOVEMENTS_JOURNAL_PATH
+from API.backend_api.http_pool import build_authorized_session, SHEETS_API_ENDPOINT
+from API.backend_api.quota import RequestScheduler
+from API.backend_api.single_flight import SingleFlight
+from API.backend_api.table_snapshot import TableSnapshot, SHEETS_SNAPSHOT_PATH
 
 # Definición de la zona horaria local (Guayaquil, Ecuador)
 LOCAL_TIMEZONE = pytz.timezone('America/Guayaquil') 
@@ -21,236 +36,581 @@ class ConnectionError(Exception):
 GSPREAD_CREDENTIALS_B64 = os.environ.get("GSPREAD_CREDENTIALS")
 SPREADSHEET_NAME = "gestion_condominio" # Nombre de su hoja de cálculo
 
-class SheetsService:
+# --- CONFIGURACIÓN DE LA CACHÉ DE LECTURA ---
+# Segundos que una hoja leída se considera vigente (0 desactiva la caché)
+SHEETS_CACHE_TTL = float(os.environ.get("SHEETS_CACHE_TTL", "30"))
+# Segundos tras los que una hoja de APPEND_ONLY_SHEETS se relee completa en lugar de sincronizar
+# solo su cola (detecta ediciones en columnas que no cubre TAIL_CHECK_COLUMNS; 0 lo desactiva)
+SHEETS_FULL_RELOAD_INTERVAL = float(os.environ.get("SHEETS_FULL_RELOAD_INTERVAL", "900"))
+
+# Credenciales decodificadas (se decodifican una sola vez por proceso)
+_credentials_data: Optional[Dict[str, Any]] = None
+
+def _load_credentials() -> Dict[str, Any]:
+    """Decodifica GSPREAD_CREDENTIALS (Base64 -> JSON) y conserva el resultado en memoria."""
+    global _credentials_data
+    if _credentials_data is not None:
+        return _credentials_data
+
+    # 1. Verificar si la variable Base64 existe
+    if not GSPREAD_CREDENTIALS_B64:
+        raise ConnectionError("ERROR: La variable de entorno 'GSPREAD_CREDENTIALS' no está configurada o está vacía.")
+    
+    # 2. Decodificar la cadena Base64 a JSON
+    try:
+        creds_json_string = base64.b64decode(GSPREAD_CREDENTIALS_B64).decode('utf-8')
+        _credentials_data = json.loads(creds_json_string)
+    except Exception as e:
+        raise ConnectionError(f"ERROR: Falló la decodificación o el formato JSON de GSPREAD_CREDENTIALS. Causa: {e}")
+    return _credentials_data
+
+def _trim_row(row: List[str]) -> List[str]:
+    """Quita las celdas vacías finales de una fila (la API no las devuelve)."""
+    row = list(row)
+    while row and row[-1] == "":
+        row.pop()
+    return row
+
+class SheetsService(StorageBackend):
+    """Motor de almacenamiento sobre Google Sheets (gspread)."""
     
-    MOVEMENTS_SHEET_NAME = 'MOVIMIENTOS'
+    # Hojas donde solo se añaden filas al final: al vencer su caché se sincroniza solo la cola
+    APPEND_ONLY_SHEETS = {'MOVIMIENTOS'}
+    # Columnas que cada sincronización de cola relee completas y compara con la copia en memoria:
+    # una fila anterior editada (p. ej. su MONTO) obliga a una recarga completa
+    TAIL_CHECK_COLUMNS = ('ID_MOVIMIENTO', 'ID_CASA', 'MONTO')
     
     def __init__(self):
-        """Inicializa la conexión a Google Sheets usando credenciales Base64 del entorno."""
+        """
+        Prepara el servicio sin conectarse. La conexión a Google Sheets se abre en el primer uso
+        (lazy) y se reutiliza mientras el proceso viva, incluyendo el token OAuth del cliente.
+        """
         self.sh = None # Objeto Spreadsheet (Hoja de cálculo)
         self.gc = None # Objeto gspread.Client (Cliente)
+        self._spreadsheet_id: Optional[str] = None # Evita repetir la búsqueda por nombre en Drive
+        self._lock = threading.RLock()
         
-        try:
-            # 1. Verificar si la variable Base64 existe
-            if not GSPREAD_CREDENTIALS_B64:
-                raise ConnectionError("ERROR: La variable de entorno 'GSPREAD_CREDENTIALS' no está configurada o está vacía.")
-            
-            # 2. Decodificar la cadena Base64 a JSON
+        # Credenciales y sesión HTTP (pool keep-alive) compartidas por todas las solicitudes
+        self._credentials: Optional[Credentials] = None
+        self._session = None
+        # Cuota por minuto y reintentos 429/5xx para TODAS las llamadas a la API (ver quota.py)
+        self._scheduler = RequestScheduler()
+        
+        # Caché de estructura: handles de Worksheet, fila de cabecera y mapa columna -> índice
+        self._worksheets: Dict[str, gspread.Worksheet] = {}
+        self._headers: Dict[str, List[str]] = {}
+        self._header_index: Dict[str, Dict[str, int]] = {}
+        
+        # Caché de lectura: copia de cada hoja por título (ver SHEETS_CACHE_TTL)
+        self._tables: Dict[str, SheetTable] = {}
+        # Lecturas en curso por hoja: las solicitudes concurrentes comparten una sola llamada
+        # (un mismo registro para get_tables y aget_tables, ver single_flight.py)
+        self._read_flights = SingleFlight()
+        
+        # Instantánea local de las hojas para arranques en frío (ver SHEETS_SNAPSHOT_PATH)
+        self._snapshot = TableSnapshot(SHEETS_SNAPSHOT_PATH) if SHEETS_SNAPSHOT_PATH and SHEETS_CACHE_TTL > 0 else None
+        self._snapshot_checked = False
+        # modifiedTime de la hoja de cálculo al conectar: versión con la que se etiqueta la instantánea
+        # (None desde la primera escritura de este proceso, ver _mark_sheet_written)
+        self._modified_time: Optional[str] = None
+        
+        # IDs de movimiento asignados en memoria (se siembra con cada carga de MOVIMIENTOS)
+        self._id_allocator = MovementIdAllocator()
+        
+        # Índice ID_CASA -> número de fila de ALERTAS_SEMAFORO (se construye en el primer uso)
+        self._semaforo_rows: Optional[Dict[str, int]] = None
+        
+        # Diario local de movimientos (write-behind, opcional; ver MOVEMENTS_JOURNAL_PATH)
+        self._journal = MovementJournal(MOVEMENTS_JOURNAL_PATH) if MOVEMENTS_JOURNAL_PATH else None
+        self._flusher = JournalFlusher(self._journal, self._flush_journal_batch) if self._journal else None
+        if self._journal:
+            # Los IDs pendientes del diario ya están asignados aunque no figuren en la hoja
+            self._id_allocator.observe(row[0] for row in self._journal.pending() if row)
+
+    # --- GESTIÓN DE LA CONEXIÓN ---
+
+    def connect(self) -> gspread.Spreadsheet:
+        """Abre (o reabre) la conexión a Google Sheets. Lanza ConnectionError si no es posible."""
+        with self._lock:
             try:
-                creds_json_string = base64.b64decode(GSPREAD_CREDENTIALS_B64).decode('utf-8')
-                credentials_data = json.loads(creds_json_string)
-            except Exception as e:
-                raise ConnectionError(f"ERROR: Falló la decodificación o el formato JSON de GSPREAD_CREDENTIALS. Causa: {e}")
-            
-            # 3. Conexión al cliente
-            self.gc = gspread.service_account_from_dict(credentials_data)
+                # 1. Conexión al cliente (se conserva entre reconexiones para reutilizar el token
+                #    y las conexiones abiertas del pool HTTP)
+                if self.gc is None:
+                    self.gc = gspread.Client(auth=self._service_credentials(), session=self._http_session())
+                
+                # 2. Conexión a la hoja de cálculo (por ID si ya se resolvió antes, sin buscar en Drive)
+                try:
+                    if self._spreadsheet_id:
+                        self.sh = self.gc.open_by_key(self._spreadsheet_id)
+                    else:
+                        self.sh = self.gc.open(SPREADSHEET_NAME)
+                        self._spreadsheet_id = self.sh.id
+                    print(f"[INFO] Conexión exitosa a Google Sheets: '{SPREADSHEET_NAME}'")
+                    if self._snapshot and not self._snapshot_checked:
+                        try:
+                            self._restore_snapshot(self.sh.id, self.sh.lastUpdateTime)
+                        except Exception as e:
+                            print(f"[WARN] No se pudo usar la instantánea local: {e}")
+                    if self._flusher:
+                        self._flusher.start()
+                except SpreadsheetNotFound:
+                    raise ConnectionError(f"ERROR: Hoja de cálculo '{SPREADSHEET_NAME}' no encontrada.")
+                
+                return self.sh
             
-            # 4. Conexión a la hoja de cálculo
-            try:
-                self.sh = self.gc.open(SPREADSHEET_NAME)
-                print(f"[INFO] Conexión exitosa a Google Sheets: '{SPREADSHEET_NAME}'")
-            except SpreadsheetNotFound:
-                print(f"[ERROR] Hoja de cálculo '{SPREADSHEET_NAME}' no encontrada.")
+            except ConnectionError as e:
+                print(f"[ERROR DE CONEXIÓN]: {e}")
                 self.sh = None
-                
-        except ConnectionError as e:
-            print(f"[ERROR DE CONEXIÓN]: {e}")
-            self.sh = None
-        except Exception as e:
-            print(f"[ERROR INESPERADO al inicializar SheetsService]: {e}")
+                raise
+            except Exception as e:
+                print(f"[ERROR INESPERADO al inicializar SheetsService]: {e}")
+                self.sh = None
+                self.gc = None
+                raise ConnectionError(f"No se pudo conectar a la hoja de cálculo: '{SPREADSHEET_NAME}'. Causa: {e}")
+
+    def _service_credentials(self) -> Credentials:
+        """
+        Credenciales de la cuenta de servicio (un único token OAuth por proceso).
+        Con SHEETS_API_ENDPOINT (emulador local) se usa un token fijo y no se requiere GSPREAD_CREDENTIALS.
+        """
+        if self._credentials is None:
+            if SHEETS_API_ENDPOINT:
+                self._credentials = TokenCredentials(token="emulador")
+            else:
+                self._credentials = Credentials.from_service_account_info(_load_credentials(), scopes=DEFAULT_SCOPES)
+        return self._credentials
+
+    def _http_session(self):
+        """Sesión autorizada con pool de conexiones keep-alive (ver http_pool.py)."""
+        if self._session is None:
+            self._session = build_authorized_session(self._service_credentials(), self._scheduler)
+        return self._session
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del motor: hojas en caché, uso del pool HTTP y diario de movimientos."""
+        stats = super().stats()
+        stats["cache_ttl"] = SHEETS_CACHE_TTL
+        stats["hojas_en_cache"] = sorted(self._tables)
+        adapter = self._session.get_adapter("https://") if self._session is not None else None
+        stats["pool_http"] = adapter.stats() if hasattr(adapter, "stats") else None
+        stats["cuota"] = self._scheduler.stats()
+        stats["lecturas"] = self._read_flights.stats()
+        stats["diario"] = self.journal_stats()
+        stats["instantanea"] = self._snapshot.stats() if self._snapshot else None
+        return stats
+
+    def ensure_connection(self) -> gspread.Spreadsheet:
+        """Retorna el Spreadsheet conectado, conectándose si aún no existe la conexión."""
+        sh = self.sh
+        if sh is not None:
+            return sh
+        with self._lock:
+            if self.sh is None:
+                self.connect()
+            return self.sh
+
+    def reset_connection(self, discard_client: bool = False):
+        """Descarta la conexión actual para forzar una reconexión en el siguiente uso."""
+        with self._lock:
             self.sh = None
+            if discard_client:
+                self.gc = None
+            self.invalidate_sheet_cache()
 
-    # --- MÉTODOS EXISTENTES ---
-    
-    def get_sheet(self, sheet_title: str) -> gspread.Worksheet:
-        """Obtiene una hoja por su título. Añade manejo de WorksheetNotFound."""
-        if not self.sh:
-            raise ConnectionError(f"No se pudo conectar a la hoja de cálculo: '{SPREADSHEET_NAME}'.")
+    # --- CACHÉ DE ESTRUCTURA (WORKSHEETS Y CABECERAS) ---
+
+    def invalidate_sheet_cache(self, sheet_title: Optional[str] = None):
+        """Olvida el handle, la cabecera y los datos de una hoja (o de todas si no se indica título)."""
+        with self._lock:
+            if sheet_title is None:
+                self._worksheets.clear()
+                self._headers.clear()
+                self._header_index.clear()
+            else:
+                self._worksheets.pop(sheet_title, None)
+                self._headers.pop(sheet_title, None)
+                self._header_index.pop(sheet_title, None)
+        self.invalidate_cache(sheet_title)
+
+    def invalidate_cache(self, sheet_title: Optional[str] = None):
+        """Descarta los datos cacheados de una hoja (o de todas) sin tocar handles ni cabeceras."""
+        with self._lock:
+            if sheet_title is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(sheet_title, None)
+            if sheet_title in (None, self.SEMAFORO_SHEET_NAME):
+                self._semaforo_rows = None
+
+    def _store_header(self, sheet_title: str, header: List[str]):
+        """Guarda la cabecera de una hoja y su mapa columna -> índice (base 0)."""
+        with self._lock:
+            self._headers[sheet_title] = list(header)
+            self._header_index[sheet_title] = {name: i for i, name in enumerate(header) if name}
+
+    def _check_header(self, sheet_title: str, header: List[str]):
+        """
+        Compara la cabecera recién leída con la cacheada. Si cambió (columnas añadidas,
+        renombradas o movidas) se considera un cambio estructural y se actualiza la caché.
+        """
+        cached = self._headers.get(sheet_title)
+        if cached == header:
+            return
+        if cached is not None:
+            print(f"[INFO] Cambio estructural detectado en '{sheet_title}'. Actualizando cabecera.")
+        self._store_header(sheet_title, header)
+
+    def get_header(self, sheet_title: str) -> List[str]:
+        """Retorna la fila de cabecera de una hoja (cacheada tras la primera lectura)."""
+        header = self._headers.get(sheet_title)
+        if header is None:
+            header = self.get_sheet(sheet_title).row_values(1)
+            self._store_header(sheet_title, header)
+        return header
+
+    def get_column_index(self, sheet_title: str, column: str) -> int:
+        """Retorna el índice (base 0) de una columna según la cabecera cacheada."""
+        self.get_header(sheet_title)
         try:
-            return self.sh.worksheet(sheet_title)
-        except WorksheetNotFound:
-            # Lanza una excepción personalizada con un mensaje claro
-            raise ConnectionError(f"ERROR: Hoja de trabajo '{sheet_title}' no encontrada en el Spreadsheet.")
+            return self._header_index[sheet_title][column]
+        except KeyError:
+            raise ValueError(f"La hoja '{sheet_title}' no tiene la columna '{column}'.")
 
-    def get_all_records(self, sheet_title: str) -> List[Dict[str, Any]]:
-        """Obtiene todos los datos de una hoja como lista de diccionarios (usa la primera fila como cabecera)."""
-        sheet = self.get_sheet(sheet_title)
-        return sheet.get_all_records()
+    def _batch_get(self, ranges: List[str], sheet_titles: List[str]) -> List[Dict[str, Any]]:
+        """
+        Ejecuta un values_batch_get y retorna los valueRanges en el orden solicitado.
+        Reconecta una vez ante fallos de red; si la API rechaza la lectura (hoja renombrada
+        o eliminada) se invalida la caché de estructura de las hojas involucradas.
+        """
+        try:
+            try:
+                response = self.ensure_connection().values_batch_get(ranges)
+            except requests.exceptions.RequestException as e:
+                print(f"[WARN] Fallo de conexión en lectura por lotes, reconectando: {e}")
+                self.reset_connection()
+                response = self.ensure_connection().values_batch_get(ranges)
+        except APIError:
+            for title in sheet_titles:
+                self.invalidate_sheet_cache(title)
+            raise
+        return response.get('valueRanges', [])
 
-    def get_records_by_casa_id(self, sheet_title: str, id_casa: int) -> List[Dict[str, Any]]:
+    def _store_table(self, sheet_title: str, values: List[List[str]], fitted: bool = False) -> SheetTable:
+        """Crea la copia en memoria de una hoja leída completa y la guarda en la caché."""
+        if values:
+            self._check_header(sheet_title, values[0])
+        table = SheetTable(sheet_title, values, fitted=fitted)
+        if sheet_title == self.MOVEMENTS_SHEET_NAME:
+            self._id_allocator.observe(row[0] for row in table.rows if row)
+            self._overlay_pending(table)
+        if sheet_title == self.SEMAFORO_SHEET_NAME:
+            self._semaforo_rows = None # Se reconstruye desde la nueva copia
+        if SHEETS_CACHE_TTL > 0:
+            with self._lock:
+                self._tables[sheet_title] = table
+        return table
+
+    # --- CACHÉ DE LECTURA (WRITE-THROUGH) ---
+
+    def get_tables(self, sheet_titles: List[str]) -> Dict[str, SheetTable]:
         """
-        Obtiene todos los registros de una hoja filtrados por ID_CASA.
-        Este método soporta ID_CASA = 0 para la Tesorería.
+        Retorna varias hojas como SheetTable (copias en memoria). Las que no están vigentes en caché
+        se leen juntas en un solo values_batch_get (una llamada a la API en lugar de una por hoja).
+        Las escrituras de este servicio se aplican sobre la copia, por lo que no requieren relectura.
+        Las hojas de APPEND_ONLY_SHEETS ya cargadas solo descargan las filas nuevas (ver _tail_ranges).
+        Si otra solicitud ya está leyendo una de las hojas, se espera esa lectura (single-flight).
         """
-        sheet = self.get_sheet(sheet_title)
-        data = sheet.get_all_values()
-        if not data:
-            return []
-        header = data[0]
-        records = data[1:]
+        tables, full, tail = self._plan_reads(sheet_titles)
+        if not full and not tail:
+            return tables
+        
+        lead, follow = self._read_flights.claim(full + [t.title for t in tail])
+        results: Dict[str, SheetTable] = {}
+        error: Optional[BaseException] = None
         try:
-            casa_id_index = header.index('ID_CASA')
-        except ValueError:
-            raise ValueError(f"La hoja '{sheet_title}' no tiene la columna 'ID_CASA'.")
+            if lead:
+                results = self._read_tables([t for t in full if t in lead], [t for t in tail if t.title in lead])
+        except BaseException as e:
+            error = e
+            raise
+        finally:
+            self._read_flights.finish(lead, results, error)
+        
+        tables.update(results)
+        for title, flight in follow.items():
+            tables[title] = self._read_flights.wait(flight)
+        return tables
 
-        filtered_list = []
-        target_id_str = str(id_casa)
+    def _read_tables(self, full: List[str], tail: List[SheetTable]) -> Dict[str, SheetTable]:
+        """Lee en un solo lote las hojas completas y las colas indicadas (ver get_tables)."""
+        tables: Dict[str, SheetTable] = {}
+        value_ranges = self._batch_get(self._read_ranges(full, tail), full + [t.title for t in tail])
+        reload = self._apply_reads(tables, full, tail, value_ranges)
+        
+        # Recarga completa solo si cambió la cabecera o las filas ya cargadas
+        if reload:
+            print(f"[INFO] Cambios en filas anteriores de {reload}. Recarga completa.")
+            value_ranges = self._batch_get([absolute_range_name(title) for title in reload], reload)
+            for title, value_range in zip(reload, value_ranges):
+                tables[title] = self._store_table(title, value_range.get('values', []))
+        self._maybe_save_snapshot()
+        return tables
 
-        for row in records:
-            if len(row) > casa_id_index and str(row[casa_id_index]).strip() == target_id_str:
-                record = dict(zip(header, row))
+    def _plan_reads(self, sheet_titles: List[str]) -> tuple:
+        """
+        Clasifica las hojas pedidas: (vigentes en caché {título: tabla}, títulos a leer completos,
+        tablas de APPEND_ONLY_SHEETS a las que solo les falta la cola).
+        """
+        tables: Dict[str, SheetTable] = {}
+        full: List[str] = []
+        tail: List[SheetTable] = []
+        for title in sheet_titles:
+            if title in tables or title in full:
+                continue
+            table = self._tables.get(title)
+            if table is not None and table.is_fresh(SHEETS_CACHE_TTL):
+                tables[title] = table
+            elif table is not None and title in self.APPEND_ONLY_SHEETS and table.header and table.synced_rows \
+                    and not self._full_reload_due(table):
+                tail.append(table)
+            else:
+                full.append(title)
+        return tables, full, tail
 
-                new_record = {}
-                for k, v in record.items():
-                    if k in ['ID_CASA', 'DIAS_ATRASO', 'CUOTAS_PENDIENTES']:
-                        try:
-                            new_record[k] = int(float(v))
-                        except (ValueError, TypeError):
-                            new_record[k] = v
-                    elif k in ['MONTO', 'SALDO_PENDIENTE', 'SALDO']:
-                        try:
-                            v_clean = v.replace(',', '.')
-                            new_record[k] = float(v_clean)
-                        except (ValueError, TypeError):
-                            new_record[k] = v
-                    else:
-                        new_record[k] = v
+    @staticmethod
+    def _full_reload_due(table: SheetTable) -> bool:
+        """True si la última lectura completa de la hoja supera SHEETS_FULL_RELOAD_INTERVAL."""
+        return SHEETS_FULL_RELOAD_INTERVAL > 0 and (time.monotonic() - table.full_loaded_at) >= SHEETS_FULL_RELOAD_INTERVAL
 
-                filtered_list.append(new_record)
+    def _read_ranges(self, full: List[str], tail: List[SheetTable]) -> List[str]:
+        """Rangos de la lectura por lotes: hojas completas primero y luego cabecera/ancla/cola/control de cada tabla."""
+        ranges = [absolute_range_name(title) for title in full]
+        for table in tail:
+            ranges.extend(self._tail_ranges(table))
+        return ranges
 
-        return filtered_list
+    def _apply_reads(self, tables: Dict[str, SheetTable], full: List[str], tail: List[SheetTable], value_ranges: List[Dict[str, Any]]) -> List[str]:
+        """
+        Aplica la respuesta de la lectura por lotes sobre `tables`. Retorna los títulos cuya cola no
+        se pudo aplicar y que requieren recarga completa.
+        """
+        # La API responde los rangos en el mismo orden en que se pidieron
+        for title, value_range in zip(full, value_ranges):
+            tables[title] = self._store_table(title, value_range.get('values', []))
+        
+        reload: List[str] = []
+        offset = len(full)
+        for table in tail:
+            count = 3 + len(self._tail_check_columns(table))
+            header_range, anchor_range, tail_range, *check_ranges = value_ranges[offset: offset + count]
+            offset += count
+            if self._apply_tail(table, header_range.get('values', []), anchor_range.get('values', []), tail_range.get('values', []),
+                                [r.get('values', []) for r in check_ranges]):
+                tables[table.title] = table
+            else:
+                reload.append(table.title)
+        return reload
+
+    def _tail_check_columns(self, table: SheetTable) -> List[int]:
+        """Posiciones de TAIL_CHECK_COLUMNS presentes en la cabecera de la tabla."""
+        return [table.header.index(column) for column in self.TAIL_CHECK_COLUMNS if column in table.header]
 
-    # --- FUNCIÓN CLAVE: LECTURA DE CONFIGURACIÓN ---
-    def get_config_map(self) -> Dict[str, Any]:
+    def _tail_ranges(self, table: SheetTable) -> List[str]:
         """
-        Lee todos los pares clave-valor de la hoja CONFIGURACION y retorna un diccionario.
-        Ajusta la conversión de tipos (int, float) para uso en main.py.
+        Rangos para sincronizar la cola de una hoja cargada con n filas de datos confirmadas:
+        la cabecera (1:1), la última fila conocida (ancla, fila n+1), todo lo posterior (A{n+2}:J) y,
+        como control, las columnas de TAIL_CHECK_COLUMNS de las n filas (p. ej. F2:F{n+1}).
+        Las filas locales pendientes del diario no cuentan (aún no están en la hoja).
         """
-        try:
-            data = self.get_all_records('CONFIGURACION')
-            config_map = {}
-            
-            for row in data:
-                clave = str(row.get('CLAVE', '')).strip().upper()
-                value = str(row.get('VALOR', '')).strip()
-                
-                if not clave: continue
-                
-                # Lógica de conversión de tipo
-                try:
-                    if '.' in value or ',' in value:
-                        config_map[clave] = float(value.replace(',', '.'))
-                    elif value.isdigit():
-                        config_map[clave] = int(value)
-                    else:
-                        config_map[clave] = value 
-                except ValueError:
-                    config_map[clave] = value 
-            
-            return config_map
+        last_col = rowcol_to_a1(1, len(table.header)).rstrip('0123456789')
+        anchor_row = table.synced_rows + 1
+        ranges = [
+            absolute_range_name(table.title, '1:1'),
+            absolute_range_name(table.title, f"A{anchor_row}:{last_col}{anchor_row}"),
+            absolute_range_name(table.title, f"A{anchor_row + 1}:{last_col}"),
+        ]
+        for col in self._tail_check_columns(table):
+            letter = rowcol_to_a1(1, col + 1).rstrip('0123456789')
+            ranges.append(absolute_range_name(table.title, f"{letter}2:{letter}{anchor_row}"))
+        return ranges
 
-        except Exception as e:
-            print(f"[ERROR SHEETS] No se pudo leer la hoja CONFIGURACION: {e}")
-            # Retorna valores por defecto si falla la lectura (FALLBACK CRÍTICO)
-            return {
-                "VALOR_ALICUOTA": 50.00,
-                "DIA_VENCIMIENTO": 5,
-                "PUNTOS_POR_PAGO_A_TIEMPO": 10,
-                "PORCENTAJE_DESCUENTO": 0.00 
+    def _apply_tail(self, table: SheetTable, header_values: List[List[str]], anchor_values: List[List[str]], tail_values: List[List[str]],
+                    check_values: Optional[List[List[List[str]]]] = None) -> bool:
+        """
+        Añade a la copia en memoria las filas nuevas de la cola. Retorna False (requiere recarga
+        completa) si la cabecera cambió, si la fila ancla ya no tiene el mismo ID (primera columna),
+        señal de que se insertaron, borraron o reordenaron filas anteriores, o si alguna columna de
+        control (check_values, ver _tail_ranges) difiere de la copia: se editó una fila anterior.
+        """
+        header = header_values[0] if header_values else []
+        if _trim_row(header) != _trim_row(table.header):
+            self._check_header(table.title, header)
+            return False
+        anchor = anchor_values[0] if anchor_values else []
+        if not anchor or anchor[0] != table.rows[table.synced_rows - 1][0]:
+            return False
+        for col, values in zip(self._tail_check_columns(table), check_values or []):
+            if not self._column_matches(table, col, values):
+                return False
+        with self._lock:
+            # Las filas pendientes se retiran y se vuelven a superponer tras la cola confirmada
+            table.truncate(table.synced_rows)
+            for row in tail_values:
+                table.append_row(row)
+            table.loaded_at = time.monotonic()
+        if table.title == self.MOVEMENTS_SHEET_NAME:
+            self._id_allocator.observe(row[0] for row in tail_values if row)
+            self._overlay_pending(table)
+        return True
+
+    @staticmethod
+    def _column_matches(table: SheetTable, col: int, values: List[List[str]]) -> bool:
+        """
+        Compara una columna leída (una celda por fila; la API omite las vacías del final) con la
+        misma columna de las filas confirmadas. Los números se comparan normalizados ('50' == '50.0').
+        """
+        if len(values) > table.synced_rows:
+            return False
+        for i, row in enumerate(table.rows[:table.synced_rows]):
+            cell = values[i][0] if i < len(values) and values[i] else ""
+            if cell != row[col] and _index_key(cell) != _index_key(row[col]):
+                return False
+        return True
+
+    def _cached_table(self, sheet_title: str) -> Optional[SheetTable]:
+        """Retorna la copia cacheada de una hoja (aunque esté vencida) para aplicar escrituras."""
+        return self._tables.get(sheet_title)
+
+    # --- INSTANTÁNEA LOCAL (ARRANQUE EN FRÍO, ver table_snapshot.py) ---
+
+    def _restore_snapshot(self, spreadsheet_id: str, modified_time: Optional[str]):
+        """
+        Carga en la caché las hojas de la instantánea local (una vez por proceso, al conectar).
+        Solo se usa si está etiquetada con el modifiedTime actual de la hoja de cálculo (nada cambió
+        desde que se guardó); si no, se descarta y las hojas se leen completas.
+        """
+        with self._lock:
+            if self._snapshot_checked:
+                return
+            self._snapshot_checked = True
+            self._modified_time = modified_time
+        data = self._snapshot.load()
+        if not data or data.get("spreadsheet_id") != spreadsheet_id:
+            return
+        if modified_time is None or data.get("modified_time") != modified_time:
+            self._snapshot.restored = "descartada"
+            print("[INFO] Instantánea local descartada: la hoja de cálculo cambió desde que se guardó.")
+            return
+        restored = []
+        for title, values in data.get("tablas", {}).items():
+            if title not in self._tables:
+                self._store_table(title, values, fitted=True)
+                restored.append(title)
+        self._snapshot.restored = "vigente"
+        print(f"[INFO] Instantánea local restaurada: {restored}")
+
+    def _maybe_save_snapshot(self):
+        """
+        Guarda la instantánea tras una lectura (como máximo una vez por SHEETS_SNAPSHOT_INTERVAL).
+        Se etiqueta con el modifiedTime leído al conectar, anterior a todas las hojas incluidas:
+        si la hoja de cálculo cambió después, el siguiente arranque lo detecta y la descarta. Por eso
+        no se guarda después de una escritura propia (quedaría descartada de antemano).
+        Solo se incluyen las filas confirmadas (no las pendientes del diario). Las filas se copian
+        bajo el lock y la compresión y escritura del archivo se hacen en un hilo aparte, fuera de la
+        solicitud que disparó la lectura.
+        """
+        if not self._snapshot or not self._modified_time or not self._snapshot.claim():
+            return
+        with self._lock:
+            tables = {
+                title: [list(table.header)] + table.rows[:table.synced_rows]
+                for title, table in self._tables.items()
+                if table.header
             }
+        if tables:
+            threading.Thread(
+                target=self._snapshot.save, args=(self._spreadsheet_id, self._modified_time, tables),
+                name="table-snapshot", # No daemon: al terminar el proceso se espera a que el archivo quede completo
+            ).start()
 
-    # --- FUNCIÓN PARA LECTURA DE USUARIO ---
-    def get_user_by_id_casa(self, id_casa: int) -> Optional[Dict[str, Any]]:
-        """Busca y retorna el registro de usuario (incluyendo NOMBRE) para una casa. Soporta ID_CASA=0."""
-        try:
-            usuarios_data = self.get_all_records('USUARIOS')
-            for user in usuarios_data:
-                if user.get('ID_CASA') and str(user['ID_CASA']).strip() == str(id_casa):
-                    return user
-            return None
-        except Exception as e:
-            print(f"[ERROR SHEETS] Error al obtener usuario por ID_CASA {id_casa}: {e}")
-            return None
+    def _mark_sheet_written(self):
+        """
+        Registra que este proceso va a escribir en la hoja de cálculo: su modifiedTime deja de ser el
+        leído al conectar y las instantáneas etiquetadas con él ya no serían válidas, así que se dejan
+        de guardar. Volver a etiquetar con un modifiedTime posterior no es seguro: la copia no incluye
+        los cambios hechos por otros (p. ej. ediciones a mano) entre su lectura y ese momento.
+        """
+        with self._lock:
+            if self._modified_time is None:
+                return
+            self._modified_time = None
+        if self._snapshot:
+            print("[INFO] Escritura en la hoja de cálculo: la instantánea local no se vuelve a guardar en este proceso.")
 
-    # --- FUNCIÓN: OBTENER MAPA DE USUARIOS (Para el Admin Panel) ---
-    def get_all_users_map(self) -> Dict[str, Dict[str, Any]]:
-        """Retorna un mapa de usuarios {ID_CASA: {DATOS_USUARIO}}. Incluye ID_CASA 0."""
-        try:
-            users_data = self.get_all_records('USUARIOS')
-        except Exception:
-            return {}
-            
-        user_map = {}
-        for user in users_data:
-            casa_id = str(user.get('ID_CASA')).strip()
-            if casa_id:
-                user_map[casa_id] = {
-                    'NOMBRE': user.get('NOMBRE', 'N/A'),
-                    'EMAIL': user.get('EMAIL', 'N/A'),
-                    'CELULAR': user.get('CELULAR', 'N/A')
-                }
-        return user_map
-
-    # --- FUNCIÓN: get_all_casa_ids ---
-    def get_all_casa_ids(self) -> List[int]:
-        """Obtiene una lista de todos los ID_CASA activos de la hoja USUARIOS. Incluye ID_CASA 0."""
-        
+    # --- MÉTODOS EXISTENTES ---
+    
+    def get_sheet(self, sheet_title: str) -> gspread.Worksheet:
+        """
+        Obtiene una hoja por su título. Añade manejo de WorksheetNotFound.
+        Los handles se cachean: la primera llamada carga todas las hojas con una sola lectura
+        de metadatos. Si la conexión falla (token revocado, error de red), reconecta una vez y reintenta.
+        """
+        sheet = self._worksheets.get(sheet_title)
+        if sheet is not None:
+            return sheet
         try:
-            records = self.get_all_records('USUARIOS')
-            
-            casa_ids = []
-            for record in records:
-                casa_id_str = str(record.get('ID_CASA', '')).strip()
-                estado = str(record.get('ESTADO', 'ACTIVO')).upper().strip() 
-
-                if casa_id_str and estado == 'ACTIVO':
-                    try:
-                        casa_id = int(float(casa_id_str)) 
-                        if casa_id not in casa_ids:
-                            casa_ids.append(casa_id)
-                    except ValueError:
-                        continue
-                        
-            return sorted(casa_ids)
-            
-        except Exception as e:
-            print(f"[ERROR SHEETS_SERVICE] Fallo al obtener todos los ID de casa: {e}")
-            return []
-
-    # MÉTODO DE ESCRITURA: Genera el ID en formato Mxxxx
-    def generate_next_movement_id(self) -> str:
-        """Genera el siguiente ID de movimiento (M0001, M0002, etc.)."""
-        movimientos_sheet = self.get_sheet(self.MOVEMENTS_SHEET_NAME)
-        # Leer la columna 1 (ID_MOVIMIENTO) a partir de la segunda fila
-        all_ids = movimientos_sheet.col_values(1)[1:] 
-        
-        if not all_ids:
-            return "M0001"
-        
-        # Filtra solo IDs válidos que comienzan con 'M' seguido de dígitos
-        valid_ids = [uid for uid in all_ids if uid and uid.startswith('M') and uid[1:].isdigit()]
+            self._load_worksheets()
+        except (APIError, requests.exceptions.RequestException) as e:
+            print(f"[WARN] Fallo de conexión al abrir '{sheet_title}', reconectando: {e}")
+            self.reset_connection()
+            self._load_worksheets()
         
-        last_number = 0
-        if valid_ids:
-            last_number = max([int(uid[1:]) for uid in valid_ids])
-            
-        next_number = last_number + 1
-        return f"M{next_number:04d}" 
+        sheet = self._worksheets.get(sheet_title)
+        if sheet is None:
+            # Lanza una excepción personalizada con un mensaje claro
+            raise ConnectionError(f"ERROR: Hoja de trabajo '{sheet_title}' no encontrada en el Spreadsheet.")
+        return sheet
+
+    def _load_worksheets(self):
+        """Carga los handles de todas las hojas del Spreadsheet (una lectura de metadatos)."""
+        sh = self.ensure_connection()
+        worksheets = sh.worksheets()
+        with self._lock:
+            self._worksheets = {ws.title: ws for ws in worksheets}
+
+    def reserve_movement_ids(self, count: int) -> List[str]:
+        """
+        Reserva un bloque contiguo de IDs de movimiento.
+        La copia de MOVIMIENTOS se mantiene al día (sin llamada a la API si está vigente, solo la
+        cola si venció), y el asignador avanza con cada carga, evitando releer la columna de IDs.
+        Con el diario activo, el asignador sembrado es la fuente de verdad y no se consulta la hoja.
+        """
+        if not (self._journal and self._id_allocator.is_seeded):
+            self.get_table(self.MOVEMENTS_SHEET_NAME)
+        if not self._id_allocator.is_seeded:
+            self._id_allocator.observe([])
+        return self._id_allocator.reserve(count)
 
     # MÉTODO DE ESCRITURA: Añade una fila (CORREGIDO)
     def append_movement(self, data_row: list):
         """Añade una fila a la hoja MOVIMIENTOS usando el método simple de gspread."""
+        if self._journal:
+            return self._journal_movements([data_row])
         
         try:
             # 1. Obtenemos la hoja de trabajo (Worksheet) usando get_sheet
             movimientos_sheet = self.get_sheet(self.MOVEMENTS_SHEET_NAME)
             
             # 2. **CORRECCIÓN APLICADA:** Usar el método nativo de gspread para añadir la fila
+            self._mark_sheet_written()
             result = movimientos_sheet.append_row(
                 values=data_row,
                 value_input_option='USER_ENTERED' # Para que los valores se interpreten correctamente
             )
             
+            # 3. Write-through: la fila se aplica a la copia cacheada (sin relectura)
+            self._apply_movements([data_row])
+            
             return result
         
         except ConnectionError as ce: # Manejo del error que get_sheet puede lanzar
@@ -258,43 +618,176 @@ class SheetsService:
              raise ce
         except Exception as e:
             print(f"[ERROR gspread APPEND] Fallo al añadir fila a MOVIMIENTOS: {e}")
+            # El resultado de la escritura es incierto: se descarta la copia cacheada
+            self.invalidate_cache(self.MOVEMENTS_SHEET_NAME)
+            raise e
+
+    # MÉTODO DE ESCRITURA MASIVA: Añade varias filas en una sola llamada
+    def append_movements(self, data_rows: List[list]):
+        """
+        Añade varias filas a la hoja MOVIMIENTOS con un único append_rows (una llamada a la API).
+        La escritura es todo o nada: si la llamada falla no se añadió ninguna fila.
+        """
+        if not data_rows:
+            return None
+        if self._journal:
+            return self._journal_movements(data_rows)
+        
+        try:
+            movimientos_sheet = self.get_sheet(self.MOVEMENTS_SHEET_NAME)
+            self._mark_sheet_written()
+            result = movimientos_sheet.append_rows(
+                values=data_rows,
+                value_input_option='USER_ENTERED'
+            )
+            self._apply_movements(data_rows)
+            return result
+        
+        except ConnectionError as ce:
+             print(f"[ERROR gspread APPEND] Error de conexión/hoja: {ce}")
+             raise ce
+        except Exception as e:
+            print(f"[ERROR gspread APPEND] Fallo al añadir {len(data_rows)} filas a MOVIMIENTOS: {e}")
+            self.invalidate_cache(self.MOVEMENTS_SHEET_NAME)
             raise e
+
+    def _apply_movements(self, data_rows: List[list], pending: bool = False):
+        """Write-through: aplica filas de MOVIMIENTOS (escritas o pendientes en el diario) a la copia cacheada."""
+        with self._lock:
+            table = self._cached_table(self.MOVEMENTS_SHEET_NAME)
+            if table is not None:
+                for data_row in data_rows:
+                    table.append_row(data_row, pending=pending)
+
+    # --- DIARIO DE MOVIMIENTOS (WRITE-BEHIND) ---
+
+    def _journal_movements(self, data_rows: List[list]) -> Dict[str, Any]:
+        """
+        Registra los movimientos en el diario local (durable con fsync) y los aplica a la copia
+        cacheada como pendientes. El hilo de vaciado los escribe en la hoja en segundo plano.
+        """
+        self._journal.append(data_rows)
+        self._apply_movements(data_rows, pending=True)
+        self._flusher.notify()
+        return {"diario": "pendiente", "filas": len(data_rows)}
+
+    def _overlay_pending(self, table: SheetTable):
+        """Superpone a una copia recién sincronizada las filas del diario que aún no están en la hoja."""
+        if not self._journal or not table.header:
+            return
+        confirmed = self._confirmed_ids(table)
+        with self._lock:
+            for row in self._journal.pending():
+                if row and str(row[0]) not in confirmed:
+                    table.append_row(row, pending=True)
+
+    @staticmethod
+    def _confirmed_ids(table: SheetTable) -> set:
+        """IDs (primera columna) de las filas ya confirmadas en la hoja."""
+        return {row[0] for row in table.rows[:table.synced_rows] if row}
+
+    def _flush_journal_batch(self, data_rows: List[list]):
+        """
+        Escribe un lote del diario en MOVIMIENTOS con un único append_rows. Es idempotente: las filas
+        cuyo ID ya figura en la hoja (p. ej. escritas antes de una caída) no se vuelven a escribir.
+        """
+        table = self.get_table(self.MOVEMENTS_SHEET_NAME)
+        confirmed = self._confirmed_ids(table)
+        to_write = [row for row in data_rows if row and str(row[0]) not in confirmed]
+        if to_write:
+            self._mark_sheet_written()
+            try:
+                self.get_sheet(self.MOVEMENTS_SHEET_NAME).append_rows(
+                    values=to_write,
+                    value_input_option='USER_ENTERED'
+                )
+            except Exception:
+                # El resultado es incierto: la próxima lectura completa decide qué filas quedaron
+                self.invalidate_cache(self.MOVEMENTS_SHEET_NAME)
+                raise
+            print(f"[INFO] Diario: {len(to_write)} movimientos escritos en MOVIMIENTOS.")
+        self._confirm_pending(table, {str(row[0]) for row in to_write})
+
+    def _confirm_pending(self, table: SheetTable, written_ids: set):
+        """Marca como confirmadas, en orden, las filas pendientes de la copia que se acaban de escribir."""
+        with self._lock:
+            if self._cached_table(table.title) is not table:
+                return
+            while table.synced_rows < len(table.rows) and table.rows[table.synced_rows][0] in written_ids:
+                table.synced_rows += 1
+
+    def journal_stats(self) -> Optional[Dict[str, Any]]:
+        """Estado del diario de movimientos (None si está desactivado)."""
+        return self._flusher.stats() if self._flusher else None
     # ----------------------------------------------------------------------
-    # --- MÉTODOS DE SEMÁFORO (USAN get_all_values() y update()) ---
+    # --- MÉTODOS DE SEMÁFORO (USAN la copia cacheada y update()) ---
     # ----------------------------------------------------------------------
+    def _semaforo_index(self, table: Optional[SheetTable] = None) -> Dict[str, int]:
+        """
+        Índice ID_CASA -> número de fila (base 1) de ALERTAS_SEMAFORO. Se construye en el primer uso
+        desde la copia indicada o cacheada o, si no la hay, leyendo solo la Columna A; se mantiene con
+        cada escritura y se descarta cuando la hoja se recarga.
+        """
+        index = self._semaforo_rows
+        if index is None:
+            table = table or self._cached_table(self.SEMAFORO_SHEET_NAME)
+            if table is not None:
+                ids = [row[0] if row else "" for row in table.rows]
+            else:
+                ids = self.get_sheet(self.SEMAFORO_SHEET_NAME).col_values(1)[1:]
+            index = {}
+            for i, casa_id in enumerate(ids):
+                key = str(casa_id).strip()
+                if key and key not in index:
+                    index[key] = i + 2 # +2 porque la fila 1 es cabecera y el índice de gspread es base 1
+            with self._lock:
+                self._semaforo_rows = index
+        return index
+
+    def _apply_semaforo_row(self, row_number: int, new_data: List[str]):
+        """Registra la fila en el índice y la aplica a la copia cacheada (write-through)."""
+        with self._lock:
+            if self._semaforo_rows is not None:
+                self._semaforo_rows[new_data[0]] = row_number
+            table = self._cached_table(self.SEMAFORO_SHEET_NAME)
+            if table is not None:
+                position = row_number - 2
+                if position < len(table.rows):
+                    table.set_row(position, new_data)
+                elif position == len(table.rows):
+                    table.append_row(new_data)
+                else:
+                    # La hoja creció fuera de este proceso: la copia ya no es confiable
+                    self._tables.pop(self.SEMAFORO_SHEET_NAME, None)
+
+    @staticmethod
+    def _appended_first_row(response: Optional[Dict[str, Any]]) -> Optional[int]:
+        """Número de la primera fila escrita por un append (según updates.updatedRange)."""
+        try:
+            updated_range = response['updates']['updatedRange']
+        except (KeyError, TypeError):
+            return None
+        match = re.search(r"![A-Z]+(\d+)", updated_range)
+        return int(match.group(1)) if match else None
+
     def update_or_append_semaforo(self, id_casa: int, dias_atraso: int, saldo: float, estado: str, cuotas_pendientes: int) -> bool:
         """
         Busca ID_CASA en ALERTAS_SEMAFORO. Si existe, actualiza (A:F); si no, añade.
         Ajustado para el orden de 6 columnas: ID_CASA, SALDO, DIAS_ATRASO, ESTADO, CUOTAS, FECHA
+        La fila se localiza con el índice ID_CASA -> fila, sin descargar la hoja (una sola llamada).
         """
-        sheet = self.get_sheet('ALERTAS_SEMAFORO')
-        data = sheet.get_all_values()
-        
-        records = data[1:] if len(data) > 1 else []
-        
-        target_id_str = str(id_casa)
-        row_index_to_update = -1 
+        sheet = self.get_sheet(self.SEMAFORO_SHEET_NAME)
         
         # 1. Buscar fila existente (ID_CASA en la Columna A)
-        for i, row in enumerate(records):
-            if row and row[0].strip() == target_id_str: 
-                row_index_to_update = i + 2 # +2 porque data[0] es cabecera y el índice de gspread es base 1
-                break
+        row_index_to_update = self._semaforo_index().get(str(id_casa), -1)
 
         # CORRECCIÓN DE FECHA Y HORA: Usar la zona horaria de Guayaquil (GMT-5)
         current_time_local = datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M') 
         
         # 2. Preparar nueva data (6 columnas A:F)
-        # ORDEN DE COLUMNAS: A, B, C, D, E, F
-        new_data = [
-            target_id_str,           # 1. ID_CASA (A)
-            f"{saldo:.2f}",          # 2. SALDO (B)
-            str(dias_atraso),        # 3. DIAS_ATRASO (C)
-            estado,                  # 4. ESTADO_SEMAFORO (D)
-            str(cuotas_pendientes),  # 5. CUOTAS_PENDIENTES (E)
-            current_time_local,      # 6. FECHA_ACTUALIZACION (F)
-        ]
+        new_data = self._semaforo_row(id_casa, dias_atraso, saldo, estado, cuotas_pendientes, current_time_local)
         
+        self._mark_sheet_written()
         try:
             if row_index_to_update != -1:
                 # 3. Actualizar fila existente
@@ -302,36 +795,109 @@ class SheetsService:
                 sheet.update(range_to_update, [new_data], value_input_option='USER_ENTERED')
             else:
                 # 4. Añadir nueva fila
-                sheet.append_row(new_data, value_input_option='USER_ENTERED')
+                response = sheet.append_row(new_data, value_input_option='USER_ENTERED')
+                row_index_to_update = self._appended_first_row(response)
+            
+            if row_index_to_update is None or row_index_to_update == -1:
+                self.invalidate_cache(self.SEMAFORO_SHEET_NAME)
+            else:
+                self._apply_semaforo_row(row_index_to_update, new_data)
             return True
         except Exception as e:
             print(f"Error al actualizar/añadir semáforo para casa {id_casa}: {e}")
+            self.invalidate_cache(self.SEMAFORO_SHEET_NAME)
             return False
 
-    def get_semaforo_by_casa(self, id_casa: int) -> Optional[Dict[str, Any]]:
+    def bulk_upsert_semaforo(self, results: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Actualiza o añade el semáforo de muchas casas con un máximo de dos escrituras:
+        todas las filas existentes en un único batch_update y las casas nuevas en un único append_rows.
+        Las filas se localizan con el índice ID_CASA -> fila (sin releer la hoja).
+        Cada resultado debe incluir ID_CASA, DIAS_ATRASO, SALDO, ESTADO_SEMAFORO y CUOTAS_PENDIENTES.
+        Lanza la excepción de gspread si alguna escritura falla.
+        """
+        sheet = self.get_sheet(self.SEMAFORO_SHEET_NAME)
+        
+        # 1-2. Índice ID_CASA (Columna A) -> número de fila y separación en actualizaciones / nuevas
+        updates, appends = self._plan_semaforo_upsert(results, self._semaforo_index())
+        
+        self._mark_sheet_written()
+        try:
+            # 3. Escribir: un batch_update para todas las actualizaciones
+            if updates:
+                sheet.batch_update(
+                    [{'range': f"A{r}:F{r}", 'values': [row]} for r, row in updates],
+                    value_input_option='USER_ENTERED'
+                )
+            first_new_row = None
+            if appends:
+                response = sheet.append_rows(appends, value_input_option='USER_ENTERED')
+                first_new_row = self._appended_first_row(response)
+        except Exception as e:
+            print(f"[ERROR SHEETS] Fallo en la escritura masiva de ALERTAS_SEMAFORO: {e}")
+            self.invalidate_cache(self.SEMAFORO_SHEET_NAME)
+            raise
+        
+        # 4. Mantener índice y copia cacheada
+        return self._apply_semaforo_upsert(updates, appends, first_new_row)
+
+    def _plan_semaforo_upsert(self, results: List[Dict[str, Any]], row_numbers: Dict[str, int]) -> tuple:
+        """Separa los resultados en ([(fila, datos)] a actualizar, [datos] a añadir)."""
+        current_time_local = datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M') 
+        
+        # Combinar en memoria (si una casa se repite, prevalece su último resultado)
+        merged: Dict[str, List[str]] = {}
+        for result in results:
+            new_data = self._semaforo_row(
+                result['ID_CASA'], result['DIAS_ATRASO'], result['SALDO'],
+                result['ESTADO_SEMAFORO'], result['CUOTAS_PENDIENTES'], current_time_local
+            )
+            merged[new_data[0]] = new_data
+        
+        updates: List[tuple] = []
+        appends: List[List[str]] = []
+        for casa_id, new_data in merged.items():
+            row_number = row_numbers.get(casa_id)
+            if row_number is not None:
+                updates.append((row_number, new_data))
+            else:
+                appends.append(new_data)
+        return updates, appends
+
+    def _apply_semaforo_upsert(self, updates: List[tuple], appends: List[List[str]], first_new_row: Optional[int]) -> Dict[str, int]:
+        """Aplica una escritura masiva ya confirmada al índice y a la copia cacheada."""
+        for row_number, row in updates:
+            self._apply_semaforo_row(row_number, row)
+        if appends and first_new_row is None:
+            self.invalidate_cache(self.SEMAFORO_SHEET_NAME)
+        elif appends:
+            for offset, row in enumerate(appends):
+                self._apply_semaforo_row(first_new_row + offset, row)
+        return {"actualizadas": len(updates), "nuevas": len(appends)}
+
+    def get_semaforo_by_casa(self, id_casa: int, semaforo: Optional[SheetTable] = None) -> Optional[Dict[str, Any]]:
         """
         Busca y retorna el estado del semáforo consolidado para una casa específica.
         Mapeo ajustado para el orden de 6 columnas.
+        Sin copia vigente en memoria, lee solo la fila de la casa (A{r}:F{r}) usando el índice.
         """
-        sheet_name = 'ALERTAS_SEMAFORO'
+        sheet_name = self.SEMAFORO_SHEET_NAME
         try:
-            sheet = self.get_sheet(sheet_name)
-            data = sheet.get_all_values()
+            if semaforo is None:
+                cached = self._cached_table(sheet_name)
+                if cached is not None and cached.is_fresh(SHEETS_CACHE_TTL):
+                    semaforo = cached
             
-            for row in data[1:]: # Ignora la fila de headers
-                if not row or str(row[0]).strip() != str(id_casa):
-                    continue
-                
+            if semaforo is not None:
+                rows = semaforo.rows_for('ID_CASA', id_casa) # Índice ID_CASA de la copia: O(1)
+            else:
+                rows = self._read_semaforo_row(id_casa)
+            
+            for row in rows:
                 # Mapeo de las 6 columnas de datos
-                if len(row) >= 6:
-                    return {
-                        "ID_CASA": row[0],
-                        "SALDO": float(row[1]) if row[1] else 0.0,
-                        "DIAS_ATRASO": int(row[2]) if row[2].isdigit() else 0,
-                        "ESTADO_SEMAFORO": row[3],
-                        "CUOTAS_PENDIENTES": int(row[4]) if row[4].isdigit() else 0,
-                        "FECHA_ACTUALIZACION": row[5]
-                    }
+                record = self._semaforo_record(row)
+                if record is not None:
+                    return record
                 
             return None # Casa no encontrada
             
@@ -340,4 +906,42 @@ class SheetsService:
             return None
         except Exception as e:
             print(f"[ERROR SHEETS] Error al obtener el semáforo para la Casa {id_casa} de {sheet_name}: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def _read_semaforo_row(self, id_casa: int) -> List[List[str]]:
+        """
+        Lee únicamente la fila de una casa en ALERTAS_SEMAFORO (un get de rango A{r}:F{r}).
+        Si la fila ya no corresponde a la casa (índice desactualizado), reconstruye el índice una vez.
+        """
+        target_id_str = str(id_casa)
+        for attempt in range(2):
+            row_number = self._semaforo_index().get(target_id_str)
+            if row_number is None and attempt == 0:
+                # Casa ausente: puede haber sido añadida por otra instancia
+                self._semaforo_rows = None
+                continue
+            if row_number is None:
+                return []
+            values = self.get_sheet(self.SEMAFORO_SHEET_NAME).get(f"A{row_number}:F{row_number}")
+            row = list(values[0]) if values else []
+            if row and row[0].strip() == target_id_str:
+                return [row + [""] * (6 - len(row))]
+            self._semaforo_rows = None
+        return []
+
+
+# ----------------------------------------------------------------------
+# --- INSTANCIA COMPARTIDA (POOL DE PROCESO) ---
+# ----------------------------------------------------------------------
+
+_shared_service: Optional[SheetsService] = None
+_shared_service_lock = threading.Lock()
+
+def get_shared_sheets_service() -> SheetsService:
+    """Retorna la instancia única de SheetsService del proceso, creándola en el primer uso."""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = SheetsService()
+    return _shared_service
@@ -0,0 +1,120 @@
+import asyncio
+import threading
+from typing import List, Dict, Any, Hashable, Iterable, Optional, Tuple
+
+
+def _running_loop() -> Optional[asyncio.AbstractEventLoop]:
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _resolve(future: asyncio.Future, value: Any, error: Optional[BaseException]):
+    if future.done():
+        return
+    if error is not None:
+        future.set_exception(error)
+        future.exception() # Evita el aviso "exception was never retrieved" si nadie esperaba
+    else:
+        future.set_result(value)
+
+
+class _Flight:
+    """
+    Lectura en curso: quienes la esperan reciben su resultado o su excepción. Los hilos esperan el
+    evento; las corrutinas, un Future de su event loop que se resuelve al terminar (ver SingleFlight).
+    loop: event loop de la corrutina líder (None si la lidera un hilo).
+    """
+    __slots__ = ("event", "value", "error", "loop", "_waiters")
+
+    def __init__(self, loop: Optional[asyncio.AbstractEventLoop] = None):
+        self.event = threading.Event()
+        self.value: Any = None
+        self.error: Optional[BaseException] = None
+        self.loop = loop
+        self._waiters: List[asyncio.Future] = []
+
+
+class SingleFlight:
+    """
+    Agrupa lecturas concurrentes por clave (p. ej. título de hoja): la primera solicitud que
+    reclama una clave la lee (líder) y las que llegan mientras tanto esperan ese mismo resultado
+    en lugar de repetir la llamada a la API. Un solo registro sirve a hilos (get_tables) y a
+    corrutinas (aget_tables): cualquiera de los dos puede ser líder y ambos esperan con wait/await_.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Hashable, _Flight] = {}
+        self.led = 0
+        self.shared = 0
+
+    def claim(self, keys: Iterable[Hashable], blocking: bool = True) -> Tuple[Dict[Hashable, _Flight], Dict[Hashable, _Flight]]:
+        """
+        Retorna ({clave: lectura que debe hacer quien llama}, {clave: lectura en curso a esperar}).
+        blocking=True indica que quien llama esperará bloqueando el hilo (wait): si la lectura en
+        curso la lidera una corrutina del event loop de este mismo hilo, esperarla lo bloquearía
+        para siempre, así que esa clave se lee aparte (sin registrarse).
+        """
+        loop = _running_loop()
+        lead: Dict[Hashable, _Flight] = {}
+        follow: Dict[Hashable, _Flight] = {}
+        with self._lock:
+            for key in keys:
+                flight = self._flights.get(key)
+                if flight is not None and flight.loop is not None and flight.loop.is_closed():
+                    flight = None # Su event loop ya terminó: nadie la va a completar
+                if flight is None:
+                    lead[key] = self._flights[key] = _Flight(None if blocking else loop)
+                elif blocking and loop is not None and flight.loop is loop:
+                    lead[key] = _Flight()
+                else:
+                    follow[key] = flight
+            self.led += len(lead)
+            self.shared += len(follow)
+        return lead, follow
+
+    def finish(self, lead: Dict[Hashable, _Flight], results: Dict[Hashable, Any], error: Optional[BaseException] = None):
+        """Entrega el resultado (o el error) del líder a quienes esperan y libera las claves."""
+        with self._lock:
+            for key, flight in lead.items():
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+                if error is None and key not in results:
+                    flight.value, flight.error = None, KeyError(key)
+                else:
+                    flight.value, flight.error = results.get(key), error
+                flight.event.set()
+            waiters = [(flight, future) for flight in lead.values() for future in flight._waiters]
+        for flight, future in waiters:
+            try:
+                future.get_loop().call_soon_threadsafe(_resolve, future, flight.value, flight.error)
+            except RuntimeError:
+                pass # El event loop de quien esperaba ya se cerró
+
+    @staticmethod
+    def wait(flight: _Flight) -> Any:
+        """Espera (bloqueando el hilo) el resultado de una lectura en curso."""
+        flight.event.wait()
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    async def await_(self, flight: _Flight) -> Any:
+        """Espera, sin bloquear el event loop, el resultado de una lectura en curso."""
+        with self._lock:
+            if not flight.event.is_set():
+                future = asyncio.get_running_loop().create_future()
+                flight._waiters.append(future)
+            else:
+                future = None
+        if future is not None:
+            # shield: si se cancela quien espera, la lectura del líder no se cancela
+            await asyncio.shield(future)
+        if flight.error is not None:
+            raise flight.error
+        return flight.value
+
+    def stats(self) -> Dict[str, int]:
+        return {"lecturas_lider": self.led, "lecturas_compartidas": self.shared, "en_curso": len(self._flights)}
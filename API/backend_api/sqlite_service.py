@@ -0,0 +1,351 @@
+import os
+import sqlite3
+import threading
+from typing import List, Dict, Any, Optional, Union
+from datetime import datetime
+import pytz
+
+from API.backend_api.storage import StorageBackend, SheetTable, MovementIdAllocator, record_decoder, _to_cell, _index_key
+# Columnas de cada hoja (mismo orden que en Google Sheets). Los valores se guardan como TEXT
+# (igual que las celdas), así SheetTable se comporta igual en ambos motores.
+from API.backend_api.sheet_schema import SHEET_COLUMNS
+from API.backend_api.movement_store import Movement
+from API.backend_api.ledger import CasaLedger, LedgerProjection
+
+# Definición de la zona horaria local (Guayaquil, Ecuador)
+LOCAL_TIMEZONE = pytz.timezone('America/Guayaquil')
+
+# --- CONFIGURACIÓN DE LA BASE DE DATOS LOCAL ---
+SQLITE_PATH = os.environ.get("SQLITE_PATH", "condominio.db")
+
+# Índices: (nombre, tabla, columna, único)
+SHEET_INDEXES = [
+    ('idx_movimientos_id_casa', 'MOVIMIENTOS', 'ID_CASA', False),
+    ('idx_movimientos_id_movimiento', 'MOVIMIENTOS', 'ID_MOVIMIENTO', False),
+    ('idx_usuarios_id_casa', 'USUARIOS', 'ID_CASA', False),
+    ('idx_semaforo_id_casa', 'ALERTAS_SEMAFORO', 'ID_CASA', True),
+]
+
+class SQLiteService(StorageBackend):
+    """
+    Motor de almacenamiento local sobre SQLite. Implementa la misma interfaz que SheetsService,
+    con consultas por ID_CASA e ID_MOVIMIENTO resueltas mediante índices.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """Prepara el servicio; la base de datos se abre (y se crea si no existe) en el primer uso."""
+        self.path = path or SQLITE_PATH
+        self.conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.RLock()
+        self._id_allocator = MovementIdAllocator()
+        # Tablas leídas en esta conexión (ver get_tables) y el PRAGMA data_version con que se leyeron
+        self._tables: Dict[str, SheetTable] = {}
+        self._data_version: Optional[int] = None
+        # El asignador de IDs se alinea con MOVIMIENTOS una vez por data_version (ver reserve_movement_ids)
+        self._ids_seeded = False
+
+    # --- CONEXIÓN Y ESQUEMA ---
+
+    def ensure_connection(self) -> sqlite3.Connection:
+        """Abre la base de datos y crea tablas e índices si no existen."""
+        if self.conn is not None:
+            return self.conn
+        with self._lock:
+            if self.conn is None:
+                conn = sqlite3.connect(self.path, check_same_thread=False)
+                if self.path != ":memory:":
+                    conn.execute("PRAGMA journal_mode=WAL")
+                for table, columns in SHEET_COLUMNS.items():
+                    cols = ", ".join(f'"{c}" TEXT NOT NULL DEFAULT \'\'' for c in columns)
+                    conn.execute(f'CREATE TABLE IF NOT EXISTS "{table}" ({cols})')
+                for name, table, column, unique in SHEET_INDEXES:
+                    conn.execute(f'CREATE {"UNIQUE " if unique else ""}INDEX IF NOT EXISTS {name} ON "{table}" ("{column}")')
+                conn.commit()
+                self.conn = conn
+                print(f"[INFO] Base de datos SQLite lista: '{self.path}'")
+            return self.conn
+
+    def _execute(self, sql: str, params: tuple = ()) -> List[tuple]:
+        """Ejecuta una consulta bajo el lock del servicio y retorna todas las filas."""
+        conn = self.ensure_connection()
+        with self._lock:
+            return conn.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _columns(sheet_title: str) -> List[str]:
+        try:
+            return SHEET_COLUMNS[sheet_title]
+        except KeyError:
+            raise ValueError(f"La hoja '{sheet_title}' no existe en la base de datos local.")
+
+    @staticmethod
+    def _to_db_row(columns: List[str], row: List[Any]) -> List[str]:
+        """Ajusta una fila al ancho de la tabla; ID_CASA se normaliza para las búsquedas indexadas."""
+        values = [_to_cell(v) for v in row[:len(columns)]]
+        values.extend([""] * (len(columns) - len(values)))
+        if 'ID_CASA' in columns:
+            i = columns.index('ID_CASA')
+            values[i] = _index_key(values[i])
+        return values
+
+    # --- LECTURA ---
+
+    def get_tables(self, sheet_titles: List[str]) -> Dict[str, SheetTable]:
+        """
+        Retorna varias tablas como SheetTable (en el orden de inserción, como en la hoja).
+        Las tablas leídas se conservan mientras PRAGMA data_version no cambie (es decir, mientras
+        ninguna otra conexión confirme cambios); las escrituras de este servicio se aplican sobre
+        la copia o la descartan (ver _insert_rows), así que no requieren relectura.
+        """
+        with self._lock:
+            cached = self._valid_tables()
+            tables: Dict[str, SheetTable] = {}
+            for title in sheet_titles:
+                if title in tables:
+                    continue
+                table = cached.get(title)
+                if table is None:
+                    columns = self._columns(title)
+                    select = ", ".join(f'"{c}"' for c in columns)
+                    rows = self._execute(f'SELECT {select} FROM "{title}" ORDER BY rowid')
+                    table = cached[title] = SheetTable(title, [columns] + [list(row) for row in rows])
+                tables[title] = table
+            return tables
+
+    def _valid_tables(self) -> Dict[str, SheetTable]:
+        """
+        Tablas en memoria, descartándolas si otra conexión modificó la base desde que se leyeron
+        (en ese caso el asignador de IDs también se vuelve a alinear).
+        """
+        with self._lock:
+            version = self._execute("PRAGMA data_version")[0][0]
+            if version != self._data_version:
+                self._tables.clear()
+                self._ids_seeded = False
+                self._data_version = version
+            return self._tables
+
+    def invalidate_cache(self, sheet_title: Optional[str] = None):
+        """Descarta la copia en memoria de una tabla (o de todas si no se indica)."""
+        with self._lock:
+            if sheet_title is None:
+                self._tables.clear()
+            else:
+                self._tables.pop(sheet_title, None)
+
+    def _select_by_casa(self, sheet_title: str, id_casa: int) -> List[List[str]]:
+        """Filas de una tabla con el ID_CASA indicado (consulta por índice)."""
+        columns = self._columns(sheet_title)
+        select = ", ".join(f'"{c}"' for c in columns)
+        rows = self._execute(
+            f'SELECT {select} FROM "{sheet_title}" WHERE "ID_CASA" = ? ORDER BY rowid', (_index_key(id_casa),)
+        )
+        return [list(row) for row in rows]
+
+    def get_records_by_casa_id(self, sheet_title: str, id_casa: int, table: Optional[SheetTable] = None) -> List[Union[Dict[str, Any], Movement]]:
+        """Registros de una casa. Sin tabla precargada, se consulta directamente por el índice ID_CASA."""
+        if table is not None:
+            return super().get_records_by_casa_id(sheet_title, id_casa, table)
+        decoder = record_decoder(sheet_title, self._columns(sheet_title))
+        return decoder.decode_all(self._select_by_casa(sheet_title, id_casa))
+
+    def get_casa_ledger(self, id_casa: int, movimientos: Optional[SheetTable] = None) -> CasaLedger:
+        """
+        Resumen de cuenta de una casa. Con MOVIMIENTOS en memoria (pasada o ya leída) se usa su
+        proyección; si no, se resumen solo los movimientos de la casa (índice ID_CASA) sin cargar la tabla.
+        """
+        movimientos = movimientos or self._valid_tables().get(self.MOVEMENTS_SHEET_NAME)
+        if movimientos is not None:
+            return super().get_casa_ledger(id_casa, movimientos)
+        movements = self.get_records_by_casa_id(self.MOVEMENTS_SHEET_NAME, id_casa)
+        return LedgerProjection(movements).get(id_casa)
+
+    def get_user_by_id_casa(self, id_casa: int, usuarios: Optional[SheetTable] = None) -> Optional[Dict[str, Any]]:
+        """Usuario de una casa. Sin tabla precargada, se consulta directamente por el índice ID_CASA."""
+        if usuarios is not None:
+            return super().get_user_by_id_casa(id_casa, usuarios)
+        try:
+            rows = self._select_by_casa('USUARIOS', id_casa)
+        except Exception as e:
+            print(f"[ERROR SQLITE] Error al obtener usuario por ID_CASA {id_casa}: {e}")
+            return None
+        if not rows:
+            return None
+        return SheetTable('USUARIOS', [self._columns('USUARIOS'), rows[0]]).records()[0]
+
+    def get_semaforo_by_casa(self, id_casa: int, semaforo: Optional[SheetTable] = None) -> Optional[Dict[str, Any]]:
+        """Semáforo consolidado de una casa (consulta por índice si no se pasa la tabla)."""
+        try:
+            if semaforo is not None:
+                rows = semaforo.rows_for('ID_CASA', id_casa) # Índice ID_CASA de la copia: O(1)
+            else:
+                rows = self._select_by_casa(self.SEMAFORO_SHEET_NAME, id_casa)
+            for row in rows:
+                record = self._semaforo_record(row)
+                if record is not None:
+                    return record
+            return None
+        except Exception as e:
+            print(f"[ERROR SQLITE] Error al obtener el semáforo para la Casa {id_casa}: {e}")
+            return None
+
+    # --- ESCRITURA ---
+
+    def reserve_movement_ids(self, count: int) -> List[str]:
+        """
+        Reserva un bloque contiguo de IDs desde memoria. El asignador se alinea con el mayor ID
+        guardado (un recorrido de MOVIMIENTOS) solo la primera vez y cuando otra conexión modificó
+        la base; los IDs que inserta este servicio ya los registra _insert_rows.
+        """
+        with self._lock:
+            self._valid_tables()
+            if not self._ids_seeded:
+                rows = self._execute(
+                    'SELECT MAX(CAST(SUBSTR("ID_MOVIMIENTO", 2) AS INTEGER)) FROM "MOVIMIENTOS" '
+                    'WHERE "ID_MOVIMIENTO" GLOB \'M[0-9]*\''
+                )
+                last_number = rows[0][0] if rows and rows[0][0] is not None else 0
+                self._id_allocator.observe([f"M{last_number}"])
+                self._ids_seeded = True
+            return self._id_allocator.reserve(count)
+
+    def append_movement(self, data_row: list):
+        """Añade una fila a MOVIMIENTOS."""
+        return self.append_movements([data_row])
+
+    def append_movements(self, data_rows: List[list]):
+        """Añade varias filas a MOVIMIENTOS en una sola transacción (todo o nada)."""
+        if not data_rows:
+            return None
+        self._insert_rows(self.MOVEMENTS_SHEET_NAME, data_rows)
+        return {"updates": {"updatedRows": len(data_rows)}}
+
+    def _insert_rows(self, sheet_title: str, data_rows: List[list]):
+        columns = self._columns(sheet_title)
+        placeholders = ", ".join("?" for _ in columns)
+        names = ", ".join(f'"{c}"' for c in columns)
+        db_rows = [self._to_db_row(columns, row) for row in data_rows]
+        conn = self.ensure_connection()
+        with self._lock:
+            table = self._valid_tables().get(sheet_title)
+            with conn:
+                conn.executemany(f'INSERT INTO "{sheet_title}" ({names}) VALUES ({placeholders})', db_rows)
+            # Los commits propios no cambian data_version: se aplican sobre la copia (write-through)
+            # y sus IDs al asignador
+            if table is not None:
+                for row in db_rows:
+                    table.append_row(row)
+            if sheet_title == self.MOVEMENTS_SHEET_NAME:
+                self._id_allocator.observe(row[0] for row in db_rows)
+
+    def update_or_append_semaforo(self, id_casa: int, dias_atraso: int, saldo: float, estado: str, cuotas_pendientes: int) -> bool:
+        """Actualiza o añade el semáforo de una casa (UPSERT sobre el índice único ID_CASA)."""
+        try:
+            self.bulk_upsert_semaforo([{
+                'ID_CASA': id_casa,
+                'DIAS_ATRASO': dias_atraso,
+                'SALDO': saldo,
+                'ESTADO_SEMAFORO': estado,
+                'CUOTAS_PENDIENTES': cuotas_pendientes
+            }])
+            return True
+        except Exception as e:
+            print(f"Error al actualizar/añadir semáforo para casa {id_casa}: {e}")
+            return False
+
+    def bulk_upsert_semaforo(self, results: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Actualiza o añade el semáforo de muchas casas en una sola transacción."""
+        current_time_local = datetime.now(LOCAL_TIMEZONE).strftime('%Y-%m-%d %H:%M')
+        columns = self._columns(self.SEMAFORO_SHEET_NAME)
+
+        merged: Dict[str, List[str]] = {}
+        for result in results:
+            new_data = self._semaforo_row(
+                result['ID_CASA'], result['DIAS_ATRASO'], result['SALDO'],
+                result['ESTADO_SEMAFORO'], result['CUOTAS_PENDIENTES'], current_time_local
+            )
+            new_data = self._to_db_row(columns, new_data)
+            merged[new_data[0]] = new_data
+        if not merged:
+            return {"actualizadas": 0, "nuevas": 0}
+
+        existing = {row[0] for row in self._execute(f'SELECT "ID_CASA" FROM "{self.SEMAFORO_SHEET_NAME}"')}
+        names = ", ".join(f'"{c}"' for c in columns)
+        placeholders = ", ".join("?" for _ in columns)
+        updates = ", ".join(f'"{c}" = excluded."{c}"' for c in columns[1:])
+        conn = self.ensure_connection()
+        with self._lock:
+            with conn:
+                conn.executemany(
+                    f'INSERT INTO "{self.SEMAFORO_SHEET_NAME}" ({names}) VALUES ({placeholders}) '
+                    f'ON CONFLICT("ID_CASA") DO UPDATE SET {updates}',
+                    list(merged.values())
+                )
+            self.invalidate_cache(self.SEMAFORO_SHEET_NAME)
+        actualizadas = sum(1 for casa_id in merged if casa_id in existing)
+        return {"actualizadas": actualizadas, "nuevas": len(merged) - actualizadas}
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del motor: tablas en memoria y la versión de la base con que se leyeron."""
+        stats = super().stats()
+        with self._lock:
+            stats["tablas_en_cache"] = sorted(self._tables)
+            stats["data_version"] = self._data_version
+        return stats
+
+    # --- IMPORTACIÓN ---
+
+    def load_tables(self, tables: Dict[str, SheetTable]):
+        """
+        Reemplaza el contenido de las tablas locales con las hojas indicadas (p. ej. leídas de
+        Google Sheets). Las columnas se asignan por nombre de cabecera.
+        """
+        conn = self.ensure_connection()
+        with self._lock:
+            with conn:
+                for title, table in tables.items():
+                    columns = self._columns(title)
+                    positions = [table.header.index(c) if c in table.header else None for c in columns]
+                    rows = [[row[p] if p is not None else "" for p in positions] for row in table.rows]
+                    conn.execute(f'DELETE FROM "{title}"')
+                    names = ", ".join(f'"{c}"' for c in columns)
+                    placeholders = ", ".join("?" for _ in columns)
+                    conn.executemany(
+                        f'INSERT OR REPLACE INTO "{title}" ({names}) VALUES ({placeholders})',
+                        [self._to_db_row(columns, row) for row in rows]
+                    )
+                    print(f"[INFO] {len(rows)} filas importadas en '{title}'.")
+                    self.invalidate_cache(title)
+                    if title == self.MOVEMENTS_SHEET_NAME:
+                        self._ids_seeded = False
+
+
+# ----------------------------------------------------------------------
+# --- INSTANCIA COMPARTIDA (POOL DE PROCESO) ---
+# ----------------------------------------------------------------------
+
+_shared_service: Optional[SQLiteService] = None
+_shared_service_lock = threading.Lock()
+
+def get_shared_sqlite_service() -> SQLiteService:
+    """Retorna la instancia única de SQLiteService del proceso, creándola en el primer uso."""
+    global _shared_service
+    if _shared_service is None:
+        with _shared_service_lock:
+            if _shared_service is None:
+                _shared_service = SQLiteService()
+    return _shared_service
+
+
+def main():
+    """Importa las hojas de Google Sheets a la base de datos local (SQLITE_PATH)."""
+    from API.backend_api.sheets_service import get_shared_sheets_service
+
+    sheets = get_shared_sheets_service()
+    tables = sheets.get_tables(list(SHEET_COLUMNS.keys()))
+    get_shared_sqlite_service().load_tables(tables)
+    print(f"[INFO] Importación completa en '{SQLITE_PATH}'.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,518 @@
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import List, Dict, Any, Optional, Iterable, Iterator, Sequence, Union
+
+import anyio
+
+from API.backend_api.sheet_schema import SHEET_COLUMNS, compile_decoder, typed_or
+from API.backend_api.config_cache import CondominioConfig, CONFIG_SHEET_NAME, get_shared_config_cache
+from API.backend_api.movement_store import Movement, MovementDecoder
+from API.backend_api.ledger import CasaLedger, LedgerProjection
+
+# --- SELECCIÓN DEL MOTOR DE ALMACENAMIENTO ---
+# 'sheets' (Google Sheets, por defecto) o 'sqlite' (base de datos local, ver sqlite_service.py)
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "sheets").strip().lower()
+
+def _to_cell(value: Any) -> str:
+    """Convierte un valor escrito en la hoja al texto que la API devolvería al leerlo."""
+    if value is None:
+        return ""
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return str(value)
+
+
+def _index_key(value: Any) -> str:
+    """Normaliza el valor de una celda como clave de índice ('5', ' 5 ', '5.0' y 5 -> '5')."""
+    key = str(value).strip()
+    try:
+        number = float(key)
+        if number.is_integer():
+            return str(int(number))
+    except ValueError:
+        pass
+    return key
+
+def record_decoder(title: str, header: Sequence[str]):
+    """
+    Decodificador de registros de una hoja: Movement (__slots__, valores tipados) para MOVIMIENTOS,
+    uno nuevo por llamada (sus cachés duran lo que la carga), y diccionarios tipados según
+    sheet_schema para las demás (uno por cabecera, reutilizado).
+    """
+    if title == 'MOVIMIENTOS':
+        return MovementDecoder(header)
+    return compile_decoder(title, header)
+
+# --- COPIA EN MEMORIA DE UNA HOJA ---
+class SheetTable:
+    """
+    Copia en memoria de una hoja: cabecera y filas crudas (texto, tal como las devuelve la API).
+    Los registros (Movement en MOVIMIENTOS y diccionarios tipados en las demás, ver record_decoder) y los índices
+    por columna (p. ej. ID_CASA -> filas) se construyen una sola vez por carga y se mantienen
+    al aplicar escrituras. Tratar los datos como de solo lectura.
+    """
+
+    def __init__(self, title: str, values: List[List[str]], fitted: bool = False):
+        """fitted=True: las filas ya tienen el ancho de la cabecera y son texto (p. ej. una instantánea local)."""
+        self.title = title
+        self.header: List[str] = list(values[0]) if values else []
+        self.rows: List[List[str]] = values[1:] if fitted else [self._fit(row) for row in values[1:]]
+        # Filas confirmadas en el origen; las posteriores son locales pendientes (ver append_row)
+        self.synced_rows = len(self.rows)
+        self.loaded_at = time.monotonic()
+        # Última lectura completa (la sincronización de cola solo renueva loaded_at)
+        self.full_loaded_at = self.loaded_at
+        # Aumenta con cada cambio que no es añadir al final (truncate, set_row)
+        self.revision = 0
+        self._decoder = record_decoder(title, self.header)
+        self._records: Optional[List[Union[Dict[str, Any], Movement]]] = None
+        self._indexes: Dict[str, Dict[str, List[int]]] = {} # columna -> {clave: posiciones}
+        self._ledger: Optional[LedgerProjection] = None # solo MOVIMIENTOS, ver ledger()
+
+    def _fit(self, row: List[Any]) -> List[str]:
+        """Ajusta una fila al ancho de la cabecera (rellena con vacíos o recorta)."""
+        width = len(self.header)
+        row = [_to_cell(v) for v in row[:width]]
+        if len(row) < width:
+            row.extend([""] * (width - len(row)))
+        return row
+
+    def _to_record(self, row: List[str]) -> Union[Dict[str, Any], Movement]:
+        return self._decoder(row)
+
+    def is_fresh(self, ttl: float) -> bool:
+        return ttl > 0 and (time.monotonic() - self.loaded_at) < ttl
+
+    def records(self) -> List[Union[Dict[str, Any], Movement]]:
+        """Retorna las filas como registros (Movement en MOVIMIENTOS, diccionarios por cabecera en las demás)."""
+        if self._records is None:
+            self._records = self._decoder.decode_all(self.rows)
+        return self._records
+
+    def index(self, column: str) -> Dict[str, List[int]]:
+        """
+        Retorna el índice hash {valor: [posiciones]} de una columna, construyéndolo en el primer uso.
+        Lanza ValueError si la hoja no tiene la columna.
+        """
+        index = self._indexes.get(column)
+        if index is None:
+            try:
+                col = self.header.index(column)
+            except ValueError:
+                raise ValueError(f"La hoja '{self.title}' no tiene la columna '{column}'.")
+            index = {}
+            for position, row in enumerate(self.rows):
+                index.setdefault(_index_key(row[col]), []).append(position)
+            self._indexes[column] = index
+        return index
+
+    def positions_for(self, column: str, value: Any) -> List[int]:
+        """Posiciones (base 0) de las filas cuyo valor en la columna coincide, en orden de hoja."""
+        return self.index(column).get(_index_key(value), [])
+
+    def rows_for(self, column: str, value: Any) -> List[List[str]]:
+        """Filas crudas cuyo valor en la columna coincide (búsqueda O(k) por índice)."""
+        return [self.rows[p] for p in self.positions_for(column, value)]
+
+    def records_for(self, column: str, value: Any) -> List[Union[Dict[str, Any], Movement]]:
+        """Registros cuyo valor en la columna coincide (búsqueda O(k) por índice)."""
+        records = self.records()
+        return [records[p] for p in self.positions_for(column, value)]
+
+    def iter_records_for(self, column: str, value: Any) -> Iterator[Union[Dict[str, Any], Movement]]:
+        """
+        Como records_for, pero entrega los registros de a uno (sin armar la lista). Si los registros
+        de la hoja aún no se construyeron, solo se decodifican las filas que coinciden.
+        """
+        positions = self.positions_for(column, value)
+        if self._records is None:
+            return (self._to_record(self.rows[p]) for p in positions)
+        records = self._records
+        return (records[p] for p in positions)
+
+    def ledger(self) -> LedgerProjection:
+        """
+        Proyección por casa de MOVIMIENTOS (saldo, último pago, cargo más antiguo, cuotas).
+        Se construye en la primera consulta y append_row la mantiene en O(1) por fila.
+        """
+        if self._ledger is None:
+            self._ledger = LedgerProjection(self.records())
+        return self._ledger
+
+    def rebuild_ledger(self) -> LedgerProjection:
+        """Descarta la proyección por casa y la reconstruye desde todas las filas (recuperación)."""
+        self._ledger = None
+        return self.ledger()
+
+    def append_row(self, row: List[Any], pending: bool = False):
+        """
+        Aplica en memoria una fila añadida al final de la hoja. Con pending=True la fila aún no
+        está escrita en el origen (p. ej. espera en el diario de movimientos).
+        """
+        row = self._fit(row)
+        if not pending and self.synced_rows == len(self.rows):
+            self.synced_rows += 1
+        self.rows.append(row)
+        if self._records is not None:
+            self._records.append(self._to_record(row))
+            if self._ledger is not None:
+                self._ledger.apply(self._records[-1])
+        position = len(self.rows) - 1
+        for column, index in self._indexes.items():
+            key = _index_key(row[self.header.index(column)])
+            index.setdefault(key, []).append(position)
+
+    def truncate(self, length: int):
+        """Descarta las filas desde la posición indicada (p. ej. filas locales pendientes)."""
+        removed = self.rows[length:]
+        if not removed:
+            return
+        del self.rows[length:]
+        self.revision += 1
+        # La proyección por casa no admite quitar filas: se reconstruye en la próxima consulta
+        self._ledger = None
+        if self._records is not None:
+            del self._records[length:]
+        for column, index in self._indexes.items():
+            col = self.header.index(column)
+            for position, row in enumerate(removed, start=length):
+                key = _index_key(row[col])
+                index[key].remove(position)
+                if not index[key]:
+                    del index[key]
+        self.synced_rows = min(self.synced_rows, length)
+
+    def set_row(self, position: int, row: List[Any]):
+        """Aplica en memoria la actualización de una fila (posición base 0, sin contar la cabecera)."""
+        row = self._fit(row)
+        old_row = self.rows[position]
+        self.rows[position] = row
+        self.revision += 1
+        self._ledger = None
+        if self._records is not None:
+            self._records[position] = self._to_record(row)
+        for column, index in self._indexes.items():
+            col = self.header.index(column)
+            old_key, new_key = _index_key(old_row[col]), _index_key(row[col])
+            if old_key != new_key:
+                index[old_key].remove(position)
+                if not index[old_key]:
+                    del index[old_key]
+                positions = index.setdefault(new_key, [])
+                positions.append(position)
+                positions.sort()
+
+# --- ASIGNADOR DE IDs DE MOVIMIENTO ---
+class MovementIdAllocator:
+    """
+    Entrega IDs de movimiento (M0001, M0002, etc.) desde memoria y bajo un lock.
+    Se siembra con los IDs de MOVIMIENTOS y avanza con cada carga de la hoja (observe),
+    de modo que también respeta los IDs escritos por otras instancias.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._last_number: Optional[int] = None
+
+    @staticmethod
+    def parse(uid: Any) -> Optional[int]:
+        """Retorna el número de un ID válido ('M' seguido de dígitos) o None."""
+        uid = str(uid).strip()
+        if uid.startswith('M') and uid[1:].isdigit():
+            return int(uid[1:])
+        return None
+
+    @property
+    def is_seeded(self) -> bool:
+        return self._last_number is not None
+
+    def observe(self, ids: Iterable[Any]):
+        """Registra IDs existentes en la hoja; el siguiente ID será mayor que todos ellos."""
+        numbers = [n for n in (self.parse(uid) for uid in ids) if n is not None]
+        with self._lock:
+            self._last_number = max(numbers + [self._last_number or 0])
+
+    def next_id(self) -> str:
+        """Entrega el siguiente ID disponible."""
+        return self.reserve(1)[0]
+
+    def reserve(self, count: int) -> List[str]:
+        """Reserva un bloque contiguo de IDs (para escrituras masivas)."""
+        with self._lock:
+            first = (self._last_number or 0) + 1
+            self._last_number = first + count - 1
+        return [f"M{number:04d}" for number in range(first, first + count)]
+
+# Decodificador posicional de las 6 columnas de ALERTAS_SEMAFORO
+_SEMAFORO_DECODER = compile_decoder('ALERTAS_SEMAFORO', SHEET_COLUMNS['ALERTAS_SEMAFORO'])
+
+# --- INTERFAZ DE ALMACENAMIENTO ---
+class StorageBackend(ABC):
+    """
+    Interfaz de almacenamiento que usa main.py. Las hojas se exponen como SheetTable
+    (cabecera + filas en texto), de modo que la lógica de consulta es común a todos los motores.
+    Implementaciones: SheetsService (Google Sheets) y SQLiteService (SQLite local).
+    """
+
+    MOVEMENTS_SHEET_NAME = 'MOVIMIENTOS'
+    SEMAFORO_SHEET_NAME = 'ALERTAS_SEMAFORO'
+
+    # --- CONEXIÓN Y LECTURA ---
+
+    @abstractmethod
+    def ensure_connection(self):
+        """Abre la conexión con el almacenamiento si aún no existe. Lanza una excepción si no es posible."""
+
+    @abstractmethod
+    def get_tables(self, sheet_titles: List[str]) -> Dict[str, SheetTable]:
+        """Retorna varias hojas como SheetTable en una sola operación."""
+
+    def get_table(self, sheet_title: str) -> SheetTable:
+        """Retorna una hoja como SheetTable."""
+        return self.get_tables([sheet_title])[sheet_title]
+
+    # --- CONSULTAS COMUNES (sobre SheetTable) ---
+
+    def get_all_records(self, sheet_title: str) -> List[Dict[str, Any]]:
+        """Obtiene todos los datos de una hoja como lista de diccionarios (usa la primera fila como cabecera)."""
+        return self.get_table(sheet_title).records()
+
+    def get_records_by_casa_id(self, sheet_title: str, id_casa: int, table: Optional[SheetTable] = None) -> List[Union[Dict[str, Any], Movement]]:
+        """
+        Obtiene todos los registros de una hoja filtrados por ID_CASA.
+        Este método soporta ID_CASA = 0 para la Tesorería. En MOVIMIENTOS retorna Movement tipados.
+        Acepta opcionalmente la hoja ya cargada (p. ej. desde get_tables).
+        """
+        table = table or self.get_table(sheet_title)
+        if not table.header:
+            return []
+
+        # Búsqueda O(k) mediante el índice ID_CASA -> registros de la copia en memoria
+        return table.records_for('ID_CASA', id_casa)
+
+    def get_casa_ledger(self, id_casa: int, movimientos: Optional[SheetTable] = None) -> CasaLedger:
+        """
+        Resumen de cuenta de una casa (saldo, último pago, cargo más antiguo, cuotas pendientes)
+        desde la proyección materializada de MOVIMIENTOS: lectura O(1), sin sumar sus movimientos.
+        """
+        table = movimientos or self.get_table(self.MOVEMENTS_SHEET_NAME)
+        return table.ledger().get(id_casa)
+
+    # --- CONFIGURACIÓN TIPADA (CACHÉ VERSIONADA, ver config_cache.py) ---
+    def get_config(self, force: bool = False) -> CondominioConfig:
+        """
+        Configuración validada del condominio. Dentro del TTL se entrega desde memoria sin leer
+        la hoja; force=True descarta la copia cacheada de CONFIGURACION y la vuelve a leer.
+        """
+        config = self._cached_config(force)
+        if config is not None:
+            return config
+        try:
+            configuracion, error = self.get_table(CONFIG_SHEET_NAME), None
+        except Exception as e:
+            configuracion, error = None, e
+        return self._update_config(configuracion, error)
+
+    def _cached_config(self, force: bool) -> Optional[CondominioConfig]:
+        """Configuración vigente en memoria, o None si hay que leer CONFIGURACION (force descarta su copia)."""
+        if force:
+            self.invalidate_cache(CONFIG_SHEET_NAME)
+            return None
+        return get_shared_config_cache().fresh()
+
+    @staticmethod
+    def _update_config(configuracion: Optional[SheetTable], error: Optional[Exception]) -> CondominioConfig:
+        """Valida la hoja leída y actualiza la caché; si la lectura falló, conserva la última válida."""
+        cache = get_shared_config_cache()
+        if error is not None:
+            return cache.fail(error)
+        return cache.update(configuracion)
+
+    def invalidate_cache(self, sheet_title: Optional[str] = None):
+        """Descarta los datos cacheados de una hoja (los motores sin caché no hacen nada)."""
+
+    # --- FUNCIÓN PARA LECTURA DE USUARIO ---
+    def get_user_by_id_casa(self, id_casa: int, usuarios: Optional[SheetTable] = None) -> Optional[Dict[str, Any]]:
+        """Busca y retorna el registro de usuario (incluyendo NOMBRE) para una casa. Soporta ID_CASA=0."""
+        try:
+            usuarios_data = usuarios.records() if usuarios else self.get_all_records('USUARIOS')
+            for user in usuarios_data:
+                # 'is not None': ID_CASA = 0 (Tesorería) también es una casa válida
+                if user.get('ID_CASA') is not None and str(user['ID_CASA']).strip() == str(id_casa):
+                    return user
+            return None
+        except Exception as e:
+            print(f"[ERROR SHEETS] Error al obtener usuario por ID_CASA {id_casa}: {e}")
+            return None
+
+    # --- FUNCIÓN: OBTENER MAPA DE USUARIOS (Para el Admin Panel) ---
+    def get_all_users_map(self, usuarios: Optional[SheetTable] = None) -> Dict[str, Dict[str, Any]]:
+        """Retorna un mapa de usuarios {ID_CASA: {DATOS_USUARIO}}. Incluye ID_CASA 0."""
+        try:
+            users_data = usuarios.records() if usuarios else self.get_all_records('USUARIOS')
+        except Exception:
+            return {}
+            
+        user_map = {}
+        for user in users_data:
+            casa_id = str(user.get('ID_CASA')).strip()
+            if casa_id:
+                user_map[casa_id] = {
+                    'NOMBRE': user.get('NOMBRE', 'N/A'),
+                    'EMAIL': user.get('EMAIL', 'N/A'),
+                    'CELULAR': user.get('CELULAR', 'N/A')
+                }
+        return user_map
+
+    # --- FUNCIÓN: get_all_casa_ids ---
+    def get_all_casa_ids(self, usuarios: Optional[SheetTable] = None) -> List[int]:
+        """Obtiene una lista de todos los ID_CASA activos de la hoja USUARIOS. Incluye ID_CASA 0."""
+        
+        try:
+            records = usuarios.records() if usuarios else self.get_all_records('USUARIOS')
+            
+            casa_ids = []
+            for record in records:
+                casa_id = record.get('ID_CASA')
+                estado = str(record.get('ESTADO', 'ACTIVO')).upper().strip() 
+
+                # ID_CASA ya es int si la celda es numérica (esquema de USUARIOS)
+                if isinstance(casa_id, int) and estado == 'ACTIVO' and casa_id not in casa_ids:
+                    casa_ids.append(casa_id)
+                        
+            return sorted(casa_ids)
+            
+        except Exception as e:
+            print(f"[ERROR SHEETS_SERVICE] Fallo al obtener todos los ID de casa: {e}")
+            return []
+
+    # --- ESCRITURA ---
+
+    # MÉTODO DE ESCRITURA: Genera el ID en formato Mxxxx
+    def generate_next_movement_id(self) -> str:
+        """Genera el siguiente ID de movimiento (M0001, M0002, etc.)."""
+        return self.reserve_movement_ids(1)[0]
+
+    @abstractmethod
+    def reserve_movement_ids(self, count: int) -> List[str]:
+        """Reserva un bloque contiguo de IDs de movimiento."""
+
+    @abstractmethod
+    def append_movement(self, data_row: list):
+        """Añade una fila a MOVIMIENTOS."""
+
+    @abstractmethod
+    def append_movements(self, data_rows: List[list]):
+        """Añade varias filas a MOVIMIENTOS en una sola operación (todo o nada)."""
+
+    # --- SEMÁFORO ---
+
+    @abstractmethod
+    def update_or_append_semaforo(self, id_casa: int, dias_atraso: int, saldo: float, estado: str, cuotas_pendientes: int) -> bool:
+        """Actualiza o añade el semáforo de una casa. Retorna False si la escritura falla."""
+
+    @abstractmethod
+    def bulk_upsert_semaforo(self, results: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Actualiza o añade el semáforo de muchas casas. Retorna {'actualizadas': n, 'nuevas': m}."""
+
+    @abstractmethod
+    def get_semaforo_by_casa(self, id_casa: int, semaforo: Optional[SheetTable] = None) -> Optional[Dict[str, Any]]:
+        """Retorna el semáforo consolidado de una casa o None."""
+
+    @staticmethod
+    def _semaforo_row(id_casa: int, dias_atraso: int, saldo: float, estado: str, cuotas_pendientes: int, fecha: str) -> List[str]:
+        """Fila de ALERTAS_SEMAFORO. ORDEN DE COLUMNAS: A, B, C, D, E, F"""
+        return [
+            str(id_casa),            # 1. ID_CASA (A)
+            f"{saldo:.2f}",          # 2. SALDO (B)
+            str(dias_atraso),        # 3. DIAS_ATRASO (C)
+            estado,                  # 4. ESTADO_SEMAFORO (D)
+            str(cuotas_pendientes),  # 5. CUOTAS_PENDIENTES (E)
+            fecha,                   # 6. FECHA_ACTUALIZACION (F)
+        ]
+
+    @staticmethod
+    def _semaforo_record(row: List[str]) -> Optional[Dict[str, Any]]:
+        """Mapeo de las 6 columnas de datos de ALERTAS_SEMAFORO (None si la fila está incompleta)."""
+        if len(row) < 6:
+            return None
+        values = _SEMAFORO_DECODER.values(row[:6])
+        return {
+            "ID_CASA": row[0],
+            "SALDO": typed_or(values[1], 0.0),
+            "DIAS_ATRASO": typed_or(values[2], 0),
+            "ESTADO_SEMAFORO": values[3],
+            "CUOTAS_PENDIENTES": typed_or(values[4], 0),
+            "FECHA_ACTUALIZACION": values[5]
+        }
+
+    # --- API ASÍNCRONA (endpoints async def) ---
+    # Por defecto ejecutan la versión síncrona en el pool de hilos de anyio, sin bloquear el
+    # event loop. Los motores con cliente HTTP asíncrono (AsyncSheetsService) los sobrescriben.
+
+    async def aensure_connection(self):
+        """Versión asíncrona de ensure_connection."""
+        return await anyio.to_thread.run_sync(self.ensure_connection)
+
+    async def aget_tables(self, sheet_titles: List[str]) -> Dict[str, SheetTable]:
+        """Versión asíncrona de get_tables."""
+        return await anyio.to_thread.run_sync(self.get_tables, sheet_titles)
+
+    async def aget_table(self, sheet_title: str) -> SheetTable:
+        """Versión asíncrona de get_table."""
+        return (await self.aget_tables([sheet_title]))[sheet_title]
+
+    async def aget_config(self, force: bool = False) -> CondominioConfig:
+        """Versión asíncrona de get_config."""
+        config = self._cached_config(force)
+        if config is not None:
+            return config
+        try:
+            configuracion, error = await self.aget_table(CONFIG_SHEET_NAME), None
+        except Exception as e:
+            configuracion, error = None, e
+        return self._update_config(configuracion, error)
+
+    async def areserve_movement_ids(self, count: int) -> List[str]:
+        """Versión asíncrona de reserve_movement_ids."""
+        return await anyio.to_thread.run_sync(self.reserve_movement_ids, count)
+
+    async def agenerate_next_movement_id(self) -> str:
+        """Versión asíncrona de generate_next_movement_id."""
+        return (await self.areserve_movement_ids(1))[0]
+
+    async def aappend_movement(self, data_row: list):
+        """Versión asíncrona de append_movement."""
+        return await anyio.to_thread.run_sync(self.append_movement, data_row)
+
+    async def aappend_movements(self, data_rows: List[list]):
+        """Versión asíncrona de append_movements."""
+        return await anyio.to_thread.run_sync(self.append_movements, data_rows)
+
+    async def abulk_upsert_semaforo(self, results: List[Dict[str, Any]]) -> Dict[str, int]:
+        """Versión asíncrona de bulk_upsert_semaforo."""
+        return await anyio.to_thread.run_sync(self.bulk_upsert_semaforo, results)
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado del motor para diagnóstico (los motores añaden sus propias métricas)."""
+        return {"motor": type(self).__name__, "configuracion": get_shared_config_cache().stats()}
+
+    async def aclose(self):
+        """Libera los recursos asíncronos del motor (al apagar la aplicación)."""
+
+
+# ----------------------------------------------------------------------
+# --- INSTANCIA COMPARTIDA SEGÚN STORAGE_BACKEND ---
+# ----------------------------------------------------------------------
+
+def get_storage_backend() -> StorageBackend:
+    """Retorna el motor de almacenamiento compartido del proceso según STORAGE_BACKEND."""
+    if STORAGE_BACKEND == "sqlite":
+        from API.backend_api.sqlite_service import get_shared_sqlite_service
+        return get_shared_sqlite_service()
+    if STORAGE_BACKEND != "sheets":
+        print(f"[WARN] STORAGE_BACKEND '{STORAGE_BACKEND}' desconocido. Se usa Google Sheets.")
+    from API.backend_api.async_sheets_service import get_shared_async_sheets_service
+    return get_shared_async_sheets_service()
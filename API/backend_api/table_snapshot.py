@@ -0,0 +1,104 @@
+import gc
+import gzip
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from typing import List, Dict, Any, Optional
+
+# --- CONFIGURACIÓN DE LA INSTANTÁNEA LOCAL DE HOJAS (ARRANQUE EN FRÍO) ---
+# Archivo donde se guarda la copia de las hojas cargadas. Desactivada salvo que se configure:
+# incluye USUARIOS (hash de contraseña, DNI, correo), así que la ruta debe ser privada del servicio.
+SHEETS_SNAPSHOT_PATH = os.environ.get("SHEETS_SNAPSHOT_PATH", "")
+# Segundos mínimos entre dos escrituras de la instantánea
+SHEETS_SNAPSHOT_INTERVAL = float(os.environ.get("SHEETS_SNAPSHOT_INTERVAL", "300"))
+
+# Versión del formato del archivo (se ignoran instantáneas de otro formato)
+SNAPSHOT_FORMAT = 1
+
+
+class TableSnapshot:
+    """
+    Instantánea local de las hojas cargadas: JSON comprimido con gzip con el ID de la hoja de
+    cálculo, su modifiedTime (Drive) al momento de la carga y las filas confirmadas de cada hoja.
+    La escritura es atómica (archivo temporal + os.replace), así otros procesos nunca leen un
+    archivo a medias.
+    """
+
+    def __init__(self, path: str, interval: float = SHEETS_SNAPSHOT_INTERVAL):
+        self.path = path
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._saved_at: Optional[float] = None
+        self.saves = 0
+        self.restored: Optional[str] = None # 'vigente', 'descartada' o None
+        self.last_error: Optional[str] = None
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """Lee la instantánea; None si no existe, está dañada o es de otro formato."""
+        if not os.path.exists(self.path):
+            return None
+        # Sin recolector de ciclos durante la carga (millones de strings recién creados)
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            with gzip.open(self.path, 'rb') as f:
+                data = json.loads(f.read())
+        except (OSError, ValueError) as e:
+            self.last_error = str(e)
+            print(f"[WARN] Instantánea local '{self.path}' ilegible, se ignora: {e}")
+            return None
+        finally:
+            if gc_enabled:
+                gc.enable()
+        if not isinstance(data, dict) or data.get("formato") != SNAPSHOT_FORMAT:
+            return None
+        return data
+
+    def due(self) -> bool:
+        """Indica si ya pasó el intervalo mínimo desde la última escritura de este proceso."""
+        return self._saved_at is None or time.monotonic() - self._saved_at >= self.interval
+
+    def claim(self) -> bool:
+        """Reserva la próxima escritura si corresponde (un solo hilo la obtiene por intervalo)."""
+        with self._lock:
+            if not self.due():
+                return False
+            self._saved_at = time.monotonic()
+            return True
+
+    def save(self, spreadsheet_id: str, modified_time: str, tables: Dict[str, List[List[str]]]):
+        """Escribe la instantánea (cabecera + filas por hoja) de forma atómica."""
+        data = {
+            "formato": SNAPSHOT_FORMAT,
+            "spreadsheet_id": spreadsheet_id,
+            "modified_time": modified_time,
+            "guardada_en": datetime.now().isoformat(timespec="seconds"),
+            "tablas": tables,
+        }
+        with self._lock:
+            tmp_path = None
+            try:
+                directory = os.path.dirname(os.path.abspath(self.path))
+                fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+                with os.fdopen(fd, 'wb') as raw:
+                    with gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=1) as f:
+                        f.write(json.dumps(data, ensure_ascii=False, separators=(',', ':')).encode('utf-8'))
+                os.replace(tmp_path, self.path)
+                self.saves += 1
+                self.last_error = None
+            except OSError as e:
+                if tmp_path and os.path.exists(tmp_path):
+                    os.unlink(tmp_path)
+                self.last_error = str(e)
+                print(f"[WARN] No se pudo guardar la instantánea local '{self.path}': {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "ruta": self.path,
+            "restaurada": self.restored,
+            "escrituras": self.saves,
+            "ultimo_error": self.last_error,
+        }
@@ -0,0 +1,299 @@
+"""
+Benchmark de endpoints con condominios sintéticos (10, 100, 1.000 y 10.000 casas).
+
+Cada escala se ejecuta en un subproceso propio: levanta el emulador de Google Sheets
+(API/backend_api/sheets_emulator.py) con el libro sintético, o carga una base SQLite, y recorre
+los endpoints con el TestClient de FastAPI. Se reportan percentiles de latencia, llamadas al
+backend por solicitud y pico de memoria (tracemalloc) en un JSON comparable entre versiones.
+
+    python -m benchmarks.bench_endpoints --output benchmarks/resultados.json
+    python -m benchmarks.bench_endpoints --houses 10 100 --iterations 50 --latency-ms 100
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, datetime
+from typing import List, Dict, Any, Optional
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCALES = [10, 100, 1000, 10000]
+PASSWORD = "benchmark"
+
+
+# ----------------------------------------------------------------------
+# --- CONDOMINIO SINTÉTICO ---
+# ----------------------------------------------------------------------
+
+def synthetic_workbook(houses: int, months: int, password_hash: str, seed: int = 42) -> Dict[str, List[List[Any]]]:
+    """
+    Hojas del libro: un ADMIN (casa 0) y un CONDOMINO por casa, `months` alícuotas por casa con
+    pagos al día en la mayoría de casas, y un semáforo ya consolidado.
+    """
+    from API.backend_api.sheet_schema import SHEET_COLUMNS
+
+    rng = random.Random(seed)
+    today = date.today()
+    periods = []
+    year, month = today.year, today.month
+    for _ in range(months):
+        periods.append((year, month))
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    periods.reverse()
+
+    usuarios = [SHEET_COLUMNS['USUARIOS'], ["9999999999", "0", "Administración", "admin@condominio.ec", "0990000000", "ADMIN", password_hash, "ACTIVO"]]
+    movimientos = [SHEET_COLUMNS['MOVIMIENTOS']]
+    semaforo = [SHEET_COLUMNS['ALERTAS_SEMAFORO']]
+    next_id = 1
+    for casa in range(1, houses + 1):
+        usuarios.append([f"{1700000000 + casa}", str(casa), f"Condómino {casa}", f"casa{casa}@condominio.ec",
+                         f"09{casa:08d}", "CONDOMINO", password_hash, "ACTIVO"])
+        unpaid = rng.choice([0, 0, 0, 1, 2, 3])
+        saldo = 0.0
+        for i, (y, m) in enumerate(periods):
+            mes = f"{y}-{m:02d}"
+            movimientos.append([f"M{next_id:04d}", str(casa), mes, "ALICUOTA", "Cuota de Mantenimiento Ordinaria",
+                                "50", f"{mes}-05", "", f"{mes}-01 08:00", ""])
+            next_id += 1
+            saldo += 50
+            if i < months - unpaid:
+                movimientos.append([f"M{next_id:04d}", str(casa), mes, "PAGO", "Pago alícuota", "-50", "",
+                                    "TRANSFERENCIA", f"{mes}-04 10:30", ""])
+                next_id += 1
+                saldo -= 50
+        estado = "ROJO" if unpaid >= 2 else ("AMARILLO" if unpaid == 1 else "VERDE")
+        semaforo.append([str(casa), f"{saldo:.2f}", str(30 * unpaid), estado, str(unpaid), f"{today} 06:00"])
+
+    configuracion = [SHEET_COLUMNS['CONFIGURACION'], ["VALOR_ALICUOTA", "50.00"], ["DIA_VENCIMIENTO", "5"]]
+    return {'USUARIOS': usuarios, 'MOVIMIENTOS': movimientos, 'ALERTAS_SEMAFORO': semaforo, 'CONFIGURACION': configuracion}
+
+
+# ----------------------------------------------------------------------
+# --- EJECUCIÓN DE UNA ESCALA (SUBPROCESO) ---
+# ----------------------------------------------------------------------
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        index = min(len(ordered) - 1, max(0, int(round(p / 100.0 * len(ordered) + 0.5)) - 1))
+        return round(ordered[index], 2)
+
+    return {
+        "p50_ms": pct(50), "p90_ms": pct(90), "p99_ms": pct(99),
+        "media_ms": round(statistics.fmean(ordered), 2), "max_ms": round(ordered[-1], 2),
+    }
+
+
+class EmulatorProcess:
+    """Emulador de Google Sheets en un subproceso (su memoria no cuenta en el pico del backend)."""
+
+    def __init__(self, port: int, workbook: Dict[str, List[List[Any]]], latency_ms: float):
+        from API.backend_api.sheets_service import SPREADSHEET_NAME
+
+        self.port = port
+        self.url = f"http://127.0.0.1:{self.port}"
+        self._data = tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8")
+        json.dump({"title": SPREADSHEET_NAME, "sheets": workbook}, self._data)
+        self._data.close()
+        self.proc = subprocess.Popen(
+            [sys.executable, "-m", "API.backend_api.sheets_emulator", "--port", str(self.port),
+             "--data", self._data.name, "--latency-ms", str(latency_ms)],
+            cwd=ROOT, stdout=subprocess.DEVNULL,
+        )
+
+    def wait_ready(self, timeout: float = 60.0):
+        import httpx
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            try:
+                httpx.get(f"{self.url}/_emulator/stats", timeout=1.0)
+                return
+            except httpx.HTTPError:
+                time.sleep(0.1)
+        raise RuntimeError("El emulador no respondió a tiempo.")
+
+    def calls(self) -> int:
+        import httpx
+        return httpx.get(f"{self.url}/_emulator/stats").json()["total"]
+
+    def stop(self):
+        self.proc.terminate()
+        self.proc.wait(timeout=10)
+        os.unlink(self._data.name)
+
+
+def run_scale(houses: int, args) -> Dict[str, Any]:
+    """Mide todos los endpoints para un condominio de `houses` casas (requiere un proceso nuevo)."""
+    # La configuración se lee al importar los módulos del backend: se fija antes de importarlos
+    os.environ["STORAGE_BACKEND"] = "sqlite" if args.backend == "sqlite" else "sheets"
+    os.environ["SHEETS_QUOTA_PER_MINUTE"] = "0"
+    os.environ["SHEETS_CACHE_TTL"] = str(args.cache_ttl)
+    os.environ.pop("MOVEMENTS_JOURNAL_PATH", None)
+    os.environ["SHEETS_SNAPSHOT_PATH"] = "" # Sin instantánea local: cada corrida parte de la hoja
+    port = _free_port()
+    sqlite_dir: Optional[tempfile.TemporaryDirectory] = None
+    if args.backend == "sqlite":
+        sqlite_dir = tempfile.TemporaryDirectory()
+        os.environ["SQLITE_PATH"] = os.path.join(sqlite_dir.name, "bench.db")
+    else:
+        os.environ["SHEETS_API_ENDPOINT"] = f"http://127.0.0.1:{port}"
+
+    from API.backend_api.security import hash_password, create_access_token
+
+    print(f"[INFO] Generando condominio sintético de {houses} casas...", file=sys.stderr)
+    workbook = synthetic_workbook(houses, args.months, hash_password(PASSWORD))
+
+    emulator: Optional[EmulatorProcess] = None
+    if sqlite_dir is not None:
+        from API.backend_api.storage import SheetTable
+        from API.backend_api.sqlite_service import get_shared_sqlite_service
+        get_shared_sqlite_service().load_tables({name: SheetTable(name, rows) for name, rows in workbook.items()})
+    else:
+        emulator = EmulatorProcess(port, workbook, args.latency_ms)
+        emulator.wait_ready()
+    del workbook
+
+    from fastapi.testclient import TestClient
+    from API.backend_api.main import app
+
+    sample = random.Random(7)
+    admin = {"Authorization": "Bearer " + create_access_token({"sub": "9999999999", "ID_CASA": 0, "ROL": "ADMIN"})}
+
+    def condomino_headers():
+        casa = sample.randint(1, houses)
+        token = create_access_token({"sub": f"{1700000000 + casa}", "ID_CASA": casa, "ROL": "CONDOMINO"})
+        return {"Authorization": f"Bearer {token}"}
+
+    mes_siguiente = date.today().replace(day=1).toordinal() + 32
+    periodo = date.fromordinal(mes_siguiente).strftime('%Y-%m')
+    # (nombre, método, ruta, fábrica de kwargs, iteraciones)
+    scenarios = [
+        ("login", "POST", lambda: "/login", lambda: {"json": {"dni": f"{1700000000 + sample.randint(1, houses)}", "password": PASSWORD}}, args.iterations),
+        ("condomino_estado_cuenta", "GET", lambda: "/condomino/estado_cuenta", lambda: {"headers": condomino_headers()}, args.iterations),
+        ("admin_estado_cuenta", "GET", lambda: f"/admin/estado-cuenta/{sample.randint(1, houses)}", lambda: {"headers": admin}, args.iterations),
+        ("admin_semaforo", "GET", lambda: "/admin/semaforo", lambda: {"headers": admin}, args.iterations),
+        ("actualizar_semaforo", "POST", lambda: "/admin/actualizar_semaforo", lambda: {"headers": admin}, args.write_iterations),
+        ("alicuotas", "POST", lambda: "/admin/alicuotas", lambda: {"headers": admin, "json": {"MES_PERIODO": periodo}}, args.write_iterations),
+    ]
+
+    results: Dict[str, Any] = {}
+    try:
+        with TestClient(app) as client:
+            for name, method, path, kwargs, iterations in scenarios:
+                latencies: List[float] = []
+                errors: Dict[str, int] = {}
+                calls_before = emulator.calls() if emulator else None
+                for _ in range(iterations):
+                    start = time.perf_counter()
+                    response = client.request(method, path(), **kwargs())
+                    latencies.append((time.perf_counter() - start) * 1000)
+                    if response.status_code >= 400:
+                        errors[str(response.status_code)] = errors.get(str(response.status_code), 0) + 1
+                calls = (emulator.calls() - calls_before) / iterations if emulator else None
+
+                # Pico de memoria: una solicitud adicional bajo tracemalloc (fuera de la medición de latencia)
+                tracemalloc.start()
+                client.request(method, path(), **kwargs())
+                _, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+
+                results[name] = {
+                    "iteraciones": iterations,
+                    "primera_ms": round(latencies[0], 2),
+                    **_percentiles(latencies),
+                    "llamadas_backend_por_solicitud": round(calls, 2) if calls is not None else None,
+                    "pico_memoria_kb": round(peak / 1024, 1),
+                    "errores": errors,
+                }
+                print(f"[INFO] {houses} casas | {name}: p50 {results[name]['p50_ms']} ms", file=sys.stderr)
+    finally:
+        if emulator:
+            emulator.stop()
+        if sqlite_dir:
+            sqlite_dir.cleanup()
+    return results
+
+
+# ----------------------------------------------------------------------
+# --- ORQUESTADOR ---
+# ----------------------------------------------------------------------
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Benchmark de endpoints del backend del condominio")
+    parser.add_argument("--houses", type=int, nargs="+", default=SCALES, help="Escalas (número de casas)")
+    parser.add_argument("--iterations", type=int, default=30, help="Solicitudes por endpoint de lectura")
+    parser.add_argument("--write-iterations", type=int, default=3, help="Solicitudes por endpoint de escritura masiva")
+    parser.add_argument("--months", type=int, default=6, help="Meses de alícuotas por casa")
+    parser.add_argument("--backend", choices=["emulador", "sqlite"], default="emulador")
+    parser.add_argument("--latency-ms", type=float, default=0.0, help="Latencia artificial del emulador por llamada")
+    parser.add_argument("--cache-ttl", type=float, default=30.0, help="SHEETS_CACHE_TTL durante la medición")
+    parser.add_argument("--output", default=os.path.join(ROOT, "benchmarks", "resultados.json"))
+    parser.add_argument("--single", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--result-file", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = parse_args(argv)
+    if args.single is not None:
+        results = run_scale(args.single, args)
+        with open(args.result_file, "w", encoding="utf-8") as f:
+            json.dump(results, f)
+        return
+
+    report: Dict[str, Any] = {
+        "fecha": datetime.now().isoformat(timespec="seconds"),
+        "commit": _git_commit(),
+        "python": platform.python_version(),
+        "parametros": {k: v for k, v in vars(args).items() if k not in ("single", "result_file", "output")},
+        "escalas": {},
+    }
+    forwarded = [
+        "--iterations", str(args.iterations), "--write-iterations", str(args.write_iterations),
+        "--months", str(args.months), "--backend", args.backend,
+        "--latency-ms", str(args.latency_ms), "--cache-ttl", str(args.cache_ttl),
+    ]
+    for houses in args.houses:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as tmp:
+            result_file = tmp.name
+        try:
+            subprocess.run(
+                [sys.executable, "-m", "benchmarks.bench_endpoints", "--single", str(houses),
+                 "--result-file", result_file, *forwarded],
+                cwd=ROOT, check=True, stdout=subprocess.DEVNULL,
+            )
+            with open(result_file, encoding="utf-8") as f:
+                report["escalas"][str(houses)] = json.load(f)
+        finally:
+            os.unlink(result_file)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"[INFO] Resultados guardados en '{args.output}'.")
+
+
+if __name__ == "__main__":
+    main()
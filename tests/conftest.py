@@ -0,0 +1,29 @@
+import pytest
+
+from API.backend_api.sqlite_service import SQLiteService
+from API.backend_api.storage import SheetTable
+from tests.helpers import libro_condominio
+
+
+@pytest.fixture
+def storage(tmp_path):
+    """Motor SQLite en un archivo temporal, cargado con libro_condominio()."""
+    service = SQLiteService(str(tmp_path / "condominio.db"))
+    service.load_tables({title: SheetTable(title, rows) for title, rows in libro_condominio().items()})
+    return service
+
+
+@pytest.fixture
+def client(storage):
+    """TestClient de la API con `storage` como almacenamiento (sin Google Sheets)."""
+    from fastapi.testclient import TestClient
+    from API.backend_api.main import app, get_sheets_service
+
+    async def override():
+        yield storage
+
+    app.dependency_overrides[get_sheets_service] = override
+    try:
+        yield TestClient(app)
+    finally:
+        app.dependency_overrides.pop(get_sheets_service, None)
@@ -0,0 +1,63 @@
+import random
+from typing import Dict, List, Optional
+
+from API.backend_api.sheet_schema import SHEET_COLUMNS
+from API.backend_api.storage import SheetTable
+
+MOVIMIENTOS_HEADER = list(SHEET_COLUMNS['MOVIMIENTOS'])
+
+
+def movimiento(id_mov: str, casa, tipo: str, monto, vencimiento: str = "", registro: str = "2024-11-01 08:00",
+               concepto: Optional[str] = None) -> List[str]:
+    """Fila de MOVIMIENTOS en texto, como la devuelve la API (orden de SHEET_COLUMNS)."""
+    return [
+        id_mov, str(casa), "2024-11", tipo, concepto or f"{tipo} {id_mov}", str(monto),
+        vencimiento, "Efectivo" if tipo == 'PAGO' else "", registro, "",
+    ]
+
+
+def tabla_movimientos(rows: List[List[str]]) -> SheetTable:
+    return SheetTable('MOVIMIENTOS', [list(MOVIMIENTOS_HEADER)] + rows)
+
+
+def movimientos_aleatorios(n: int, seed: int) -> List[List[str]]:
+    """Movimientos variados: vencimientos vacíos o inválidos, saldos negativos, casas no numéricas."""
+    rng = random.Random(seed)
+    vencimientos = ["2024-10-05", "2024-11-05", "2024-12-05", "2024-12-19", "", "no-es-fecha"]
+    rows = []
+    for i in range(n):
+        casa = rng.choice([1, 2, 3, 4, 5, 6, "x", ""])
+        tipo = rng.choice(["ALICUOTA", "ALICUOTA", "PAGO", "MULTA", "GASTO"])
+        monto = rng.choice([50, 45.5, 0, -10]) if tipo == "ALICUOTA" else rng.choice([-120, -50, 10, 12.75])
+        rows.append(movimiento(f"M{i:04d}", casa, tipo, monto, rng.choice(vencimientos)))
+    return rows
+
+
+def libro_condominio() -> Dict[str, List[List[str]]]:
+    """Libro pequeño: Administración (casa 0) y dos casas; la casa 1 debe una alícuota ya consolidada."""
+    return {
+        'USUARIOS': [
+            list(SHEET_COLUMNS['USUARIOS']),
+            ["0990000000", "0", "Administración", "admin@condominio.ec", "0990000000", "ADMIN", "x", "ACTIVO"],
+            ["1700000001", "1", "Condómino 1", "casa1@condominio.ec", "0990000001", "CONDOMINO", "x", "ACTIVO"],
+            ["1700000002", "2", "Condómino 2", "casa2@condominio.ec", "0990000002", "CONDOMINO", "x", "ACTIVO"],
+        ],
+        'MOVIMIENTOS': [
+            list(MOVIMIENTOS_HEADER),
+            movimiento("M0001", 1, "ALICUOTA", 50, "2024-11-05"),
+            movimiento("M0002", 2, "ALICUOTA", 50, "2024-11-05"),
+            movimiento("M0003", 2, "PAGO", -50),
+        ],
+        'ALERTAS_SEMAFORO': [
+            list(SHEET_COLUMNS['ALERTAS_SEMAFORO']),
+            ["1", "50.00", "20", "AMARILLO", "1", "2024-11-25 06:00"],
+            ["2", "0.00", "0", "VERDE", "0", "2024-11-25 06:00"],
+        ],
+        'CONFIGURACION': [list(SHEET_COLUMNS['CONFIGURACION']), ["VALOR_ALICUOTA", "50.00"], ["DIA_VENCIMIENTO", "5"]],
+    }
+
+
+def token(id_casa: int, rol: str) -> Dict[str, str]:
+    """Cabecera Authorization con un token válido para la casa y el rol indicados."""
+    from API.backend_api.security import create_access_token
+    return {"Authorization": "Bearer " + create_access_token({"sub": str(id_casa), "ID_CASA": id_casa, "ROL": rol})}
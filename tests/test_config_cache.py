@@ -0,0 +1,75 @@
+from types import SimpleNamespace
+
+import pytest
+
+from API.backend_api import config_cache
+from API.backend_api.config_cache import ConfigCache, DEFAULT_CONFIG
+from API.backend_api.sheet_schema import SHEET_COLUMNS
+from API.backend_api.storage import SheetTable
+
+
+def configuracion(**valores) -> SheetTable:
+    rows = [list(SHEET_COLUMNS['CONFIGURACION'])] + [[clave, valor] for clave, valor in valores.items()]
+    return SheetTable('CONFIGURACION', rows)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Reloj manual para config_cache (segundos en clock.now)."""
+    clock = SimpleNamespace(now=1000.0)
+    monkeypatch.setattr(config_cache, "time", SimpleNamespace(monotonic=lambda: clock.now))
+    return clock
+
+
+@pytest.fixture
+def cache(clock):
+    return ConfigCache(ttl=300, retry_interval=30)
+
+
+def test_fresh_within_ttl(cache, clock):
+    assert cache.fresh() is None
+    config = cache.update(configuracion(VALOR_ALICUOTA="60.00", DIA_VENCIMIENTO="10"))
+    assert (config.VALOR_ALICUOTA, config.DIA_VENCIMIENTO, config.origen) == (60.0, 10, "hoja")
+
+    clock.now += 299
+    assert cache.fresh() is config
+    clock.now += 2
+    assert cache.fresh() is None
+
+
+def test_unchanged_sheet_is_not_revalidated(cache):
+    first = cache.update(configuracion(VALOR_ALICUOTA="60.00"))
+    second = cache.update(configuracion(VALOR_ALICUOTA="60.00"))
+    assert second is first
+    assert (cache.checks, cache.reloads) == (2, 1)
+
+
+def test_invalid_sheet_keeps_last_valid_until_retry(cache, clock):
+    valid = cache.update(configuracion(VALOR_ALICUOTA="60.00"))
+    clock.now += 301
+
+    assert cache.update(configuracion(VALOR_ALICUOTA="-1")) is valid
+    assert cache.errors == 1 and "VALOR_ALICUOTA" in cache.last_error
+    # No se vuelve a leer la hoja inválida en cada solicitud
+    assert cache.fresh() is valid
+    clock.now += 31
+    assert cache.fresh() is None
+
+    fixed = cache.update(configuracion(VALOR_ALICUOTA="70.00"))
+    assert fixed.VALOR_ALICUOTA == 70.0 and cache.last_error is None
+    assert cache.fresh() is fixed
+
+
+def test_read_error_without_valid_config_uses_defaults(cache, clock):
+    assert cache.fail(ConnectionError("sin conexión")) is DEFAULT_CONFIG
+    assert cache.fresh() is DEFAULT_CONFIG
+    clock.now += 31
+    assert cache.fresh() is None
+
+
+def test_ttl_zero_always_reads(clock):
+    cache = ConfigCache(ttl=0, retry_interval=30)
+    cache.update(configuracion(VALOR_ALICUOTA="60.00"))
+    assert cache.fresh() is None
+    cache.fail("error")
+    assert cache.fresh() is None
@@ -0,0 +1,74 @@
+from datetime import date
+
+import pytest
+
+from API.backend_api import ledger
+from API.backend_api.ledger import _consolidar_python, consolidar_semaforo
+from tests.helpers import movimiento, movimientos_aleatorios, tabla_movimientos as tabla
+
+HOY = date(2024, 12, 20)
+
+
+requires_numpy = pytest.mark.skipif(ledger.np is None, reason="NumPy no está instalado")
+
+
+def consolidar_numpy(table, casa_ids):
+    return ledger._consolidar_numpy(ledger.ledger_columns(table), casa_ids, HOY)
+
+
+@requires_numpy
+@pytest.mark.parametrize("seed", range(5))
+def test_numpy_matches_python(seed):
+    table = tabla(movimientos_aleatorios(300, seed))
+    casa_ids = [5, 1, 2, 3, 4, 6, 7] # 7 sin movimientos; orden distinto al de la hoja
+    assert consolidar_numpy(table, casa_ids) == _consolidar_python(table.records(), casa_ids, HOY)
+
+
+@requires_numpy
+def test_empty_or_invalid_due_date_counts_as_oldest():
+    table = tabla([
+        movimiento("M0001", 1, "ALICUOTA", 50, "2024-10-05"),
+        movimiento("M0002", 1, "ALICUOTA", 50, ""),
+        movimiento("M0003", 2, "ALICUOTA", 50, "no-es-fecha"),
+        movimiento("M0004", 3, "ALICUOTA", 50, "2024-11-05"),
+    ])
+    esperado = _consolidar_python(table.records(), [1, 2, 3], HOY)
+    assert consolidar_numpy(table, [1, 2, 3]) == esperado
+    # Cargo más antiguo sin fecha (NaT): saldo pendiente pero sin días de atraso
+    assert [r['DIAS_ATRASO'] for r in esperado] == [0, 0, 45]
+    assert [r['ESTADO_SEMAFORO'] for r in esperado] == ['VERDE', 'VERDE', 'ROJO']
+    assert esperado[0]['CUOTAS_PENDIENTES'] == 2
+
+
+@requires_numpy
+def test_negative_balance_has_no_arrears():
+    table = tabla([
+        movimiento("M0001", 1, "ALICUOTA", 50, "2024-10-05"),
+        movimiento("M0002", 1, "PAGO", -80),
+        movimiento("M0003", 2, "PAGO", -10),
+    ])
+    esperado = _consolidar_python(table.records(), [1, 2], HOY)
+    assert consolidar_numpy(table, [1, 2]) == esperado
+    assert esperado == [
+        {'ID_CASA': 1, 'DIAS_ATRASO': 0, 'SALDO': -30.0, 'ESTADO_SEMAFORO': 'VERDE', 'CUOTAS_PENDIENTES': 0},
+        {'ID_CASA': 2, 'DIAS_ATRASO': 0, 'SALDO': -10.0, 'ESTADO_SEMAFORO': 'VERDE', 'CUOTAS_PENDIENTES': 0},
+    ]
+
+
+@requires_numpy
+def test_columns_extend_after_appends():
+    rows = movimientos_aleatorios(200, 7)
+    table = tabla(rows[:150])
+    columns = ledger.ledger_columns(table)
+    assert columns.rows == 150
+    for row in rows[150:]:
+        table.append_row(row)
+
+    assert ledger.ledger_columns(table) is columns # Se extienden las mismas columnas
+    assert columns.rows == 200
+    casa_ids = [1, 2, 3, 4, 5, 6]
+    assert consolidar_numpy(table, casa_ids) == _consolidar_python(table.records(), casa_ids, HOY)
+
+
+def test_consolidar_semaforo_without_casas():
+    assert consolidar_semaforo(tabla([]), [], HOY) == []
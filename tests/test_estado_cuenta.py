@@ -0,0 +1,34 @@
+from tests.helpers import token
+
+ADMIN = token(0, "ADMIN")
+
+
+def saldos(client, id_casa):
+    admin = client.get(f"/admin/estado-cuenta/{id_casa}", headers=ADMIN)
+    condomino = client.get("/condomino/estado_cuenta", headers=token(id_casa, "CONDOMINO"))
+    assert admin.status_code == 200 and condomino.status_code == 200
+    admin = admin.json()
+    return admin["saldo_pendiente"], admin["semaforo_actual"]["SALDO"], condomino.json()["saldo_pendiente"]
+
+
+def test_admin_statement_reads_balance_from_projection(client):
+    assert saldos(client, 1) == (50.0, 50.0, 50.0)
+    # Los demás campos del semáforo vienen de la última consolidación
+    semaforo = client.get("/admin/estado-cuenta/1", headers=ADMIN).json()["semaforo_actual"]
+    assert (semaforo["ESTADO_SEMAFORO"], semaforo["DIAS_ATRASO"], semaforo["CUOTAS_PENDIENTES"]) == ("AMARILLO", 20, 1)
+
+
+def test_admin_statement_changes_after_pago(client):
+    r = client.post("/admin/pagos", headers=ADMIN, json={"ID_CASA": 1, "MONTO": 20, "CONCEPTO": "Abono", "TIPO_PAGO": "Efectivo"})
+    assert r.status_code == 200, r.text
+
+    assert saldos(client, 1) == (30.0, 30.0, 30.0)
+    respuesta = client.get("/admin/estado-cuenta/1", headers=ADMIN).json()
+    assert respuesta["ultimo_pago"]["ID_MOVIMIENTO"] == r.json()["ID_MOVIMIENTO"]
+    assert len(respuesta["movimientos"]) == 2
+
+
+def test_treasury_statement(client):
+    r = client.get("/admin/estado-cuenta/0", headers=ADMIN)
+    assert r.status_code == 200
+    assert r.json()["semaforo_actual"]["ESTADO_SEMAFORO"] == "N/A"
@@ -0,0 +1,51 @@
+from datetime import date
+
+from API.backend_api.ledger import LedgerProjection
+from tests.helpers import movimiento, movimientos_aleatorios, tabla_movimientos as tabla
+
+HOY = date(2024, 12, 20)
+
+
+def resumen(casa_ledger):
+    return (
+        round(casa_ledger.saldo, 2), casa_ledger.movimientos, casa_ledger.cuotas_pendientes,
+        casa_ledger.ultimo_pago.id_movimiento if casa_ledger.ultimo_pago else None,
+        casa_ledger.cargo_mas_antiguo.id_movimiento if casa_ledger.cargo_mas_antiguo else None,
+    )
+
+
+def test_projection_after_appends_matches_rebuild():
+    rows = movimientos_aleatorios(250, 11)
+    table = tabla(rows[:100])
+    projection = table.ledger()
+    for row in rows[100:]:
+        table.append_row(row)
+
+    assert table.ledger() is projection # Actualizada en O(1) por fila, sin reconstruir
+    assert projection.movimientos == 250
+    rebuilt = LedgerProjection(table.records())
+    for casa in [1, 2, 3, 4, 5, 6, None, 99]:
+        assert resumen(projection.get(casa)) == resumen(rebuilt.get(casa))
+        assert projection.get(casa).semaforo(casa or 0, HOY) == rebuilt.get(casa).semaforo(casa or 0, HOY)
+
+
+def test_projection_tracks_last_payment_and_oldest_charge():
+    table = tabla([movimiento("M0001", 1, "ALICUOTA", 50, "2024-11-05")])
+    projection = table.ledger()
+    table.append_row(movimiento("M0002", 1, "ALICUOTA", 50, "2024-10-05"))
+    table.append_row(movimiento("M0003", 1, "PAGO", -30))
+    table.append_row(movimiento("M0004", 1, "PAGO", -20))
+
+    casa = projection.get(1)
+    assert resumen(casa) == (50.0, 4, 2, "M0004", "M0002")
+    assert casa.dias_atraso(HOY) == 76
+    assert projection.get(2).movimientos == 0 # Casa sin movimientos
+
+
+def test_projection_rebuilt_after_truncate():
+    table = tabla([movimiento("M0001", 1, "ALICUOTA", 50), movimiento("M0002", 1, "PAGO", -50)])
+    before = table.ledger()
+    table.truncate(1)
+    after = table.ledger()
+    assert after is not before
+    assert after.get(1).saldo == 50.0
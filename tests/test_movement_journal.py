@@ -0,0 +1,94 @@
+import json
+import os
+
+import pytest
+
+from API.backend_api.movement_journal import MovementJournal, JournalFlusher
+from tests.helpers import movimiento
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "movimientos.jsonl")
+
+
+def journal_rows(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line)['row'] for line in f if line.strip()]
+
+
+def test_pending_rows_are_replayed_after_restart(path):
+    rows = [movimiento(f"M{i:04d}", 1, "PAGO", -10, concepto="Pago en línea ñ") for i in range(3)]
+    journal = MovementJournal(path)
+    journal.append(rows[:2])
+    journal.append(rows[2:])
+
+    assert MovementJournal(path).pending() == rows
+
+
+def test_truncated_last_line_is_discarded(path):
+    rows = [movimiento("M0001", 1, "PAGO", -10), movimiento("M0002", 2, "MULTA", 5)]
+    MovementJournal(path).append(rows)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write('{"row": ["M0003", "1"') # Caída a mitad de una escritura
+
+    assert MovementJournal(path).pending() == rows
+
+
+def test_mark_flushed_rewrites_remaining_rows(path):
+    rows = [movimiento(f"M{i:04d}", 1, "PAGO", -10) for i in range(5)]
+    journal = MovementJournal(path)
+    journal.append(rows)
+
+    journal.mark_flushed(3)
+
+    assert journal.pending() == rows[3:]
+    assert journal_rows(path) == rows[3:]
+    assert not os.path.exists(path + ".tmp")
+    assert MovementJournal(path).pending() == rows[3:]
+
+    journal.mark_flushed(2)
+    assert journal.pending() == []
+    assert journal_rows(path) == []
+
+
+def test_append_after_mark_flushed_keeps_order(path):
+    rows = [movimiento(f"M{i:04d}", 1, "PAGO", -10) for i in range(4)]
+    journal = MovementJournal(path)
+    journal.append(rows[:2])
+    journal.mark_flushed(1)
+    journal.append(rows[2:])
+
+    assert MovementJournal(path).pending() == rows[1:]
+
+
+def test_flush_writes_batches_in_order(path):
+    rows = [movimiento(f"M{i:04d}", 1, "PAGO", -10) for i in range(5)]
+    journal = MovementJournal(path)
+    journal.append(rows)
+    batches = []
+    flusher = JournalFlusher(journal, batches.append, batch_size=2)
+
+    assert flusher.flush() == 5
+    assert batches == [rows[:2], rows[2:4], rows[4:]]
+    assert journal.pending() == []
+    assert journal_rows(path) == []
+
+
+def test_failed_flush_keeps_unwritten_rows(path):
+    rows = [movimiento(f"M{i:04d}", 1, "PAGO", -10) for i in range(4)]
+    journal = MovementJournal(path)
+    journal.append(rows)
+    written = []
+
+    def flush_batch(batch):
+        if written:
+            raise RuntimeError("429 Too Many Requests")
+        written.extend(batch)
+
+    flusher = JournalFlusher(journal, flush_batch, batch_size=2)
+    with pytest.raises(RuntimeError):
+        flusher.flush()
+
+    assert written == rows[:2]
+    assert MovementJournal(path).pending() == rows[2:]
@@ -0,0 +1,55 @@
+import pytest
+
+from API.backend_api.movement_store import MovementDecoder
+from API.backend_api.sheet_schema import decimal
+from tests.helpers import MOVIMIENTOS_HEADER, movimiento
+
+
+@pytest.mark.parametrize("value, expected", [
+    ("12,50", 12.5),
+    ("-50", -50.0),
+    ("1,234.50", 1234.5),
+    ("1.234,50", 1234.5),
+    ("-1,234,567.5", -1234567.5),
+    ("1.234.567", 1234567.0),
+    ("1,234", 1.234), # Un solo separador sin decimales: se mantiene como decimal
+])
+def test_decimal_accepts_thousands_separators(value, expected):
+    assert decimal(value) == expected
+
+
+@pytest.mark.parametrize("value", ["1.234.50", "1,2.5", "abc"])
+def test_decimal_rejects_malformed_numbers(value):
+    with pytest.raises(ValueError):
+        decimal(value)
+
+
+def test_decoder_reads_grouped_amount():
+    decoder = MovementDecoder(MOVIMIENTOS_HEADER)
+    assert decoder(movimiento("M0001", 1, "PAGO", "-1,234.50")).monto == -1234.5
+
+
+def test_decoder_warns_on_unparseable_amount(capsys):
+    decoder = MovementDecoder(MOVIMIENTOS_HEADER)
+    first = decoder(movimiento("M0001", 1, "PAGO", "1.234.50"))
+    second = decoder(movimiento("M0002", 2, "PAGO", "1.234.50"))
+
+    assert first.monto == 0.0 and second.monto == 0.0
+    out = capsys.readouterr().out
+    # Se avisa por cada movimiento, aunque la conversión salga de la caché
+    assert "M0001" in out and "M0002" in out
+
+
+def test_decoder_shares_categorical_strings():
+    def row(id_mov, monto):
+        # Cadenas nuevas por fila, como las que llegan de la API (no literales ya internados)
+        return [value[:1] + value[1:] if value else value for value in movimiento(id_mov, 1, "PAGO", monto)]
+
+    decoder = MovementDecoder(MOVIMIENTOS_HEADER)
+    rows = [row("M0001", -10), row("M0002", -20)]
+    assert rows[0][7] is not rows[1][7]
+    a, b = decoder(rows[0]), decoder(rows[1])
+
+    assert a.tipo_movimiento is b.tipo_movimiento
+    assert a.tipo_pago is b.tipo_pago
+    assert a.mes_periodo is b.mes_periodo
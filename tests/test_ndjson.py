@@ -0,0 +1,84 @@
+import json
+
+from pydantic import BaseModel
+
+from API.backend_api import main
+from tests.helpers import token
+
+NDJSON = {"Accept": main.NDJSON_MEDIA_TYPE}
+
+
+def ndjson_lines(response):
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith(main.NDJSON_MEDIA_TYPE)
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+def test_condomino_statement_stream_matches_json(client):
+    headers = token(2, "CONDOMINO")
+    completa = client.get("/condomino/estado_cuenta", headers=headers).json()
+    cabecera, *movimientos = ndjson_lines(client.get("/condomino/estado_cuenta", headers={**headers, **NDJSON}))
+
+    assert "movimientos" not in cabecera
+    assert cabecera == {k: v for k, v in completa.items() if k != "movimientos"}
+    assert movimientos == completa["movimientos"]
+    assert [m["ID_MOVIMIENTO"] for m in movimientos] == ["M0002", "M0003"]
+
+
+def test_admin_statement_stream_matches_json(client):
+    headers = token(0, "ADMIN")
+    completa = client.get("/admin/estado-cuenta/1", headers=headers).json()
+    cabecera, *movimientos = ndjson_lines(client.get("/admin/estado-cuenta/1", headers={**headers, **NDJSON}))
+
+    assert cabecera == {k: v for k, v in completa.items() if k != "movimientos"}
+    assert movimientos == completa["movimientos"]
+
+
+def test_semaforo_list_stream_matches_json(client):
+    headers = token(0, "ADMIN")
+    completa = client.get("/admin/semaforo", headers=headers).json()
+    cabecera, *casas = ndjson_lines(client.get("/admin/semaforo", headers={**headers, **NDJSON}))
+
+    assert cabecera["status"] == "success" and "results" not in cabecera
+    assert casas == completa["results"]
+    assert len(casas) == 2
+
+
+class Item(BaseModel):
+    n: int
+
+
+class Header(BaseModel):
+    status: str
+    items: list
+
+
+def test_chunks_group_lines_and_send_header_first(monkeypatch):
+    monkeypatch.setattr(main, "NDJSON_CHUNK_BYTES", 20)
+    consumed = []
+
+    def items():
+        for n in range(10):
+            consumed.append(n)
+            yield Item(n=n)
+
+    chunks = main._ndjson_chunks(Header(status="success", items=[]), "items", items())
+    assert next(chunks) == b'{"status":"success"}\n'
+    assert consumed == [] # La cabecera no espera a ningún registro
+
+    rest = list(chunks)
+    assert 1 < len(rest) < 10
+    assert [json.loads(line)["n"] for line in b"".join(rest).splitlines()] == list(range(10))
+
+
+def test_error_while_streaming_is_reported_as_last_line():
+    def items():
+        yield Item(n=1)
+        raise RuntimeError("hoja inconsistente")
+
+    lines = b"".join(main._ndjson_chunks(Header(status="success", items=[]), "items", items())).splitlines()
+    assert [json.loads(line) for line in lines] == [
+        {"status": "success"},
+        {"n": 1},
+        {"status": "error", "detail": "Respuesta interrumpida por un error interno."},
+    ]
@@ -0,0 +1,97 @@
+from types import SimpleNamespace
+
+import pytest
+
+from API.backend_api.quota import RequestScheduler, TokenBucket, is_idempotent
+
+SHEET = "https://sheets.googleapis.com/v4/spreadsheets/abc123"
+
+
+@pytest.mark.parametrize("method, url, expected", [
+    ("GET", f"{SHEET}/values/MOVIMIENTOS", True),
+    ("PUT", f"{SHEET}/values/ALERTAS_SEMAFORO!A2:F2?valueInputOption=USER_ENTERED", True),
+    ("POST", f"{SHEET}/values:batchUpdate", True),
+    ("POST", f"{SHEET}/values:batchGet?ranges=A1", True),
+    ("POST", f"{SHEET}/values/MOVIMIENTOS:append?valueInputOption=USER_ENTERED", False),
+    # spreadsheets.batchUpdate puede añadir hojas o filas: no se repite ante un 5xx
+    ("POST", f"{SHEET}:batchUpdate", False),
+])
+def test_is_idempotent(method, url, expected):
+    assert is_idempotent(method, url) is expected
+
+
+def responses(*statuses):
+    """do_request que entrega respuestas con los estados indicados, en orden; cuenta los intentos."""
+    pending = list(statuses)
+    calls = []
+
+    def do_request():
+        calls.append(1)
+        return SimpleNamespace(status_code=pending.pop(0), headers={})
+    return do_request, calls
+
+
+@pytest.fixture
+def scheduler():
+    return RequestScheduler(quota_per_minute=0, burst=1, max_retries=3, backoff_max=0.001)
+
+
+def test_retries_429_until_success(scheduler):
+    do_request, calls = responses(429, 429, 200)
+    assert scheduler.send(do_request, idempotent=False).status_code == 200
+    assert len(calls) == 3
+    assert scheduler.stats()["reintentos"] == 2
+
+
+def test_server_error_is_retried_only_when_idempotent(scheduler):
+    do_request, calls = responses(503, 200)
+    assert scheduler.send(do_request, idempotent=True).status_code == 200
+    assert len(calls) == 2
+
+    do_request, calls = responses(503, 200)
+    assert scheduler.send(do_request, idempotent=False).status_code == 503
+    assert len(calls) == 1
+
+
+def test_exhausted_retries_return_last_response(scheduler):
+    do_request, calls = responses(429, 429, 429, 429)
+    assert scheduler.send(do_request, idempotent=True).status_code == 429
+    assert len(calls) == 4
+    assert scheduler.stats()["reintentos_agotados"] == 1
+
+
+def test_transport_errors_are_retried_only_when_idempotent(scheduler):
+    attempts = []
+
+    def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionResetError("conexión reiniciada")
+        return SimpleNamespace(status_code=200, headers={})
+
+    assert scheduler.send(flaky, idempotent=True, transport_errors=(ConnectionResetError,)).status_code == 200
+    assert len(attempts) == 2
+
+    attempts.clear()
+    with pytest.raises(ConnectionResetError):
+        scheduler.send(flaky, idempotent=False, transport_errors=(ConnectionResetError,))
+    assert len(attempts) == 1
+
+
+@pytest.mark.anyio
+async def test_async_send_retries(scheduler):
+    statuses = [500, 200]
+
+    async def do_request():
+        return SimpleNamespace(status_code=statuses.pop(0), headers={})
+
+    assert (await scheduler.asend(do_request, idempotent=True)).status_code == 200
+    assert scheduler.stats()["reintentos"] == 1
+
+
+def test_token_bucket_spaces_requests_after_burst():
+    bucket = TokenBucket(rate_per_minute=60, capacity=2)
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == 0.0
+    assert bucket.reserve() == pytest.approx(1.0, abs=0.05)
+    assert TokenBucket(rate_per_minute=0, capacity=1).reserve() == 0.0
@@ -0,0 +1,181 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from API.backend_api import sheets_service
+from API.backend_api.async_sheets_service import AsyncSheetsService
+from API.backend_api.single_flight import SingleFlight
+from API.backend_api.storage import SheetTable
+from tests.helpers import libro_condominio
+
+
+def lead_read(flights, key, value, started=None, release=None):
+    """Lectura líder en un hilo: reclama la clave, espera `release` y entrega `value`."""
+    lead, follow = flights.claim([key])
+    assert key in lead and not follow
+    if started:
+        started.set()
+    if release:
+        release.wait(5)
+    flights.finish(lead, {key: value})
+
+
+def test_threads_share_one_read():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    leader = threading.Thread(target=lead_read, args=(flights, 'MOVIMIENTOS', "tabla", started, release))
+    leader.start()
+    started.wait(5)
+
+    results = []
+
+    def follower():
+        lead, follow = flights.claim(['MOVIMIENTOS'])
+        assert not lead
+        results.append(flights.wait(follow['MOVIMIENTOS']))
+
+    followers = [threading.Thread(target=follower) for _ in range(4)]
+    for thread in followers:
+        thread.start()
+    time.sleep(0.05)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert results == ["tabla"] * 4
+    assert flights.stats() == {"lecturas_lider": 1, "lecturas_compartidas": 4, "en_curso": 0}
+
+
+def test_leader_error_reaches_waiters():
+    flights = SingleFlight()
+    lead, _ = flights.claim(['USUARIOS'])
+    _, follow = flights.claim(['USUARIOS'])
+    flights.finish(lead, {}, RuntimeError("429"))
+
+    with pytest.raises(RuntimeError):
+        flights.wait(follow['USUARIOS'])
+    # La clave se libera: la siguiente solicitud vuelve a leer
+    assert 'USUARIOS' in flights.claim(['USUARIOS'])[0]
+
+
+def test_coroutines_share_one_read():
+    flights = SingleFlight()
+
+    async def main():
+        lead, _ = flights.claim(['MOVIMIENTOS'], blocking=False)
+        waiters = []
+        for _ in range(3):
+            _, follow = flights.claim(['MOVIMIENTOS'], blocking=False)
+            waiters.append(asyncio.ensure_future(flights.await_(follow['MOVIMIENTOS'])))
+        await asyncio.sleep(0)
+        flights.finish(lead, {'MOVIMIENTOS': "tabla"})
+        return await asyncio.gather(*waiters)
+
+    assert asyncio.run(main()) == ["tabla"] * 3
+
+
+def test_coroutine_waits_for_thread_read():
+    flights = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    leader = threading.Thread(target=lead_read, args=(flights, 'MOVIMIENTOS', "tabla", started, release))
+    leader.start()
+    started.wait(5)
+
+    async def main():
+        lead, follow = flights.claim(['MOVIMIENTOS'], blocking=False)
+        assert not lead
+        waiter = asyncio.ensure_future(flights.await_(follow['MOVIMIENTOS']))
+        await asyncio.sleep(0.02)
+        assert not waiter.done() # El event loop sigue libre mientras espera
+        release.set()
+        return await asyncio.wait_for(waiter, 5)
+
+    assert asyncio.run(main()) == "tabla"
+    leader.join(5)
+
+
+def test_thread_waits_for_coroutine_read():
+    flights = SingleFlight()
+    results = []
+
+    async def main():
+        lead, _ = flights.claim(['MOVIMIENTOS'], blocking=False)
+
+        def follower():
+            _, follow = flights.claim(['MOVIMIENTOS'])
+            results.append(flights.wait(follow['MOVIMIENTOS']))
+
+        thread = threading.Thread(target=follower)
+        thread.start()
+        await asyncio.sleep(0.02)
+        flights.finish(lead, {'MOVIMIENTOS': "tabla"})
+        await asyncio.to_thread(thread.join, 5)
+
+    asyncio.run(main())
+    assert results == ["tabla"]
+
+
+def test_blocking_claim_on_loop_thread_does_not_wait_for_coroutine():
+    flights = SingleFlight()
+
+    async def main():
+        lead, _ = flights.claim(['MOVIMIENTOS'], blocking=False)
+        # Llamada síncrona desde el mismo event loop: esperar a la corrutina lo bloquearía
+        own, follow = flights.claim(['MOVIMIENTOS'])
+        assert 'MOVIMIENTOS' in own and not follow
+        flights.finish(own, {'MOVIMIENTOS': "propia"})
+        assert flights.stats()["en_curso"] == 1 # La lectura de la corrutina sigue registrada
+        flights.finish(lead, {'MOVIMIENTOS': "tabla"})
+
+    asyncio.run(main())
+    assert flights.stats()["en_curso"] == 0
+
+
+def test_flight_of_closed_loop_is_replaced():
+    flights = SingleFlight()
+
+    async def abandoned():
+        flights.claim(['MOVIMIENTOS'], blocking=False) # El líder nunca termina
+
+    asyncio.run(abandoned())
+    lead, follow = flights.claim(['MOVIMIENTOS'])
+    assert 'MOVIMIENTOS' in lead and not follow
+
+
+def test_sync_and_async_reads_share_the_registry(monkeypatch):
+    monkeypatch.setattr(sheets_service, "MOVEMENTS_JOURNAL_PATH", "")
+    monkeypatch.setattr(sheets_service, "SHEETS_SNAPSHOT_PATH", "")
+    monkeypatch.setattr(sheets_service, "SHEETS_CACHE_TTL", 30.0)
+    service = AsyncSheetsService()
+    started, release = threading.Event(), threading.Event()
+    reads = []
+
+    def read_tables(full, tail):
+        reads.append("sync")
+        started.set()
+        release.wait(5)
+        return {title: SheetTable(title, libro_condominio()[title]) for title in full}
+
+    async def aread_tables(full, tail):
+        reads.append("async")
+        return {title: SheetTable(title, libro_condominio()[title]) for title in full}
+
+    monkeypatch.setattr(service, "_read_tables", read_tables)
+    monkeypatch.setattr(service, "_aread_tables", aread_tables)
+
+    thread = threading.Thread(target=service.get_tables, args=(['MOVIMIENTOS'],))
+    thread.start()
+    started.wait(5)
+
+    async def main():
+        task = asyncio.ensure_future(service.aget_tables(['MOVIMIENTOS']))
+        await asyncio.sleep(0.02)
+        release.set()
+        return await asyncio.wait_for(task, 5)
+
+    tables = asyncio.run(main())
+    thread.join(5)
+    assert reads == ["sync"]
+    assert [row[0] for row in tables['MOVIMIENTOS'].rows] == ["M0001", "M0002", "M0003"]
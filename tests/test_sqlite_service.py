@@ -0,0 +1,86 @@
+import sqlite3
+
+import pytest
+
+from API.backend_api.sqlite_service import SQLiteService
+from API.backend_api.storage import SheetTable
+from tests.helpers import MOVIMIENTOS_HEADER, libro_condominio, movimiento
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "condominio.db")
+
+
+@pytest.fixture
+def service(path):
+    service = SQLiteService(path)
+    service.load_tables({title: SheetTable(title, rows) for title, rows in libro_condominio().items()})
+    return service
+
+
+def insert_external(path, row):
+    """Inserta una fila en MOVIMIENTOS desde otra conexión (como otro proceso)."""
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.execute(f'INSERT INTO "MOVIMIENTOS" VALUES ({", ".join("?" for _ in row)})', row)
+    conn.close()
+
+
+@pytest.fixture
+def statements(service):
+    """Sentencias SQL ejecutadas por la conexión del servicio."""
+    executed = []
+    service.ensure_connection().set_trace_callback(executed.append)
+    return executed
+
+
+def test_tables_are_reused_while_database_unchanged(service, statements):
+    first = service.get_table('MOVIMIENTOS')
+    assert service.get_table('MOVIMIENTOS') is first
+    assert sum('FROM "MOVIMIENTOS"' in sql for sql in statements) == 1
+
+
+def test_external_commit_invalidates_tables(service, path):
+    first = service.get_table('MOVIMIENTOS')
+    insert_external(path, movimiento("M0004", 1, "PAGO", -20))
+
+    second = service.get_table('MOVIMIENTOS')
+    assert second is not first
+    assert [row[0] for row in second.rows] == ["M0001", "M0002", "M0003", "M0004"]
+    assert service.stats()["data_version"] is not None
+
+
+def test_own_insert_is_applied_to_cached_table(service, statements):
+    table = service.get_table('MOVIMIENTOS')
+    service.append_movements([movimiento("M0004", 1, "PAGO", -20)])
+
+    assert service.get_table('MOVIMIENTOS') is table
+    assert table.ledger().get(1).saldo == 30.0
+    assert sum('FROM "MOVIMIENTOS"' in sql for sql in statements) == 1
+
+
+def test_reserved_ids_scan_movements_once(service, statements):
+    assert service.reserve_movement_ids(2) == ["M0004", "M0005"]
+    service.append_movements([movimiento(uid, 1, "PAGO", -1) for uid in ["M0004", "M0005"]])
+    assert service.reserve_movement_ids(1) == ["M0006"]
+
+    assert sum('MAX(' in sql for sql in statements) == 1
+
+
+def test_reserved_ids_follow_external_and_own_rows(service, path):
+    assert service.reserve_movement_ids(1) == ["M0004"]
+
+    insert_external(path, movimiento("M0100", 2, "PAGO", -5))
+    assert service.reserve_movement_ids(1) == ["M0101"]
+
+    # IDs insertados por este servicio fuera del asignador (p. ej. importados)
+    service.append_movements([movimiento("M0200", 2, "PAGO", -5)])
+    assert service.reserve_movement_ids(1) == ["M0201"]
+
+
+def test_load_tables_reseeds_ids(service):
+    service.reserve_movement_ids(1)
+    rows = [list(MOVIMIENTOS_HEADER), movimiento("M0500", 1, "PAGO", -1)]
+    service.load_tables({'MOVIMIENTOS': SheetTable('MOVIMIENTOS', rows)})
+    assert service.reserve_movement_ids(1) == ["M0501"]
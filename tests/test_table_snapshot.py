@@ -0,0 +1,106 @@
+import gzip
+import threading
+
+import pytest
+
+from API.backend_api import sheets_service
+from API.backend_api.sheets_service import SheetsService
+from API.backend_api.table_snapshot import TableSnapshot
+from tests.helpers import libro_condominio, movimiento
+
+SPREADSHEET_ID = "hoja-1"
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "hojas.json.gz")
+
+
+def new_service(monkeypatch, path) -> SheetsService:
+    monkeypatch.setattr(sheets_service, "MOVEMENTS_JOURNAL_PATH", "")
+    monkeypatch.setattr(sheets_service, "SHEETS_CACHE_TTL", 30.0)
+    monkeypatch.setattr(sheets_service, "SHEETS_SNAPSHOT_PATH", path)
+    service = SheetsService()
+    service._spreadsheet_id = SPREADSHEET_ID
+    return service
+
+
+def wait_for_saves():
+    for thread in threading.enumerate():
+        if thread.name == "table-snapshot":
+            thread.join()
+
+
+def test_save_and_load_round_trip(path):
+    tables = libro_condominio()
+    snapshot = TableSnapshot(path)
+    snapshot.save(SPREADSHEET_ID, "2024-11-25T06:00:00.000Z", tables)
+
+    data = TableSnapshot(path).load()
+    assert data["spreadsheet_id"] == SPREADSHEET_ID
+    assert data["modified_time"] == "2024-11-25T06:00:00.000Z"
+    assert data["tablas"] == tables
+    assert snapshot.saves == 1
+
+
+def test_damaged_snapshot_is_ignored(path):
+    with open(path, 'wb') as f:
+        f.write(gzip.compress(b'{"formato": 1, "tablas": '))
+    assert TableSnapshot(path).load() is None
+
+
+def test_claim_once_per_interval(path):
+    snapshot = TableSnapshot(path, interval=300)
+    assert snapshot.claim()
+    assert not snapshot.claim()
+
+
+def test_restores_tables_when_modified_time_matches(monkeypatch, path):
+    TableSnapshot(path).save(SPREADSHEET_ID, "v1", libro_condominio())
+    service = new_service(monkeypatch, path)
+
+    service._restore_snapshot(SPREADSHEET_ID, "v1")
+
+    assert service._snapshot.restored == "vigente"
+    assert [row[0] for row in service._tables['MOVIMIENTOS'].rows] == ["M0001", "M0002", "M0003"]
+    assert service._tables['MOVIMIENTOS'].ledger().get(1).saldo == 50.0
+
+
+def test_discards_snapshot_when_spreadsheet_changed(monkeypatch, path):
+    TableSnapshot(path).save(SPREADSHEET_ID, "v1", libro_condominio())
+    service = new_service(monkeypatch, path)
+
+    service._restore_snapshot(SPREADSHEET_ID, "v2")
+
+    assert service._snapshot.restored == "descartada"
+    assert service._tables == {}
+
+
+def test_saves_confirmed_rows_tagged_with_connect_version(monkeypatch, path):
+    service = new_service(monkeypatch, path)
+    service._restore_snapshot(SPREADSHEET_ID, "v1")
+    for title, rows in libro_condominio().items():
+        service._store_table(title, rows)
+    service._tables['MOVIMIENTOS'].append_row(movimiento("M0004", 1, "PAGO", -10), pending=True)
+
+    service._maybe_save_snapshot()
+    wait_for_saves()
+
+    data = TableSnapshot(path).load()
+    assert data["modified_time"] == "v1"
+    assert [row[0] for row in data["tablas"]['MOVIMIENTOS'][1:]] == ["M0001", "M0002", "M0003"]
+
+
+def test_no_snapshot_after_own_write(monkeypatch, path):
+    service = new_service(monkeypatch, path)
+    service._restore_snapshot(SPREADSHEET_ID, "v1")
+    for title, rows in libro_condominio().items():
+        service._store_table(title, rows)
+
+    # La hoja de cálculo ya no está en la versión "v1": una instantánea con esa etiqueta no serviría
+    service._mark_sheet_written()
+    service._maybe_save_snapshot()
+    wait_for_saves()
+
+    assert TableSnapshot(path).load() is None
+    assert service._snapshot.saves == 0
@@ -0,0 +1,136 @@
+import time
+from typing import Any, Dict, List
+
+import pytest
+from gspread.utils import a1_range_to_grid_range
+
+from API.backend_api import sheets_service
+from API.backend_api.sheets_service import SheetsService
+from tests.helpers import MOVIMIENTOS_HEADER, movimiento
+
+
+def batch_get(sheet: List[List[str]], ranges: List[str]) -> List[Dict[str, Any]]:
+    """Respuesta de values_batch_get sobre una hoja en memoria (sin celdas ni filas vacías finales)."""
+    responses = []
+    for name in ranges:
+        grid = a1_range_to_grid_range(name.split('!', 1)[1])
+        rows = sheet[grid.get('startRowIndex', 0):grid.get('endRowIndex', len(sheet))]
+        values = []
+        for row in rows:
+            cells = list(row[grid.get('startColumnIndex', 0):grid.get('endColumnIndex', len(row))])
+            while cells and cells[-1] == "":
+                cells.pop()
+            values.append(cells)
+        while values and not values[-1]:
+            values.pop()
+        responses.append({'range': name, 'values': values})
+    return responses
+
+
+def tail_sync(service: SheetsService, table, sheet: List[List[str]]) -> List[str]:
+    """Sincroniza la cola de la tabla contra `sheet`; retorna las hojas que requieren recarga completa."""
+    ranges = service._read_ranges([], [table])
+    return service._apply_reads({}, [], [table], batch_get(sheet, ranges))
+
+
+@pytest.fixture
+def service(monkeypatch):
+    monkeypatch.setattr(sheets_service, "MOVEMENTS_JOURNAL_PATH", "")
+    monkeypatch.setattr(sheets_service, "SHEETS_CACHE_TTL", 30.0)
+    monkeypatch.setattr(sheets_service, "SHEETS_FULL_RELOAD_INTERVAL", 900.0)
+    return SheetsService()
+
+
+@pytest.fixture
+def sheet():
+    return [
+        list(MOVIMIENTOS_HEADER),
+        movimiento("M0001", 1, "ALICUOTA", 50, "2024-11-05"),
+        movimiento("M0002", 2, "ALICUOTA", 50, "2024-11-05"),
+        movimiento("M0003", 1, "PAGO", -50),
+    ]
+
+
+@pytest.fixture
+def table(service, sheet):
+    return service._store_table('MOVIMIENTOS', [list(row) for row in sheet])
+
+
+def test_tail_ranges_include_check_columns(service, table):
+    ranges = service._tail_ranges(table)
+    assert ranges[:3] == ["'MOVIMIENTOS'!1:1", "'MOVIMIENTOS'!A4:J4", "'MOVIMIENTOS'!A5:J"]
+    assert ranges[3:] == ["'MOVIMIENTOS'!A2:A4", "'MOVIMIENTOS'!B2:B4", "'MOVIMIENTOS'!F2:F4"]
+
+
+def test_tail_sync_appends_new_rows(service, table, sheet):
+    ledger = table.ledger()
+    sheet.append(movimiento("M0004", 2, "PAGO", -20))
+    sheet.append(movimiento("M0005", 3, "MULTA", 10))
+
+    assert tail_sync(service, table, sheet) == []
+    assert [row[0] for row in table.rows] == ["M0001", "M0002", "M0003", "M0004", "M0005"]
+    assert table.synced_rows == 5
+    # La proyección por casa se actualiza con las filas añadidas (sin reconstruirse)
+    assert table.ledger() is ledger
+    assert ledger.get(2).saldo == 30.0
+    assert ledger.get(3).saldo == 10.0
+    assert [m.id_movimiento for m in table.records_for('ID_CASA', 2)] == ["M0002", "M0004"]
+
+
+def test_tail_sync_without_changes_keeps_rows(service, table, sheet):
+    assert tail_sync(service, table, sheet) == []
+    assert len(table.rows) == 3
+
+
+def test_edited_amount_requires_full_reload(service, table, sheet):
+    # Caso de la revisión: el MONTO de M0002 pasa de 50 a 30 en la hoja
+    sheet[2][MOVIMIENTOS_HEADER.index('MONTO')] = "30"
+    sheet.append(movimiento("M0004", 2, "PAGO", -20))
+
+    assert tail_sync(service, table, sheet) == ['MOVIMIENTOS']
+    assert len(table.rows) == 3 # No se aplicó la cola sobre la copia desactualizada
+
+
+def test_moved_movement_requires_full_reload(service, table, sheet):
+    sheet[1][MOVIMIENTOS_HEADER.index('ID_CASA')] = "2"
+    assert tail_sync(service, table, sheet) == ['MOVIMIENTOS']
+
+
+def test_deleted_row_requires_full_reload(service, table, sheet):
+    del sheet[1]
+    sheet.append(movimiento("M0004", 2, "PAGO", -20))
+    assert tail_sync(service, table, sheet) == ['MOVIMIENTOS']
+
+
+def test_cleared_trailing_cell_requires_full_reload(service, table, sheet):
+    # La API omite las celdas vacías finales de la columna de control
+    sheet[3][MOVIMIENTOS_HEADER.index('MONTO')] = ""
+    assert tail_sync(service, table, sheet) == ['MOVIMIENTOS']
+
+
+def test_changed_header_requires_full_reload(service, table, sheet):
+    sheet[0] = sheet[0][:-1]
+    assert tail_sync(service, table, sheet) == ['MOVIMIENTOS']
+
+
+def test_own_writes_match_formatted_values(service, table, sheet):
+    # Una escritura propia guarda -12.0 -> '-12'; la hoja puede devolver '-12.00' o '-12'
+    table.append_row(["M0004", 1, "2024-11", "PAGO", "pago", -12.0, "", "Efectivo", "2024-11-02 09:00", ""])
+    sheet.append(movimiento("M0004", 1, "PAGO", "-12.00", registro="2024-11-02 09:00"))
+    sheet.append(movimiento("M0005", 2, "PAGO", -5))
+
+    assert tail_sync(service, table, sheet) == []
+    assert [row[0] for row in table.rows][-2:] == ["M0004", "M0005"]
+
+
+def test_full_reload_after_interval(service, table, monkeypatch):
+    _, full, tail = service._plan_reads(['MOVIMIENTOS'])
+    assert full == [] and tail == [] # Vigente en caché
+
+    table.loaded_at = float("-inf")
+    _, full, tail = service._plan_reads(['MOVIMIENTOS'])
+    assert full == [] and tail == [table]
+
+    table.full_loaded_at = time.monotonic() - 901
+    _, full, tail = service._plan_reads(['MOVIMIENTOS'])
+    assert full == ['MOVIMIENTOS'] and tail == []